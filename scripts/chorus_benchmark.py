@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+
+"""This script contains benchmarks of the data loading and harmonization steps, such as:
+- Cost of combining the per-file DataFrames as the number of files grows.
+- Time of each stage of the workflow (get_*, harmonize_*, combine_climvar and the exporters) on a synthetic location
+  with 1 week, 1 season or 3 years of data.
+
+The synthetic data is deterministic (fixed seed) and is written in the layouts expected by the loaders, so the benchmarks
+run offline and their results can be compared between versions of the scripts.
+
+Usage:
+    python chorus_benchmark.py concat --files 10 100 400
+    python chorus_benchmark.py stages --sizes week season 3years --data-dir /tmp/chorus_bench --output bench.csv
+"""
+import os
+import argparse
+import logging
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import chorus_utils as chutils
+import chorus_get_data as gdata
+import chorus_harmonize_data as hdata
+import chorus_ebv_ready_dataset as chebv
+import chorus_data_cube as chcube
+
+SIZES = {'week':7,'season':91,'3years':1096}
+BENCH_LOCATION = 'INCT0'
+BENCH_DATE_INI = '2020-01-01'
+
+def make_frames(n_files, rows_per_file=192, n_cols=45, seed=0):
+    """Function to create a list of DataFrames similar to the daily inference files.
+
+    Args:
+        n_files (int): number of DataFrames.
+        rows_per_file (int): number of rows of each DataFrame.
+        n_cols (int): number of float columns of each DataFrame.
+        seed (int): seed of the random number generator.
+
+    Returns:
+        frames (list): list of pandas DataFrames.
+    """
+
+    rng = np.random.default_rng(seed)
+    cols = ['col_{}'.format(j) for j in range(n_cols)]
+    frames = []
+    t_ini = np.datetime64('2020-01-01T00:00','ns')
+    for i in range(n_files):
+        df = pd.DataFrame(rng.random((rows_per_file,n_cols)),columns=cols)
+        df.insert(0,'date',t_ini + np.arange(i*rows_per_file,(i+1)*rows_per_file)*np.timedelta64(450,'s'))
+        frames.append(df)
+
+    return frames
+
+def _concat_loop(frames):
+    df_raw = pd.DataFrame()
+    for i in range(len(frames)):
+        df_proc = frames[i].copy()
+        df_raw = pd.concat([df_raw,df_proc])
+    return df_raw
+
+def _concat_batched(frames):
+    return pd.concat(frames)
+
+def _best_time(func, args, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        t_ini = time.perf_counter()
+        func(*args)
+        best = min(best,time.perf_counter()-t_ini)
+    return best
+
+def bench_concat(n_files_list=(10,50,100,200,400), rows_per_file=192, n_cols=45, repeat=3):
+    """Function to compare the accumulation of DataFrames with pd.concat inside a loop (quadratic memory traffic)
+    with a single pd.concat of the list of DataFrames (linear).
+
+    Args:
+        n_files_list (list): numbers of files to benchmark.
+        rows_per_file (int): number of rows of each file.
+        n_cols (int): number of float columns of each file.
+        repeat (int): number of repetitions; the best time is reported.
+
+    Returns:
+        df_bench (pandas DataFrame): DataFrame with the time in seconds of both strategies for each number of files.
+    """
+
+    results = []
+    for n_files in n_files_list:
+        frames = make_frames(n_files,rows_per_file,n_cols)
+        t_loop = _best_time(_concat_loop,(frames,),repeat)
+        t_batched = _best_time(_concat_batched,(frames,),repeat)
+        results.append([n_files,t_loop,t_batched,t_loop/t_batched])
+
+    df_bench = pd.DataFrame(results,columns=['n_files','loop_s','batched_s','speedup'])
+
+    return df_bench
+
+def make_site(folder_path, days, location_id=BENCH_LOCATION, date_ini=BENCH_DATE_INI, seed=0):
+    """Function to create the data files of a synthetic location in the layouts expected by the loaders:
+    - Inference files (Apache Parquet, one file per 30 days) with two inference windows per 15-minute slot.
+    - Datalogger files (Excel, one file per 120 days) with the three rows above the header and a reading every 10 minutes.
+    - Weather station files (Excel, one file per 120 days) with hourly readings in UTC, '--' as null value and
+      the 'invertir' column flagging the dates with the day and the month swapped.
+    - The locations metadata file.
+
+    Args:
+        folder_path (str): path to the folder where the files are created.
+        days (int): number of days of data.
+        location_id (str): location identifier.
+        date_ini (str): start date in YYYY-MM-DD format.
+        seed (int): seed of the random number generator.
+
+    Returns:
+        date_fin (str): end date of the data in YYYY-MM-DD format.
+    """
+
+    os.makedirs(folder_path,exist_ok=True)
+    rng = np.random.default_rng(seed)
+    t_ini = pd.Timestamp(date_ini)
+    t_fin = t_ini + pd.Timedelta(days=days) - pd.Timedelta(minutes=1)
+
+    species = [l.ori_name for l in chutils.get_inference_labels() if l.enable and l.new_dtype is float]
+    for start in pd.date_range(t_ini,t_fin,freq='30D'):
+        ts = pd.date_range(start,min(start+pd.Timedelta(days=30),t_fin+pd.Timedelta(minutes=1)),freq='15min',inclusive='left')
+        n = 2*len(ts)
+        df = pd.DataFrame({'date':np.repeat(ts.values,2)})
+        df['path_audio'] = '/audio/' + location_id
+        df['fname'] = ['{}_{}.wav'.format(location_id,i) for i in range(n)]
+        df['sample_rate'] = 48000.0
+        df['sensor_name'] = 'sensor_0'
+        df['min'] = np.tile([0,1],len(ts))
+        df['max'] = df['min'] + 1
+        values = rng.random((n,len(species)))
+        values[rng.random((n,len(species))) < 0.01] = np.nan
+        df[species] = values
+        df['site'] = location_id
+        file_name = '{}_inference_{:%Y%m%d}_{:%Y%m%d}.gzip'.format(location_id,ts[0],ts[-1])
+        df.to_parquet(os.path.join(folder_path,file_name),compression='gzip',row_group_size=2*96)
+
+    for start in pd.date_range(t_ini,t_fin,freq='120D'):
+        end = min(start+pd.Timedelta(days=120),t_fin+pd.Timedelta(minutes=1))
+
+        ts = pd.date_range(start,end,freq='10min',inclusive='left')
+        header = [['Logger report','','','','',''],['Model','','','','',''],['','','','','',''],['SN','DATE','TIME','\toC','\t%RH','\tDP']]
+        body = pd.DataFrame({0:12345,1:ts.normalize(),2:ts.time,
+                             3:np.round(18+8*rng.random(len(ts)),1),
+                             4:np.round(60+30*rng.random(len(ts)),1),
+                             5:np.round(14+4*rng.random(len(ts)),1)})
+        body.loc[rng.random(len(ts)) < 0.01,3] = np.nan
+        df = pd.concat([pd.DataFrame(header[1:]),body],ignore_index=True)
+        df.columns = header[0]
+        file_name = '{}_datalogger_{:%Y%m%d}_{:%Y%m%d}.xlsx'.format(location_id,ts[0],ts[-1])
+        df.to_excel(os.path.join(folder_path,file_name),index=False)
+
+        ts = pd.date_range(start,end,freq='1h',inclusive='left')
+        dates = ts.normalize()
+        swap = (dates.day <= 12) & (dates.day != dates.month) & (rng.random(len(ts)) < 0.2)
+        stored = [pd.Timestamp(d.year,d.day,d.month) if i else d for d, i in zip(dates,swap)]
+        df = pd.DataFrame({'Date':stored,'Hora (UTC)':ts.hour*100})
+        for label in chutils.get_wstation_labels():
+            if label.new_name not in ('date','time'):
+                values = np.round(30*rng.random(len(ts)),1).astype(object)
+                values[rng.random(len(ts)) < 0.05] = '--'
+                df[label.ori_name] = values
+        df['invertir'] = swap.astype(int)
+        file_name = '{}_wstation_A000_{:%Y%m%d}_{:%Y%m%d}.xlsx'.format(location_id,ts[0],ts[-1])
+        df.to_excel(os.path.join(folder_path,file_name),index=False)
+
+    df_meta = pd.DataFrame({'location_ID':[location_id],'name_ID':['Synthetic location'],'lat_DL':[-22.0],'lon_DL':[-47.0],
+                            'WStation':[True],'lat_WS':[-22.1],'lon_WS':[-47.1]})
+    df_meta.to_excel(os.path.join(folder_path,'locations_metadata.xlsx'),index=False)
+
+    return t_fin.strftime('%Y-%m-%d')
+
+def _inference_grid(df_inf, T_sample):
+    return hdata.time_grid(df_inf.date.iloc[0],df_inf.date.iloc[-1],T_sample)
+
+def _build_ebv(ebv_path, df_inf_h, df_climvar, df_meta=None, T_sample=15):
+    return chcube.build_ebv(ebv_path,None,df_inf_h,df_climvar,df_meta,T_sample)
+
+def _timed_call(func, args, kwargs, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        t_ini = time.perf_counter()
+        result = func(*args,**kwargs)
+        best = min(best,time.perf_counter()-t_ini)
+    return best, result
+
+def bench_stages(folder_path, days, repeat=1, T_sample=15):
+    """Function to measure the time of each stage of the workflow on a synthetic location (see make_site).
+
+    Args:
+        folder_path (str): path to the folder with the data of the synthetic location. If it does not contain
+            the location, the data is created.
+        days (int): number of days of data.
+        repeat (int): number of repetitions; the best time is reported.
+        T_sample (int): sample period of the harmonized data in minutes.
+
+    Returns:
+        df_bench (pandas DataFrame): DataFrame with the time in seconds and the number of output rows of each stage,
+            and the error of the stages that failed.
+    """
+
+    if not os.path.exists(os.path.join(folder_path,'locations_metadata.xlsx')):
+        make_site(folder_path,days)
+    date_ini = BENCH_DATE_INI
+    date_fin = (pd.Timestamp(date_ini)+pd.Timedelta(days=days-1)).strftime('%Y-%m-%d')
+    loc = BENCH_LOCATION
+
+    results = []
+    failed = object()
+    def run(stage, func, *args, **kwargs):
+        #a failing stage is reported, and the stages that receive its result (as a positional or a keyword argument)
+        #are skipped; None is a valid argument (e.g. file_name=None)
+        if any(a is failed for a in list(args)+list(kwargs.values())):
+            results.append([stage,days,np.nan,np.nan,'skipped'])
+            return failed
+        try:
+            seconds, result = _timed_call(func,args,kwargs,repeat)
+        except Exception as e:
+            results.append([stage,days,np.nan,np.nan,'{}: {}'.format(type(e).__name__,e)])
+            return failed
+        rows = result.shape[0] if isinstance(result,(pd.DataFrame,np.ndarray)) else np.nan
+        results.append([stage,days,seconds,rows,''])
+        return result
+
+    df_inf = run('get_inference',gdata.get_inference,folder_path,loc,date_ini,date_fin,qc=False)
+    df_dlog = run('get_datalogger',gdata.get_datalogger,folder_path,loc,date_ini,date_fin,qc=False)
+    df_wst = run('get_wstation',gdata.get_wstation,folder_path,loc,date_ini,date_fin,qc=False)
+    df_meta = run('get_metadata',gdata.get_metadata,folder_path,'locations_metadata.xlsx',loc)
+
+    t_grid = run('time_grid',_inference_grid,df_inf,T_sample)
+
+    df_inf_h = run('harmonize_inference',hdata.harmonize_inference,df_inf,t_grid,T_sample)
+    df_dlog_h = run('harmonize_datalogger',hdata.harmonize_datalogger,df_dlog,t_grid,T_sample)
+    df_wst_h = run('harmonize_wstation',hdata.harmonize_wstation,df_wst,t_grid,T_sample)
+    df_climvar = run('combine_climvar',hdata.combine_climvar,df_dlog_h,df_wst_h)
+
+    with tempfile.TemporaryDirectory() as out_path:
+        run('ebv_rd_create',chebv.ebv_rd_create,df_inf_h,df_climvar,folder_path,'bench.gzip',
+            file_name=None,location_id=loc,out_path=out_path)
+        run('build_ebv',_build_ebv,os.path.join(out_path,'bench.nc'),df_inf_h,df_climvar,df_meta=df_meta,
+            T_sample=T_sample)
+
+    df_bench = pd.DataFrame(results,columns=['stage','days','seconds','rows','error'])
+
+    return df_bench
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks of the Chorus EBV scripts.')
+    subparsers = parser.add_subparsers(dest='benchmark',required=True)
+
+    p_concat = subparsers.add_parser('concat',help='cost of combining the per-file DataFrames')
+    p_concat.add_argument('--files',type=int,nargs='+',default=[10,50,100,200,400])
+    p_concat.add_argument('--rows',type=int,default=192)
+    p_concat.add_argument('--cols',type=int,default=45)
+    p_concat.add_argument('--repeat',type=int,default=3)
+
+    p_stages = subparsers.add_parser('stages',help='time of each stage of the workflow on synthetic data')
+    p_stages.add_argument('--sizes',nargs='+',choices=list(SIZES),default=['week','season'])
+    p_stages.add_argument('--data-dir',default=None,help='folder to keep the synthetic data between runs (default: temporary)')
+    p_stages.add_argument('--repeat',type=int,default=1)
+    p_stages.add_argument('--output',default=None,help='CSV file to save the results')
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.benchmark == 'concat':
+        df_bench = bench_concat(args.files,args.rows,args.cols,args.repeat)
+    elif args.benchmark == 'stages':
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            data_dir = args.data_dir or tmp_dir
+            df_bench = pd.concat([bench_stages(os.path.join(data_dir,size),SIZES[size],args.repeat) for size in args.sizes])
+
+    print(df_bench.to_string(index=False))
+    if getattr(args,'output',None):
+        df_bench.to_csv(args.output,index=False)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+
+"""This script contains functions to keep an on-disk cache of the data read from Excel files, including:
+- Conversion of the processed DataFrame of each file to the Apache Arrow (Feather) format.
+- Memory-mapped reading of the cached files.
+- Invalidation of the cached files when the source file or the label schema change.
+- Size-bounded eviction of the least recently used cached files.
+
+The cache is enabled by passing cache_dir to the get_* functions or by setting the CHORUS_CACHE_DIR environment variable.
+"""
+import os
+import numbers
+import hashlib
+import threading
+import pyarrow as pa
+import pyarrow.feather as feather
+
+CACHE_MAX_BYTES = 2*1024**3
+CACHE_EXT = '.feather'
+
+def get_cache_dir(cache_dir=None):
+    """Function to obtain the folder of the cache.
+
+    Args:
+        cache_dir (str): path to the folder of the cache. If None, the CHORUS_CACHE_DIR environment variable is used.
+
+    Returns:
+        cache_dir (str): path to the folder of the cache, or None if the cache is disabled.
+    """
+
+    if cache_dir is None:
+        cache_dir = os.environ.get('CHORUS_CACHE_DIR')
+
+    return cache_dir
+
+def schema_hash(labels, *args):
+    """Function to obtain a hash of a label schema (and any other option that changes the processed data).
+
+    Args:
+        labels (list): list of labels (ori_name, new_name, new_dtype, enable).
+        args: other values that change the processed data (e.g. the UTC offset). Numbers are compared by value, so
+            that -3 and -3.0 give the same hash.
+
+    Returns:
+        key (str): hexadecimal hash of the schema.
+    """
+
+    items = []
+    for label in labels:
+        dtype = getattr(label.new_dtype,'__name__',str(label.new_dtype))
+        items.append((label.ori_name,label.new_name,dtype,label.enable))
+    args = tuple(float(a) if (isinstance(a,numbers.Real) and not isinstance(a,bool)) else a for a in args)
+
+    return hashlib.sha1(repr((items,args)).encode('utf-8')).hexdigest()
+
+def cache_file_name(file_path, schema_key):
+    """Function to obtain the name of the cached file of a source file.
+
+    The name is made of a hash of the path of the source file, a hash of its modification time and size, and the label
+    schema, so that any change of the source file or of the schema produces a different name, and the files cached
+    with different schemas of the same version of a source file can be kept side by side.
+
+    Args:
+        file_path (str): path to the source file.
+        schema_key (str): hash of the label schema.
+
+    Returns:
+        file_name (str): name of the cached file.
+    """
+
+    st = os.stat(file_path)
+    path_key = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()[:16]
+    source_key = hashlib.sha1('{}|{}'.format(st.st_mtime_ns,st.st_size).encode('utf-8')).hexdigest()[:16]
+
+    return path_key + '_' + source_key + '_' + schema_key[:16] + CACHE_EXT
+
+def read_cached(file_path, reader, schema_key, cache_dir=None, max_bytes=CACHE_MAX_BYTES):
+    """Function to read a file through the cache.
+
+    If there is a valid cached file, it is memory-mapped and returned. Otherwise the file is read with the reader function,
+    the result is stored in the cache and the least recently used files are evicted to keep the cache under max_bytes.
+    DataFrames that can not be converted to Arrow (e.g. columns with mixed types) are returned without being cached.
+
+    Args:
+        file_path (str): path to the source file.
+        reader (function): function that receives the path to the source file and returns a pandas DataFrame.
+        schema_key (str): hash of the label schema.
+        cache_dir (str): path to the folder of the cache. If None, the CHORUS_CACHE_DIR environment variable is used.
+        max_bytes (int): maximum size of the cache in bytes.
+
+    Returns:
+        df (pandas DataFrame): DataFrame that contains the data of the file.
+    """
+
+    cache_dir = get_cache_dir(cache_dir)
+    if cache_dir is None:
+        return reader(file_path)
+
+    os.makedirs(cache_dir,exist_ok=True)
+    file_name = cache_file_name(file_path,schema_key)
+    cache_path = os.path.join(cache_dir,file_name)
+
+    if os.path.exists(cache_path):
+        try:
+            table = feather.read_table(cache_path,memory_map=True)
+            os.utime(cache_path)
+            return table.to_pandas()
+        except (OSError,pa.ArrowException):
+            _remove(cache_path)
+
+    df = reader(file_path)
+
+    #only the files cached from an older version of the source file are removed, whatever their schema
+    path_key, source_key = file_name.split('_')[:2]
+    invalidate(cache_dir,path_key,source_key)
+    try:
+        table = pa.Table.from_pandas(df,preserve_index=False)
+    except (pa.ArrowInvalid,pa.ArrowTypeError,pa.ArrowNotImplementedError):
+        return df
+
+    tmp_path = cache_path + '.tmp{}_{}'.format(os.getpid(),threading.get_ident())
+    feather.write_feather(table,tmp_path,compression='uncompressed')
+    os.replace(tmp_path,cache_path)
+    evict(cache_dir,max_bytes)
+
+    return df
+
+def invalidate(cache_dir, path_key=None, source_key=None):
+    """Function to remove cached files.
+
+    Args:
+        cache_dir (str): path to the folder of the cache.
+        path_key (str): hash of the path of a source file. If None, the whole cache is cleared.
+        source_key (str): hash of the current version of the source file. If given, only the files cached from other
+            versions of the source file are removed.
+    """
+
+    if not os.path.isdir(cache_dir):
+        return
+
+    for entry in os.scandir(cache_dir):
+        if entry.is_file() and entry.name.endswith(CACHE_EXT):
+            keys = entry.name[:-len(CACHE_EXT)].split('_',2)
+            if path_key is not None and keys[0] != path_key:
+                continue
+            if source_key is not None and len(keys) == 3 and keys[1] == source_key:
+                continue
+            _remove(entry.path)
+
+def evict(cache_dir, max_bytes=CACHE_MAX_BYTES):
+    """Function to remove the least recently used cached files until the size of the cache is under max_bytes.
+
+    Args:
+        cache_dir (str): path to the folder of the cache.
+        max_bytes (int): maximum size of the cache in bytes.
+    """
+
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.is_file() and entry.name.endswith(CACHE_EXT):
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime,st.st_size,entry.path))
+
+    total = sum(e[1] for e in entries)
+    for mtime, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        _remove(path)
+        total = total - size
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
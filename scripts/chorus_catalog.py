@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+
+"""This script contains a catalog of the data files of a folder, which allows to:
+- Scan the folder tree only once and share the result between all the get_* functions.
+- Classify the files by location and source (inference, datalogger, weather station).
+- Parse the date ranges encoded in the file names (e.g. INCT20955_datalogger_20191220_20200429.xlsx).
+- Save the catalog to a small JSON index and load it again rescanning only the folders modified since it was saved.
+"""
+import os
+import re
+import json
+import fnmatch
+import datetime as dt
+from collections import namedtuple
+
+SOURCES = ['inference','datalogger','wstation']
+
+CatalogEntry = namedtuple('CatalogEntry', [
+    'path',
+    'name',
+    'location_id',
+    'source',
+    'date_ini',
+    'date_fin',
+])
+
+_NAME_RE = re.compile(r'^(?P<location_id>.+?)_(?P<source>' + '|'.join(SOURCES) + r')(?P<rest>[^.]*)\.')
+_DATE_RE = re.compile(r'_(\d{8})(?=_|$)')
+
+class DataCatalog:
+    """Catalog of the data files contained in a folder (and its subfolders).
+
+    Args:
+        folder_path (str): path to the folder containing the files.
+        index_file (str): path to a JSON file to store the catalog. If the file exists it is loaded and only the
+            folders modified since it was saved are scanned again, otherwise the folder is scanned and the catalog is
+            saved to it.
+        refresh (boolean): flag that indicates if the whole folder must be scanned even if the index file exists.
+    """
+
+    def __init__(self, folder_path, index_file=None, refresh=False):
+        self.folder_path = folder_path
+        self.index_file = index_file
+        self.entries = []
+        self.dirs = {}
+
+        if (index_file is not None and os.path.exists(index_file) and not refresh):
+            self.load(index_file)
+            if self.update():
+                self.save(index_file)
+        else:
+            self.scan()
+            if index_file is not None:
+                self.save(index_file)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __repr__(self):
+        return 'DataCatalog({!r}, {} files)'.format(self.folder_path,len(self.entries))
+
+    def scan(self):
+        """Function to scan the whole folder tree and classify the files.
+        """
+
+        self.entries = []
+        self.dirs = {}
+        self.update()
+
+    def update(self):
+        """Function to scan again the folders modified since the catalog was built.
+
+        The modification time of every folder is stored in the catalog. It changes when a file or a subfolder is
+        added, removed or renamed in the folder, so the folders whose modification time has not changed keep their
+        entries and only the other ones are listed again.
+
+        Returns:
+            changed (boolean): True if a folder was added, removed or modified.
+        """
+
+        old_dirs = {os.path.normpath(d):mtime for d,mtime in self.dirs.items()}
+        old_files = {}
+        for entry in self.entries:
+            old_files.setdefault(os.path.normpath(os.path.dirname(entry.path)),[]).append(entry)
+
+        changed = False
+        self.entries = []
+        self.dirs = {}
+        stack = [self.folder_path]
+        while stack:
+            dirpath = stack.pop()
+            key = os.path.normpath(dirpath)
+            try:
+                mtime = os.stat(dirpath).st_mtime_ns
+            except OSError:
+                continue
+            if old_dirs.get(key) == mtime:
+                files = old_files.get(key,[])
+                subdirs = sorted(os.path.join(dirpath,os.path.basename(d)) for d in old_dirs
+                                 if os.path.normpath(os.path.dirname(d)) == key and d != key)
+            else:
+                changed = True
+                try:
+                    with os.scandir(dirpath) as it:
+                        items = sorted(it,key=lambda e: e.name)
+                except OSError:
+                    continue
+                files = []
+                subdirs = []
+                for item in items:
+                    if item.is_dir(follow_symlinks=False):
+                        subdirs.append(item.path)
+                    elif item.is_file():
+                        files.append(parse_file_name(item.path))
+            self.dirs[dirpath] = mtime
+            self.entries.extend(files)
+            stack.extend(reversed(subdirs))
+
+        if len(self.dirs) != len(old_dirs):
+            changed = True
+
+        return changed
+
+    def save(self, index_file=None):
+        """Function to save the catalog to a JSON index file.
+
+        Args:
+            index_file (str): path to the index file. If None, the index file of the catalog is used.
+        """
+
+        index_file = index_file or self.index_file
+        entries = []
+        for entry in self.entries:
+            item = entry._asdict()
+            item['date_ini'] = _format_date(entry.date_ini)
+            item['date_fin'] = _format_date(entry.date_fin)
+            entries.append(item)
+
+        tmp_file = index_file + '.tmp'
+        with open(tmp_file,'w') as f:
+            json.dump({'folder_path':self.folder_path,'dirs':self.dirs,'entries':entries},f)
+        os.replace(tmp_file,index_file)
+
+    def load(self, index_file=None):
+        """Function to load the catalog from a JSON index file.
+
+        The catalog is loaded as it was saved; call update() to scan again the folders modified since then. An index
+        of another folder, or without the modification times of the folders, is loaded empty so that update() scans
+        the whole folder.
+
+        Args:
+            index_file (str): path to the index file. If None, the index file of the catalog is used.
+        """
+
+        index_file = index_file or self.index_file
+        with open(index_file) as f:
+            index = json.load(f)
+
+        self.entries = []
+        self.dirs = {}
+        if (index.get('folder_path') != self.folder_path or 'dirs' not in index):
+            return
+
+        self.dirs = index['dirs']
+        for item in index['entries']:
+            item['date_ini'] = _parse_date(item['date_ini'])
+            item['date_fin'] = _parse_date(item['date_fin'])
+            self.entries.append(CatalogEntry(**item))
+
+    def match(self, pattern):
+        """Function to obtain the paths of the files whose name matches a pattern.
+
+        Args:
+            pattern (str): Unix shell-style pattern (e.g. 'INCT20955_datalogger*.xlsx').
+
+        Returns:
+            paths (list): list of paths of the matching files.
+        """
+
+        return [entry.path for entry in self.entries if fnmatch.fnmatch(entry.name,pattern)]
+
+    def select(self, location_id=None, source=None):
+        """Function to obtain the files of a location and/or a source.
+
+        Args:
+            location_id (str): location identifier.
+            source (str): source of the data ('inference', 'datalogger' or 'wstation').
+
+        Returns:
+            entries (list): list of CatalogEntry.
+        """
+
+        entries = []
+        for entry in self.entries:
+            if (location_id is not None and entry.location_id != location_id):
+                continue
+            if (source is not None and entry.source != source):
+                continue
+            entries.append(entry)
+
+        return entries
+
+    def locations(self, source=None):
+        """Function to obtain the location identifiers found in the catalog.
+
+        Args:
+            source (str): source of the data. If None, all the sources are considered.
+
+        Returns:
+            locations (list): sorted list of location identifiers.
+        """
+
+        return sorted(set(entry.location_id for entry in self.select(source=source) if entry.location_id is not None))
+
+def parse_file_name(file_path):
+    """Function to classify a file by location and source and to parse the date range encoded in its name.
+
+    Args:
+        file_path (str): path to the file.
+
+    Returns:
+        entry (CatalogEntry): entry of the catalog. location_id, source and the dates are None when they can not be parsed.
+    """
+
+    name = os.path.basename(file_path)
+    location_id = None
+    source = None
+    date_ini = None
+    date_fin = None
+
+    m = _NAME_RE.match(name)
+    if m is not None:
+        location_id = m.group('location_id')
+        source = m.group('source')
+        dates = [_parse_date(d) for d in _DATE_RE.findall(m.group('rest'))]
+        dates = [d for d in dates if d is not None]
+        if len(dates) != 0:
+            date_ini = dates[-2] if len(dates) > 1 else dates[-1]
+            date_fin = dates[-1]
+
+    return CatalogEntry(file_path,name,location_id,source,date_ini,date_fin)
+
+def search_files(folder_path, pattern, date_ini=None, date_fin=None):
+    """Function to find the files whose name matches a pattern, either in a folder or in a DataCatalog.
+    
+    If date_ini and date_fin are given, the files whose name encodes a date range that can not overlap the requested
+    dates are skipped. Files without a date range in their name are always returned.
+
+    Args:
+        folder_path (str or DataCatalog): path to the folder containing the files, or a catalog of the folder.
+        pattern (str): Unix shell-style pattern.
+        date_ini (datetime): start date of the requested data.
+        date_fin (datetime): end date of the requested data.
+
+    Returns:
+        find_files (list): list of paths of the matching files.
+    """
+
+    if isinstance(folder_path,DataCatalog):
+        entries = [entry for entry in folder_path.entries if fnmatch.fnmatch(entry.name,pattern)]
+    else:
+        entries = []
+        for dirpath, dirs, files in os.walk(folder_path):
+            for filename in fnmatch.filter(files, pattern):
+                entries.append(parse_file_name(os.path.join(dirpath, filename)))
+
+    find_files = []
+    for entry in entries:
+        if overlaps(entry,date_ini,date_fin):
+            find_files.append(entry.path)
+
+    return find_files
+
+def overlaps(entry, date_ini=None, date_fin=None, margin=dt.timedelta(days=1)):
+    """Function to check if the date range encoded in the name of a file can overlap the requested dates.
+    
+    A margin of one day is added on both sides, since the records can be shifted to the previous or next day
+    when the time is converted from UTC to local time.
+
+    Args:
+        entry (CatalogEntry): entry of the catalog.
+        date_ini (datetime): start date of the requested data. If None, there is no lower limit.
+        date_fin (datetime): end date of the requested data. If None, there is no upper limit.
+        margin (timedelta): margin added to the date range of the file.
+
+    Returns:
+        overlap (boolean): False only if the file can not contain records on the requested dates.
+    """
+
+    if (date_fin is not None and entry.date_ini is not None and entry.date_ini - margin > date_fin):
+        return False
+    if (date_ini is not None and entry.date_fin is not None and entry.date_fin + margin < date_ini):
+        return False
+
+    return True
+
+def root_path(folder_path):
+    """Function to obtain the path of the folder of a folder path or a DataCatalog.
+    """
+
+    if isinstance(folder_path,DataCatalog):
+        return folder_path.folder_path
+
+    return folder_path
+
+def _parse_date(s):
+    if s is None:
+        return None
+    for fmt in ('%Y%m%d','%Y-%m-%d'):
+        try:
+            return dt.datetime.strptime(s,fmt)
+        except ValueError:
+            pass
+    return None
+
+def _format_date(d):
+    if d is None:
+        return None
+    return d.strftime('%Y-%m-%d')
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+
+"""Command-line entry point for the whole workflow (get data -> harmonize -> create the EBV-ready dataset).
+
+Usage:
+    python chorus_cli.py run --data sample_data --location INCT20955 --start 2020-01-01 --end 2020-01-31 --out results
+    python chorus_cli.py batch --data sample_data --metadata locations_metadata.xlsx --start 2020-01-01 --end 2020-01-31 --out results
+    python chorus_cli.py update --data sample_data --location INCT20955 --end 2020-02-07 --out results --cube results/INCT20955_ebvready_20200101_20200131.nc
+
+Exit codes:
+    0: all the locations were processed.
+    1: the processing of at least one location failed.
+    2: wrong arguments.
+    3: there is no data for the requested location(s) and dates.
+"""
+import os
+import sys
+import logging
+import argparse
+import datetime as dt
+import chorus_pipeline as pl
+import chorus_get_data as gdata
+import chorus_profiling as chprof
+import chorus_utils as chutils
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_NO_DATA = 3
+
+def _date(s):
+    try:
+        dt.datetime.strptime(s,'%Y-%m-%d')
+    except ValueError:
+        raise argparse.ArgumentTypeError('dates must be in YYYY-MM-DD format: ' + s)
+    return s
+
+def _utc_offset(s):
+    try:
+        return float(s)
+    except ValueError:
+        return s
+
+def build_parser():
+    """Function to build the parser of the command-line arguments.
+    """
+
+    parser = argparse.ArgumentParser(prog='chorus-ebv',description='Create EBV-ready datasets from inferences and climatic variables.')
+    subparsers = parser.add_subparsers(dest='command',required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--data',required=True,help='path to the folder containing the data files')
+    common.add_argument('--start',type=_date,default=None,help='start date in YYYY-MM-DD format')
+    common.add_argument('--end',required=True,type=_date,help='end date in YYYY-MM-DD format')
+    common.add_argument('--out',required=True,help='path to the output folder')
+    common.add_argument('--format',choices=list(pl.OUTPUT_FORMATS),default='parquet',
+                        help='format of the EBV-ready datasets (default: parquet)')
+    common.add_argument('--species-file',default=None,help='CSV file with the species selected for the EBV-ready dataset (default: all species)')
+    common.add_argument('--sample-period',type=int,default=15,help='sample period of the harmonized data in minutes (default: 15)')
+    common.add_argument('--utc-offset',type=_utc_offset,default=-3,help='UTC offset in hours or timezone name of the weather stations (default: -3)')
+    common.add_argument('--workers',type=int,default=None,help='number of parallel workers')
+    common.add_argument('--cache-dir',default=None,help='folder of the ingest cache of the Excel files')
+    common.add_argument('--qc',action='store_true',help='run the quality tests (nulls and duplicates) of the loaded data')
+    common.add_argument('-v','--verbose',action='count',default=0,help='show progress messages (-vv for debug messages)')
+    common.add_argument('-q','--quiet',action='store_true',help='show only errors')
+    common.add_argument('--profile',default=None,metavar='REPORT',
+                        help='save the time, memory, rows and files of each stage to a .json or .csv report')
+    common.add_argument('--labels',default=None,metavar='FILE',
+                        help='JSON or YAML file with the labels of the columns (e.g. the species of a new model)')
+
+    p_run = subparsers.add_parser('run',parents=[common],help='process a single location')
+    p_run.add_argument('--location',required=True,help='location identifier')
+    p_run.add_argument('--no-wstation',action='store_true',help='do not use weather station data')
+    p_run.add_argument('--window',default=None,metavar='FREQ',
+                       help="process the data in windows of this pandas frequency (e.g. MS for months) to bound the memory")
+    p_run.add_argument('--metadata',default=None,help='name of the file that contains the metadata of the locations (coordinates of the NetCDF output)')
+
+    p_batch = subparsers.add_parser('batch',parents=[common],help='process the locations of the locations metadata file in parallel')
+    p_batch.add_argument('--metadata',required=True,help='name of the file that contains the metadata of the locations')
+    p_batch.add_argument('--locations',nargs='+',default=None,help='location identifiers to process (default: all)')
+    p_batch.add_argument('--index-file',default=None,help='JSON index of the data folder')
+    p_batch.add_argument('--window',default=None,metavar='FREQ',
+                         help="process each location in windows of this pandas frequency (e.g. MS for months) to bound the memory")
+    p_batch.add_argument('--no-resume',action='store_true',help='process again the locations of a previous run')
+
+    p_update = subparsers.add_parser('update',parents=[common],help='append the new data of a location to its NetCDF EBV cube')
+    p_update.add_argument('--location',required=True,help='location identifier')
+    p_update.add_argument('--cube',required=True,
+                          help='path to the NetCDF EBV cube, e.g. the <location>_ebvready_<start>_<end>.nc file written by run --format netcdf')
+    p_update.add_argument('--no-wstation',action='store_true',help='do not use weather station data')
+    p_update.add_argument('--metadata',default=None,help='name of the file that contains the metadata of the locations (coordinates of a new cube)')
+
+    return parser
+
+def print_summary(summary):
+    """Function to print the status and the wall time of each stage of a location.
+    """
+
+    print('\n{}: {}'.format(summary['location_id'],summary['status']))
+    for stage, seconds in summary.get('stages',{}).items():
+        print('  {:<16} {:>9.3f} s'.format(stage,seconds))
+    print('  {:<16} {:>9.3f} s'.format('total',summary.get('elapsed_s',0)))
+    if summary.get('output'):
+        print('  output: {}'.format(summary['output']))
+    if summary.get('error'):
+        print('  error: {}'.format(summary['error']))
+
+def exit_code(statuses):
+    """Function to obtain the exit code from the status of the processed locations.
+    """
+
+    if any(status == 'failed' for status in statuses):
+        return EXIT_FAILED
+    if len(statuses) != 0 and all(status == 'no_data' for status in statuses):
+        return EXIT_NO_DATA
+    return EXIT_OK
+
+def save_profile(path, summaries):
+    """Function to save the measurements of the processed locations to a JSON or CSV report.
+    """
+
+    if path is None:
+        return
+    recs = []
+    for summary in summaries:
+        for record in summary.get('profile',[]):
+            record['location_id'] = summary['location_id']
+            recs.append(record)
+    chprof.report(path,recs)
+    print('\nProfile saved to {}'.format(path))
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if (args.command != 'batch' and args.format == 'cube'):
+        parser.error('--format cube is only available for batch')
+    if (getattr(args,'window',None) is not None and args.format == 'cube'):
+        parser.error('--window is not available for --format cube')
+    if (args.start is None and args.command != 'update'):
+        parser.error('--start is required')
+    if (args.start is not None and args.start > args.end):
+        parser.error('--start must not be after --end')
+    if not os.path.isdir(args.data):
+        parser.error('data folder not found: ' + args.data)
+    if (args.labels is not None and not os.path.isfile(args.labels)):
+        parser.error('labels file not found: ' + args.labels)
+
+    level = logging.ERROR if args.quiet else [logging.WARNING,logging.INFO,logging.DEBUG][min(args.verbose,2)]
+    logging.basicConfig(level=level,format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    os.makedirs(args.out,exist_ok=True)
+
+    if args.profile is not None:
+        chprof.enable()
+        #the workers of the batch inherit the setting
+        os.environ['CHORUS_PROFILE'] = '1'
+
+    if args.labels is not None:
+        #the workers of the batch load the same file when they build their registry
+        os.environ['CHORUS_LABELS_FILE'] = os.path.abspath(args.labels)
+        chutils.reset_labels()
+
+    if args.command in ('run','update'):
+        df_meta = None
+        if args.metadata is not None:
+            df_meta = gdata.get_metadata(args.data,args.metadata,args.location,cache_dir=args.cache_dir)
+
+    if args.command == 'update':
+        summary = pl.update_location(args.data,args.location,args.end,args.cube,date_ini=args.start,
+                                     ebv_rd_metadata=args.species_file,wstation=not args.no_wstation,
+                                     T_sample=args.sample_period,utc_offset=args.utc_offset,
+                                     cache_dir=args.cache_dir,max_workers=args.workers,qc=args.qc,df_meta=df_meta)
+        print_summary(summary)
+        save_profile(args.profile,[summary])
+        return exit_code([summary['status']])
+
+    if args.command == 'run':
+        summary = pl.run_location(args.data,args.location,args.start,args.end,args.out,
+                                  ebv_rd_metadata=args.species_file,wstation=not args.no_wstation,
+                                  T_sample=args.sample_period,utc_offset=args.utc_offset,
+                                  cache_dir=args.cache_dir,max_workers=args.workers,qc=args.qc,
+                                  output_format=args.format,df_meta=df_meta,window=args.window)
+        print_summary(summary)
+        save_profile(args.profile,[summary])
+        return exit_code([summary['status']])
+
+    try:
+        summary = pl.run_batch(args.data,args.metadata,args.start,args.end,args.out,locations=args.locations,
+                               ebv_rd_metadata=args.species_file,T_sample=args.sample_period,
+                               utc_offset=args.utc_offset,cache_dir=args.cache_dir,max_workers=args.workers,
+                               resume=not args.no_resume,index_file=args.index_file,qc=args.qc,
+                               output_format=args.format,window=args.window)
+    except FileNotFoundError as e:
+        print(e,file=sys.stderr)
+        return EXIT_FAILED
+
+    for location_summary in summary['locations'].values():
+        print_summary(location_summary)
+    save_profile(args.profile,summary['locations'].values())
+    return exit_code([s['status'] for s in summary['locations'].values()])
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,66 +1,501 @@
 #!/usr/bin/env python3
 
 """This module contains functions for building and reading EBV-ready datasets in the NetCDF format
+
+The EBV cube has an unlimited time dimension (CF-encoded, in minutes since 1970-01-01) and a species dimension. It contains:
+- The estimated vocal activity (EVA) of each species, eva(time, species).
+- The harmonized climatic variables, one variable per column (e.g. temp(time), rh(time)).
+- The coordinates of the datalogger and the weather station of the location.
+
+The data is written in blocks of time, and the variables are chunked along time and compressed (zlib + shuffle).
+New slots can be appended to an existing cube along the time dimension (append_ebv).
+
+A multi-site cube (create_site_cube) adds a site dimension, eva(site, time, species) and e.g. temp(site, time), with the
+coordinates of the datalogger and the weather station of each site, so that the data of a region is read with a single
+hyperslab. Each site is written into its own slice (write_site).
 """
+import os
+import re
+import logging
+import numpy as np
 import pandas as pd
 import netCDF4 as nc
+import chorus_utils as chutils
+import chorus_profiling as chprof
+
+logger = logging.getLogger(__name__)
+
+TIME_UNITS = 'minutes since 1970-01-01 00:00:00'
+CHUNK_DAYS = 30
+
+#name, units and CF standard name of the climatic variables in the NetCDF file
+CLIMVAR_NC = {
+    'T(C)': ('temp','degree_C','air_temperature'),
+    'RH(%)': ('rh','percent','relative_humidity'),
+    'DP(C)': ('dp','degree_C','dew_point_temperature'),
+    'Rainfall(mm)': ('rainfall','mm','precipitation_amount'),
+    'T(C)_DL': ('temp','degree_C','air_temperature'),
+    'RH(%)_DL': ('rh','percent','relative_humidity'),
+    'DP(C)_DL': ('dp','degree_C','dew_point_temperature'),
+}
+
+@chprof.profiled()
+def build_ebv(ebvs_file_name, ebvs_metadata_file, df_inf_h, df_dlog_h, df_meta, T_sample=15, chunk_days=CHUNK_DAYS, complevel=4):
+    """Function to write the harmonized data of a location to an EBV cube in the NetCDF format.
 
-def build_ebv(ebvs_file_name, ebvs_metadata_file, df_inf_h, df_dlog_h, df_meta):
-    """
     Args:
         ebvs_file_name (str): name of the NetCDF file containing the EBV-ready dataset
-        ebvs_metadata_file (str):
-        df_inf_h (pandas DataFrame):
-        df_dlog_h (pandas DataFrame):
-        df_meta (pandas DataFrame):
+        ebvs_metadata_file (str): path to an Excel or CSV file with the global attributes of the dataset
+            (columns 'attribute' and 'value'). If None, only the default attributes are written.
+        df_inf_h (pandas DataFrame): DataFrame that contains the harmonized inferences.
+        df_dlog_h (pandas DataFrame): DataFrame that contains the harmonized (or combined) climatic variables,
+            on the same slots as df_inf_h.
+        df_meta (pandas DataFrame): DataFrame that contains the metadata of the location (see get_metadata).
+            If None or empty, the coordinates are not written.
+        T_sample (int): sample period of the harmonized data in minutes.
+        chunk_days (int): number of days of each chunk (and of each block written to the file).
+        complevel (int): zlib compression level (1 to 9).
+
+    Returns:
+        ebvs_file_name (str): name of the NetCDF file.
     """
-    
+
+    species = [c for c in df_inf_h.columns if c not in ('time','date','hour')]
+    climatic_cols = [c for c in df_dlog_h.columns if c not in ('time','date','hour')]
+    if df_dlog_h.shape[0] != df_inf_h.shape[0]:
+        raise ValueError('df_inf_h and df_dlog_h must be harmonized on the same slots')
+
+    chunk_time = max(1,int(chunk_days*24*60/T_sample))
+    encoding = dict(zlib=True,shuffle=True,complevel=complevel)
+
     # Step 0: create the NetCDF file
     ds = nc.Dataset(ebvs_file_name,'w',format='NETCDF4')
+    try:
+        ds.Conventions = 'CF-1.8'
+        ds.featureType = 'timeSeries'
+        ds.title = 'EBV-ready dataset of the vocal activity of anuran amphibians'
+        ds.sample_period_minutes = T_sample
+        for attribute, value in _read_attributes(ebvs_metadata_file).items():
+            ds.setncattr(attribute,value)
+
+        # Step 1: create dimensions
+        ds.createDimension('time',None)
+        ds.createDimension('species',len(species))
+
+        # Step 2: create variables
+        times = ds.createVariable('time','i4',('time',),chunksizes=(chunk_time,),**encoding)
+        times.units = TIME_UNITS
+        times.calendar = 'standard'
+        times.standard_name = 'time'
+        times.comment = 'local time of the location'
+
+        _write_coordinates(ds,df_meta)
+        coordinates = 'lat lon' if 'lat' in ds.variables else None
+
+        species_var = ds.createVariable('species',str,('species',))
+        species_var.long_name = 'species code'
+        species_var[:] = np.array(species,dtype=object)
+
+        evas = ds.createVariable('eva','f4',('time','species'),fill_value=np.float32(np.nan),
+                                 chunksizes=(chunk_time,max(1,len(species))),**encoding)
+        evas.long_name = 'estimated vocal activity'
+        if coordinates is not None:
+            evas.coordinates = coordinates
+
+        climvars = []
+        for col in climatic_cols:
+            name, units, standard_name = CLIMVAR_NC.get(col,(_var_name(col),None,None))
+            if name in ds.variables:
+                name = _var_name(col)
+                units = None
+            var = ds.createVariable(name,'f4',('time',),fill_value=np.float32(np.nan),chunksizes=(chunk_time,),**encoding)
+            var.long_name = col
+            if units is not None:
+                var.units = units
+                var.standard_name = standard_name
+            if coordinates is not None:
+                var.coordinates = coordinates
+            climvars.append((col,var))
+
+        # Step 3: write the values in blocks of time
+        t_minutes = encode_time(df_inf_h['time'])
+        eva_values = df_inf_h[species]
+        for i in range(0,df_inf_h.shape[0],chunk_time):
+            j = min(i+chunk_time,df_inf_h.shape[0])
+            times[i:j] = t_minutes[i:j]
+            evas[i:j,:] = eva_values.iloc[i:j].to_numpy(dtype=np.float32)
+            for col, var in climvars:
+                var[i:j] = df_dlog_h[col].iloc[i:j].to_numpy(dtype=np.float32)
+    finally:
+        ds.close()
+    chprof.count_files()
+
+    return ebvs_file_name
+
+def last_time(ebvs_file_name):
+    """Function to obtain the last slot of an EBV cube.
+
+    Args:
+        ebvs_file_name (str): name of the NetCDF file containing the EBV-ready dataset
+
+    Returns:
+        t_last (numpy datetime64): time of the last slot (None if the file does not exist or has no slots).
+    """
+
+    if not os.path.exists(ebvs_file_name):
+        return None
+
+    with nc.Dataset(ebvs_file_name) as ds:
+        n_slots = ds.dimensions['time'].size
+        if n_slots == 0:
+            return None
+        return decode_time([ds['time'][n_slots-1]])[0]
+
+def sample_period(ebvs_file_name):
+    """Function to obtain the sample period in minutes of an EBV cube.
+    """
+
+    with nc.Dataset(ebvs_file_name) as ds:
+        return int(ds.sample_period_minutes)
+
+@chprof.profiled()
+def append_ebv(ebvs_file_name, df_inf_h, df_dlog_h):
+    """Function to append the harmonized data of new slots to an existing EBV cube.
+
+    Only the slots after the last slot of the cube are appended, so running it again with overlapping data does not
+    duplicate slots. Missing slots between the cube and the new data are filled with NaN to keep a regular time axis.
+    Species and climatic variables are matched by name; those that are not in the cube are ignored.
+
+    Args:
+        ebvs_file_name (str): name of the NetCDF file containing the EBV-ready dataset
+        df_inf_h (pandas DataFrame): DataFrame that contains the harmonized inferences.
+        df_dlog_h (pandas DataFrame): DataFrame that contains the harmonized (or combined) climatic variables,
+            on the same slots as df_inf_h.
+
+    Returns:
+        n_new (int): number of slots appended.
+    """
+
+    if df_dlog_h.shape[0] != df_inf_h.shape[0]:
+        raise ValueError('df_inf_h and df_dlog_h must be harmonized on the same slots')
+
+    ds = nc.Dataset(ebvs_file_name,'a')
+    try:
+        if 'site' in ds.dimensions:
+            raise ValueError('Use write_site to write to a multi-site EBV cube')
+        T_sample = int(ds.sample_period_minutes)
+        n_slots = ds.dimensions['time'].size
+        t_new = encode_time(df_inf_h['time'])
+
+        keep = np.ones(t_new.shape[0],dtype=bool)
+        if n_slots != 0:
+            t_last = int(ds['time'][n_slots-1])
+            keep = t_new > t_last
+            if np.any((t_new[keep]-t_last) % T_sample != 0):
+                raise ValueError('The new slots are not aligned with the slots of the cube')
+            t_start = t_last + T_sample
+        elif keep.any():
+            t_start = t_new[0]
+        if not keep.any():
+            return 0
+
+        t_grid = np.arange(t_start,t_new[keep][-1]+1,T_sample,dtype=np.int64)
+        pos = (t_new[keep]-t_start)//T_sample
+
+        species = list(ds['species'][:])
+        cols = [c for c in species if c in df_inf_h.columns]
+        ignored = [c for c in df_inf_h.columns if c not in species and c not in ('time','date','hour')]
+        if len(ignored) != 0:
+            logger.warning('Species not in the cube are ignored: %s', ', '.join(ignored))
+        eva = np.full((t_grid.shape[0],len(species)),np.nan,dtype=np.float32)
+        eva[np.ix_(pos,[species.index(c) for c in cols])] = df_inf_h.loc[keep,cols].to_numpy(dtype=np.float32)
+
+        climvars = []
+        for col in df_dlog_h.columns:
+            if col in ('time','date','hour'):
+                continue
+            name = _climvar_name(ds,col)
+            if name is None:
+                logger.warning('Climatic variable not in the cube is ignored: %s', col)
+                continue
+            values = np.full(t_grid.shape[0],np.nan,dtype=np.float32)
+            values[pos] = df_dlog_h.loc[keep,col].to_numpy(dtype=np.float32)
+            climvars.append((ds[name],values))
+
+        chunk_time = ds['time'].chunking()[0]
+        for i in range(0,t_grid.shape[0],chunk_time):
+            j = min(i+chunk_time,t_grid.shape[0])
+            ds['time'][n_slots+i:n_slots+j] = t_grid[i:j].astype(np.int32)
+            ds['eva'][n_slots+i:n_slots+j,:] = eva[i:j]
+            for var, values in climvars:
+                var[n_slots+i:n_slots+j] = values[i:j]
+    finally:
+        ds.close()
+    chprof.count_files()
+
+    return int(t_grid.shape[0])
+
+def default_species():
+    """Function to obtain the species codes of the enabled inference labels.
+    """
+
+    return [l.new_name for l in chutils.get_schema('inference').enabled if l.new_dtype is float]
+
+def create_site_cube(ebvs_file_name, df_meta, date_ini, date_fin, species=None, T_sample=15, ebvs_metadata_file=None,
+                     chunk_days=CHUNK_DAYS, complevel=4):
+    """Function to create an empty multi-site EBV cube with a site dimension.
+
+    Args:
+        ebvs_file_name (str): name of the NetCDF file containing the EBV-ready dataset
+        df_meta (pandas DataFrame): DataFrame that contains the metadata of the locations (see get_metadata), one row per site.
+        date_ini (str): start date in YYYY-MM-DD format.
+        date_fin (str): end date in YYYY-MM-DD format (the last slot is the last slot of this day).
+        species (list): species codes. If None, the enabled species of the inference labels.
+        T_sample (int): sample period of the harmonized data in minutes.
+        ebvs_metadata_file (str): path to an Excel or CSV file with the global attributes of the dataset.
+        chunk_days (int): number of days of each chunk.
+        complevel (int): zlib compression level (1 to 9).
+
+    Returns:
+        ebvs_file_name (str): name of the NetCDF file.
+    """
+
+    if species is None:
+        species = default_species()
+
+    t_grid = np.arange(np.datetime64(date_ini,'m'),np.datetime64(date_fin,'D')+np.timedelta64(1,'D'),
+                       np.timedelta64(T_sample,'m'))
+    chunk_time = min(max(1,int(chunk_days*24*60/T_sample)),t_grid.shape[0])
+    encoding = dict(zlib=True,shuffle=True,complevel=complevel)
+    n_sites = df_meta.shape[0]
+
+    ds = nc.Dataset(ebvs_file_name,'w',format='NETCDF4')
+    try:
+        ds.Conventions = 'CF-1.8'
+        ds.featureType = 'timeSeries'
+        ds.title = 'EBV-ready dataset of the vocal activity of anuran amphibians'
+        ds.sample_period_minutes = T_sample
+        for attribute, value in _read_attributes(ebvs_metadata_file).items():
+            ds.setncattr(attribute,value)
+
+        ds.createDimension('site',n_sites)
+        ds.createDimension('time',None)
+        ds.createDimension('species',len(species))
+
+        sites = ds.createVariable('site_id',str,('site',))
+        sites.cf_role = 'timeseries_id'
+        sites.long_name = 'location identifier'
+        sites[:] = np.array([str(l) for l in df_meta['location_ID']],dtype=object)
+
+        #coordinates of the sites, as defined by the locations labels
+        for label in chutils.get_locations_labels():
+            if (not label.enable or label.new_name not in df_meta.columns or label.new_name == 'location_ID'):
+                continue
+            if label.new_dtype is float:
+                var = ds.createVariable(label.new_name.lower(),'f8',('site',),fill_value=np.nan)
+                var.standard_name = 'latitude' if label.new_name.startswith('lat') else 'longitude'
+                var.units = 'degrees_north' if label.new_name.startswith('lat') else 'degrees_east'
+                var[:] = df_meta[label.new_name].to_numpy(dtype=float)
+            elif label.new_dtype is bool:
+                var = ds.createVariable(label.new_name.lower(),'i1',('site',))
+                var[:] = df_meta[label.new_name].fillna(False).to_numpy(dtype=np.int8)
+            else:
+                var = ds.createVariable(label.new_name.lower(),str,('site',))
+                var[:] = np.array([str(v) for v in df_meta[label.new_name]],dtype=object)
+            var.long_name = label.new_name
+        coordinates = 'lat_dl lon_dl' if 'lat_dl' in ds.variables else None
+
+        times = ds.createVariable('time','i4',('time',),chunksizes=(chunk_time,),**encoding)
+        times.units = TIME_UNITS
+        times.calendar = 'standard'
+        times.standard_name = 'time'
+        times.comment = 'local time of the location'
+        times[:] = encode_time(t_grid)
+
+        species_var = ds.createVariable('species',str,('species',))
+        species_var.long_name = 'species code'
+        species_var[:] = np.array(species,dtype=object)
+
+        evas = ds.createVariable('eva','f4',('site','time','species'),fill_value=np.float32(np.nan),
+                                 chunksizes=(1,chunk_time,max(1,len(species))),**encoding)
+        evas.long_name = 'estimated vocal activity'
+        if coordinates is not None:
+            evas.coordinates = coordinates
+
+        for name, units, standard_name in dict.fromkeys(CLIMVAR_NC.values()):
+            var = ds.createVariable(name,'f4',('site','time'),fill_value=np.float32(np.nan),
+                                    chunksizes=(1,chunk_time),**encoding)
+            var.units = units
+            var.standard_name = standard_name
+            if coordinates is not None:
+                var.coordinates = coordinates
+
+        #write the last slot so that the variables span the whole time axis: otherwise each site extends them as it
+        #is written, and reading several sites at once with a shorter extent returns misplaced values
+        for name in ['eva'] + [v[0] for v in dict.fromkeys(CLIMVAR_NC.values())]:
+            var = ds[name]
+            var[(slice(None),t_grid.shape[0]-1)] = np.full((n_sites,)+var.shape[2:],np.nan,dtype=np.float32)
+    finally:
+        ds.close()
+
+    return ebvs_file_name
+
+@chprof.profiled()
+def write_site(ebvs_file_name, location_id, df_inf_h, df_dlog_h):
+    """Function to write the harmonized data of a site to its slice of a multi-site EBV cube.
+
+    The slots outside the time axis of the cube, and the species and climatic variables that are not in the cube,
+    are ignored. The slots inside the time axis that are not on its grid (e.g. data harmonized on a grid anchored at
+    14:07 written to a cube anchored at 00:00) are not written either: they are counted and a warning is logged.
+
+    Args:
+        ebvs_file_name (str): name of the NetCDF file containing the EBV-ready dataset
+        location_id (str): location identifier.
+        df_inf_h (pandas DataFrame): DataFrame that contains the harmonized inferences of the site.
+        df_dlog_h (pandas DataFrame): DataFrame that contains the harmonized (or combined) climatic variables of the site,
+            on the same slots as df_inf_h.
+
+    Returns:
+        n_slots (int): number of slots written.
+        n_dropped (int): number of slots inside the time axis of the cube that were not written because they are not on
+            its grid.
+    """
+
+    if df_dlog_h.shape[0] != df_inf_h.shape[0]:
+        raise ValueError('df_inf_h and df_dlog_h must be harmonized on the same slots')
+
+    ds = nc.Dataset(ebvs_file_name,'a')
+    try:
+        site_ids = list(ds['site_id'][:])
+        if location_id not in site_ids:
+            raise ValueError('Location not in the EBV cube: ' + location_id)
+        site = site_ids.index(location_id)
+
+        T_sample = int(ds.sample_period_minutes)
+        t_cube = ds['time'][:]
+        offset = encode_time(df_inf_h['time']).astype(np.int64) - int(t_cube[0])
+        pos, keep, n_dropped = grid_positions(offset,T_sample,t_cube.shape[0],location_id)
+        if not keep.any():
+            return 0, n_dropped
+        i0 = int(pos.min())
+        i1 = int(pos.max()) + 1
+
+        species = list(ds['species'][:])
+        cols = [c for c in species if c in df_inf_h.columns]
+        eva = np.full((i1-i0,len(species)),np.nan,dtype=np.float32)
+        eva[np.ix_(pos-i0,[species.index(c) for c in cols])] = df_inf_h.loc[keep,cols].to_numpy(dtype=np.float32)
+        ds['eva'][site,i0:i1,:] = eva
+
+        for col in df_dlog_h.columns:
+            name = CLIMVAR_NC.get(col,(None,))[0]
+            if name is None or name not in ds.variables:
+                continue
+            values = np.full(i1-i0,np.nan,dtype=np.float32)
+            values[pos-i0] = df_dlog_h.loc[keep,col].to_numpy(dtype=np.float32)
+            ds[name][site,i0:i1] = values
+    finally:
+        ds.close()
+
+    return int(keep.sum()), n_dropped
+
+def grid_positions(offset, T_sample, n_slots, location_id=None):
+    """Function to find the positions of slots on the time axis of a multi-site EBV cube or a Zarr store.
+
+    Args:
+        offset (numpy array): minutes from the first slot of the time axis to each slot.
+        T_sample (int): sample period of the time axis in minutes.
+        n_slots (int): number of slots of the time axis.
+        location_id (str): location identifier, used in the warning about the slots that are not on the grid.
+
+    Returns:
+        pos (numpy array): positions on the time axis of the slots that are on it.
+        keep (numpy array): boolean mask of the slots that are on the time axis.
+        n_dropped (int): number of slots inside the time axis that are not on its grid.
+    """
+
+    offset = np.asarray(offset,dtype=np.int64)
+    inside = (offset >= 0) & (offset <= (n_slots-1)*T_sample)
+    keep = inside & (offset % T_sample == 0)
+    n_dropped = int(inside.sum() - keep.sum())
+    if n_dropped != 0:
+        logger.warning('%d of %d slots of %s are not on the time grid (every %d minutes) and are not written. '
+                       'Harmonize the data on the grid of the output.',n_dropped,int(inside.sum()),location_id,T_sample)
+
+    return offset[keep]//T_sample, keep, n_dropped
+
+def encode_time(time):
+    """Function to encode times as CF minutes since 1970-01-01 00:00:00.
+
+    Args:
+        time (pandas Series or array): times (datetime64).
+
+    Returns:
+        t_minutes (numpy array): minutes since 1970-01-01 00:00:00 (int32).
+    """
+
+    t = np.asarray(time,dtype='datetime64[m]')
+    return t.astype(np.int64).astype(np.int32)
+
+def decode_time(t_minutes):
+    """Function to decode CF minutes since 1970-01-01 00:00:00 to datetime64.
+    """
+
+    return np.asarray(t_minutes,dtype=np.int64).astype('datetime64[m]').astype('datetime64[ns]')
+
+def _write_coordinates(ds, df_meta):
+    """Function to write the coordinates of the datalogger (lat, lon) and the weather station (lat_ws, lon_ws).
+    """
+
+    if df_meta is None or df_meta.shape[0] == 0:
+        return
+
+    row = df_meta.iloc[0]
+    ds.location_id = str(row.get('location_ID',''))
+    for name, col, standard_name in [('lat','lat_DL','latitude'),('lon','lon_DL','longitude'),
+                                     ('lat_ws','lat_WS','latitude'),('lon_ws','lon_WS','longitude')]:
+        if col not in df_meta.columns:
+            continue
+        var = ds.createVariable(name,'f8',())
+        var.standard_name = standard_name
+        var.units = 'degrees_north' if standard_name == 'latitude' else 'degrees_east'
+        var.long_name = standard_name + (' of the weather station' if name.endswith('_ws') else ' of the datalogger')
+        var.assignValue(float(row[col]) if pd.notna(row[col]) else np.nan)
+
+def _read_attributes(ebvs_metadata_file):
+    if ebvs_metadata_file is None or not os.path.exists(ebvs_metadata_file):
+        return {}
+    if ebvs_metadata_file.lower().endswith('.csv'):
+        df = pd.read_csv(ebvs_metadata_file)
+    else:
+        df = pd.read_excel(ebvs_metadata_file,engine='openpyxl')
+    if not {'attribute','value'}.issubset(df.columns):
+        return {}
+    return {str(a): str(v) for a, v in zip(df['attribute'],df['value']) if pd.notna(a)}
+
+def _climvar_name(ds, col):
+    """Function to obtain the name of the variable of a climatic column in an existing cube (None if it is not in the cube).
+    """
+
+    for var in ds.variables.values():
+        if var.dimensions == ('time',) and getattr(var,'long_name',None) == col:
+            return var.name
+    name = CLIMVAR_NC.get(col,(_var_name(col),))[0]
+    if name in ds.variables and ds[name].dimensions == ('time',) and name != 'time':
+        return name
+    return None
+
+def _var_name(col):
+    return re.sub(r'[^0-9A-Za-z_]+','_',col).strip('_')
 
-    # Step 1: create dimensions
-    # time dimension
-    time_dim = df_inf_h.shape[0]
-    time = ds.createDimension('time', time_dim)
-    # latitud and longitud dimensions
-    lat_dim = df_meta.shape[0]
-    lon_dim = df_meta.shape[0]
-    lat = ds.createDimension('lat',lat_dim)
-    lon = ds.createDimension('lon',lon_dim)
-    # number of species dimension = estimated vocal activity dimension
-    n_species = df_inf_h.columns.str.startswith('EVA_').sum()
-    eva = ds.createDimension('eva', n_species)
-
-    # Step 2: create variables
-    times = ds.createVariable('time','f4',('time',))
-    lats = ds.createVariable('lat','f4',('lat',))
-    lons = ds.createVariable('lon','f4',('lon',))
-    evas = ds.createVariable('eva','f4',('time','eva'))
-    temps = ds.createVariable('temp','f4',('time','lat','lon',))
-    temps.units = 'degree_C'
-    rhs = ds.createVariable('rh','f4',('time','lat','lon',))
-    dps = ds.createVariable('dp','f4',('time','lat','lon',))
-
-    # Step 4: assign  values to variables
-    times = df_inf_h['Date'].values
-    lats = df_meta.loc[0,'lat_DL']
-    lons = df_meta.loc[0,'long_DL']
-    evas = df_inf_h['EVA_BOAFAB'].values
-    temps = df_dlog_h['T(C)_DL'].values
-    rhs = df_dlog_h['RH(%)_DL'].values
-    dp = df_dlog_h['DP(C)_DL'].values
-
-    ds.close()
-    
 def read_ebv(ebvs_file_name):
     """
     Args:
         ebvs_file_name (str): name of the NetCDF file containing the EBV-ready dataset
-        
+
     Returns:
         ds (netCDF4 DataStructure): DataSructure that contains the EBV-ready dataset
 
     """
     ds = nc.Dataset(ebvs_file_name)
-    
-    return ds
\ No newline at end of file
+
+    return ds
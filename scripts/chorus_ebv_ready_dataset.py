@@ -3,73 +3,117 @@
 """This script contains functions to create and read EBV-ready datasets in the Apache Parquet format.
 """
 
-import os
-import numpy as np
 import pandas as pd
-import datetime as dt
-import fnmatch
-import chorus_qc_data as qdata
-import chorus_utils as chutils
+import logging
+import chorus_catalog as chcatalog
+import chorus_harmonize_data as hdata
+import chorus_profiling as chprof
 
-def ebv_rd_create(df_inf,df_dlog,folder_path,ebv_rd_name, file_name, location_id):
-    """
+logger = logging.getLogger(__name__)
+
+def select_species(df_inf, folder_path, file_name, location_id):
+    """Function to obtain the species selected for the EBV-ready dataset of a location.
+
+    Args:
+        df_inf (pandas DataFrame): DataFrame that contains the harmonized inferences.
+        folder_path (str or DataCatalog): path to the folder (or catalog of the folder) containing the metadata file.
+        file_name (str): name of the CSV file with the species selected for the EBV-ready dataset. If None, all the
+            species of df_inf are selected.
+        location_id (str): location identifier.
+
+    Returns:
+        species (list): list of species codes (None if the metadata file was not found).
     """
 
-    find_files = []
-    for dirpath, dirs, files in os.walk(folder_path):
-        for filename in fnmatch.filter(files, file_name):
-            find_files.append(os.path.join(dirpath, filename))
-    
-    if len(find_files) == 0:
-        print('No file found.')
-        df_sel = pd.DataFrame()
+    if file_name is None:
+        species = [c for c in df_inf.columns if c not in ('time','date','hour')]
     else:
+        find_files = chcatalog.search_files(folder_path, file_name)
+    
+        if len(find_files) == 0:
+            logger.warning('No file found: %s', file_name)
+            return None
     
         df = []
         for i in range(len(find_files)):
             file_path = find_files[i]
             df.append(pd.read_csv(file_path))
+        chprof.count_files(len(find_files))
     
-        df_raw = pd.DataFrame()
-        for i in range(len(df)):
-            df_proc = df[i].copy()
-            df_raw = pd.concat([df_raw,df_proc])
+        df_raw = pd.concat(df)
 
         df_raw['site'] = df_raw['site'].replace(['INCT20'], 'INCT20955')
 
         df = df_raw[df_raw.site==location_id]
         df = df[df.EBV_ready_dataset==1]
+        species = list(df.Species)
 
-        ##create dataframe to store the EBV-ready dataset
-        df_ebv_rd = pd.DataFrame()
+    return species
 
-        df_ebv_rd['time'] = df_inf.time
-        df_ebv_rd['date'] = df_inf.date
-        df_ebv_rd['hour'] = df_inf.hour
+def ebv_rd_frame(df_inf, df_dlog, species):
+    """Function to create the DataFrame of an EBV-ready dataset with the selected species and the climatic variables.
 
-        for specie in df.Species:
-            df_ebv_rd[specie] = df_inf[specie]
+    Args:
+        df_inf (pandas DataFrame): DataFrame that contains the harmonized inferences.
+        df_dlog (pandas DataFrame): DataFrame that contains the harmonized climatic variables.
+        species (list): species codes (see select_species).
+
+    Returns:
+        df_ebv_rd (pandas DataFrame): DataFrame that contains the EBV-ready dataset.
+    """
 
-        climatic_variables = list(df_dlog.columns[3:])
+    ##create dataframe to store the EBV-ready dataset, with the date and hour columns
+    df_ebv_rd = hdata.add_date_hour(df_inf[['time']+species])
 
-        for clim_var in climatic_variables:
-            df_ebv_rd[clim_var] = df_dlog[clim_var]
+    climatic_variables = [c for c in df_dlog.columns if c not in ('time','date','hour')]
 
-        df_ebv_rd.to_parquet(folder_path+'/'+ebv_rd_name,engine='auto',compression='gzip')
+    for clim_var in climatic_variables:
+        df_ebv_rd[clim_var] = df_dlog[clim_var]
+
+    return df_ebv_rd
+
+@chprof.profiled()
+def ebv_rd_create(df_inf,df_dlog,folder_path,ebv_rd_name, file_name, location_id, out_path=None):
+    """Function to create an EBV-ready dataset in the Apache Parquet format from the harmonized data.
+    
+    Args:
+        df_inf (pandas DataFrame): DataFrame that contains the harmonized inferences.
+        df_dlog (pandas DataFrame): DataFrame that contains the harmonized climatic variables.
+        folder_path (str or DataCatalog): path to the folder (or catalog of the folder) containing the metadata file.
+        ebv_rd_name (str): name of the Apache Parquet file of the EBV-ready dataset.
+        file_name (str): name of the CSV file with the species selected for the EBV-ready dataset. If None, all the
+            species of df_inf are included.
+        location_id (str): location identifier.
+        out_path (str): path to the folder where the EBV-ready dataset is saved. If None, folder_path is used.
         
+    Returns:
+        ebv_rd_path (str): path to the EBV-ready dataset (None if the metadata file was not found).
+    """
+
+    species = select_species(df_inf,folder_path,file_name,location_id)
+    if species is None:
+        return None
+
+    df_ebv_rd = ebv_rd_frame(df_inf,df_dlog,species)
+
+    if out_path is None:
+        out_path = chcatalog.root_path(folder_path)
+    ebv_rd_path = out_path+'/'+ebv_rd_name
+    df_ebv_rd.to_parquet(ebv_rd_path,engine='auto',compression='gzip')
+    chprof.count_files()
+    
+    return ebv_rd_path
 
+@chprof.profiled()
 def ebv_rd_read(folder_path, file_name):
     """
     """
 
-    find_files = []
-    for dirpath, dirs, files in os.walk(folder_path):
-        for filename in fnmatch.filter(files, file_name):
-            find_files.append(os.path.join(dirpath, filename))
+    find_files = chcatalog.search_files(folder_path, file_name)
     
     ##open files and load them into a dataframe
     if len(find_files) == 0:
-        print('No records found.')
+        logger.warning('No records found: %s', file_name)
         df = pd.DataFrame()
         return df
     else:
@@ -77,10 +121,8 @@ def ebv_rd_read(folder_path, file_name):
         for i in range(len(find_files)):
             file_path = find_files[i]
             df.append(pd.read_parquet(file_path))
+        chprof.count_files(len(find_files))
                 
-        df_raw = pd.DataFrame()
-        for i in range(len(df)):
-            df_proc = df[i].copy()
-            df_raw = pd.concat([df_raw,df_proc])
+        df_raw = pd.concat(df)
 
         return df_raw
\ No newline at end of file
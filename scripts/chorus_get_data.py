@@ -6,26 +6,49 @@
 - Weather stations
 - Metadata files
 """
-import os
+import json
 import numpy as np
 import pandas as pd
 import datetime as dt
-import fnmatch
+import logging
+import functools
+import concurrent.futures as cf
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import chorus_cache as chcache
 import chorus_qc_data as qdata
 import chorus_utils as chutils
+import chorus_catalog as chcatalog
+import chorus_profiling as chprof
 
-def get_inference(folder_path, location_id, date_ini, date_fin,raw=False):
+logger = logging.getLogger(__name__)
+
+#key of the Parquet key-value metadata of an inference file with the JSON list of its species columns
+SPECIES_METADATA_KEY = b'species'
+
+@chprof.profiled()
+def get_inference(folder_path, location_id, date_ini, date_fin,raw=False,executor=None,max_workers=None,qc=True,discover=False):
     """Function to obtain inferences from the inference files of the machine learning models.
     
     Args:
-        folder_path (str): path to the folder containing the inference files.
+        folder_path (str or DataCatalog): path to the folder (or catalog of the folder) containing the inference files.
         location_id (str): location identifier.
         date_ini (str): start date in YYYY-MM-DD format.
         date_fin (str): end date in YYYY-MM-DD format.
         raw (boolean): flag that indicates if you want to obtain the raw data.
+        executor (str or Executor): 'thread' or 'process' to read the files in a pool of threads or processes,
+            or a concurrent.futures Executor. If None, a thread pool is used when max_workers > 1.
+        max_workers (int): maximum number of workers of the pool. If None or 1 (and executor is None), the files are read serially.
+        qc (boolean): flag that indicates if the basic quality tests (nulls and duplicates) are run. Their results are
+            stored in df_sel.attrs['qc'] (see chorus_qc_data.evaluate). Set it to False to skip them or to run them later.
+        discover (boolean): flag that indicates if the floating point columns of the files without a label are read as
+            species (see chutils.species_columns). If False, only the species of the labels and the ones listed in the
+            metadata of each file (SPECIES_METADATA_KEY) are read.
         
     Returns:
-       df_sel (pandas DataFrame): DataFrame that contains the inferences on the requested dates.
+       df_sel (pandas DataFrame): DataFrame that contains the inferences on the requested dates. The names of the
+           species columns are stored in df_sel.attrs['species'].
        df_raw (pandas DataFrame): DataFrame that contains the raw data (if required).
     """
     
@@ -35,7 +58,7 @@ def get_inference(folder_path, location_id, date_ini, date_fin,raw=False):
     try:
         date_ini_dt = dt.datetime(int(dis[0]), int(dis[1]), int(dis[2]))
     except:
-        print('Wrong Start Date')
+        logger.error('Wrong Start Date: %s', date_ini)
         df = pd.DataFrame()
         if (raw):
             return df, df
@@ -45,7 +68,7 @@ def get_inference(folder_path, location_id, date_ini, date_fin,raw=False):
     try:
         date_fin_dt = dt.datetime(int(dfs[0]), int(dfs[1]), int(dfs[2]))
     except:
-        print('Wrong End Date')
+        logger.error('Wrong End Date: %s', date_fin)
         df = pd.DataFrame()
         if (raw):
             return df, df
@@ -54,50 +77,61 @@ def get_inference(folder_path, location_id, date_ini, date_fin,raw=False):
     
     ##find files
     pattern = location_id+'_inference'+'*.gzip'
-    find_files = []
-    for dirpath, dirs, files in os.walk(folder_path):
-        for filename in fnmatch.filter(files, pattern):
-            find_files.append(os.path.join(dirpath, filename))
+    if (raw):
+        find_files = chcatalog.search_files(folder_path, pattern)
+    else:
+        find_files = chcatalog.search_files(folder_path, pattern, date_ini_dt, date_fin_dt)
     
-    ##open files and load them into a dataframe
-    if len(find_files) == 0:
-        print('No records found.')
+    ##open files and load them into a dataframe (the files without row groups on the requested dates are skipped)
+    results = []
+    if len(find_files) != 0:
+        reader = functools.partial(_read_inference_file,date_ini=date_ini_dt,date_fin=date_fin_dt,raw=raw,
+                                   discover=discover)
+        results = [r for r in _map_files(reader,find_files,executor,max_workers,'thread') if r[0] is not None]
+    
+    if len(results) == 0:
+        logger.warning('No records found for %s.', location_id)
         df = pd.DataFrame()
         if (raw):
             return df, df
         else:
             return df
     else:
+        #the files of different model versions may have different species: the union of them is kept
+        raw_col_names = []
+        species = []
         df = []
-        for i in range(len(find_files)):
-            file_path = find_files[i]
-            df.append(pd.read_parquet(file_path))
+        for df_proc, file_col_names, file_species in results:
+            df.append(df_proc)
+            raw_col_names = raw_col_names + [c for c in file_col_names if c not in raw_col_names]
+            species = species + [c for c in file_species if c not in species]
                 
-        df_raw = pd.DataFrame()
-        for i in range(len(df)):
-            df_proc = df[i].copy()
-            df_raw = pd.concat([df_raw,df_proc])
+        df_raw = pd.concat(df)
         
         df_raw = df_raw.sort_values(['date','min'])
         df_raw = df_raw.reset_index(drop=True)
         
-        ##copy enabled columns and set data types
-        inference_labels = chutils.get_inference_labels()
-        df_sel_cols = pd.DataFrame()
-    
-        raw_col_names = df_raw.columns
-    
-        for label in inference_labels:
-            if (label.enable and label.ori_name in raw_col_names):
-                df_sel_cols[label.new_name] = df_raw[label.ori_name].values
-                if (label.new_name == 'time'):
-                    df_sel_cols['time'] = df_sel_cols['date'].dt.time
-                else:
-                    df_sel_cols[label.new_name] = df_sel_cols[label.new_name].astype(label.new_dtype)
+        ##copy enabled columns and set data types, then the species columns by name
+        schema = chutils.get_schema('inference')
+        df_sel_cols = _select_columns(df_raw,schema,[c for c in raw_col_names if c not in species])
+        if ('time' in df_sel_cols.columns):
+            df_sel_cols['time'] = df_sel_cols['date'].dt.time
+        species_names = [schema.rename.get(c,c) for c in species]
+        df_species = df_raw[species].astype(float).reset_index(drop=True)
+        df_species.columns = species_names
+        df_sel_cols = pd.concat([df_sel_cols,df_species],axis=1)
     
         ##select data according to date                
         df_sel_cols = df_sel_cols.sort_values(['date','min'])
         df_sel_cols = df_sel_cols.reset_index(drop=True)
+
+        if df_sel_cols.empty:
+            logger.warning('No records found for %s.', location_id)
+            df = pd.DataFrame()
+            if (raw):
+                return df, df_raw
+            else:
+                return df
         
         di = df_sel_cols['date'][0]
         df_date_ini = dt.datetime(di.year, di.month, di.day)
@@ -106,42 +140,74 @@ def get_inference(folder_path, location_id, date_ini, date_fin,raw=False):
         df_date_fin = dt.datetime(df.year, df.month, df.day)
         
         if (df_date_ini <= date_ini_dt):
-            print('There are records SINCE the requested date.')
+            logger.info('There are records SINCE the requested date.')
         else:
             date_ini_dt = di
-            print('There are not records SINCE the requested date.')
-            print('There are only records SINCE : ' + date_ini_dt.strftime("%Y-%m-%d"))
+            logger.warning('There are not records SINCE the requested date. There are only records SINCE : %s',
+                           date_ini_dt.strftime("%Y-%m-%d"))
         
         if (df_date_fin >= date_fin_dt):
-            print('There are records UP TO the requested date.')
+            logger.info('There are records UP TO the requested date.')
         else:
             date_fin_dt = df_date_fin
-            print('There are not records UP TO the requested date.')
-            print('There are only records UP TO : '+ date_fin_dt.strftime("%Y-%m-%d"))
+            logger.warning('There are not records UP TO the requested date. There are only records UP TO : %s',
+                           date_fin_dt.strftime("%Y-%m-%d"))
         
         df_sel = df_sel_cols.loc[(df_sel_cols['date'] >= date_ini_dt) & (df_sel_cols['date'] <= date_fin_dt)]
     
         df_sel = df_sel.sort_values(['date','min'])
         df_sel = df_sel.reset_index(drop=True)
+        df_sel.attrs['species'] = species_names
 
         ##basic quality test
-        qdata.evaluate_nulls(df_sel)
-        qdata.evaluate_duplicates(df_sel)
+        if (qc):
+            df_sel.attrs['qc'] = qdata.evaluate(df_sel)
         
         if (raw):
             return df_sel, df_raw
         else:
             return df_sel
 
-def get_datalogger(folder_path, location_id, date_ini, date_fin,raw=False):
+def get_inference_species(folder_path, location_ids=None, discover=False):
+    """Function to obtain the species of the inference files from their Parquet schemas, reading only the footers of
+    the files (e.g. to create a multi-site EBV cube for the outputs of several model versions).
+
+    Args:
+        folder_path (str or DataCatalog): path to the folder (or catalog of the folder) containing the inference files.
+        location_ids (list): location identifiers. If None, the inference files of all the locations.
+        discover (boolean): flag that indicates if the floating point columns without a label are species.
+
+    Returns:
+        species (list): new names of the species, in order of appearance.
+    """
+
+    schema = chutils.get_schema('inference')
+    patterns = ['*_inference*.gzip'] if location_ids is None else [l+'_inference*.gzip' for l in location_ids]
+    species = []
+    for pattern in patterns:
+        for file_path in chcatalog.search_files(folder_path,pattern):
+            file_species = [schema.rename.get(c,c) for c in _file_species(pq.ParquetFile(file_path),discover)]
+            species = species + [c for c in file_species if c not in species]
+
+    return species
+
+@chprof.profiled()
+def get_datalogger(folder_path, location_id, date_ini, date_fin,raw=False,cache_dir=None,executor=None,max_workers=None,qc=True):
     """Function to obtain the climatic variables from the datalogger files.
     
     Args:
-        folder_path (str): path to the folder containing the datalogger files.
+        folder_path (str or DataCatalog): path to the folder (or catalog of the folder) containing the datalogger files.
         location_id (str): location identifier.
         date_ini (str): start date in YYYY-MM-DD format.
         date_fin (str): end date in YYYY-MM-DD format.
         raw (boolean): flag that indicates if you want to obtain the raw data.
+        cache_dir (str): path to the folder of the ingest cache (see chorus_cache). If None, the CHORUS_CACHE_DIR
+            environment variable is used, and if it is not set the files are always parsed.
+        executor (str or Executor): 'thread' or 'process' to read the files in a pool of threads or processes,
+            or a concurrent.futures Executor. If None, a process pool is used when max_workers > 1.
+        max_workers (int): maximum number of workers of the pool. If None or 1 (and executor is None), the files are read serially.
+        qc (boolean): flag that indicates if the basic quality tests (nulls and duplicates) are run. Their results are
+            stored in df_sel.attrs['qc'] (see chorus_qc_data.evaluate). Set it to False to skip them or to run them later.
         
     Returns:
         df_new (pandas DataFrame): DataFrame that contains the climatic variables of the datalogger on the requested dates.
@@ -154,7 +220,7 @@ def get_datalogger(folder_path, location_id, date_ini, date_fin,raw=False):
     try:
         date_ini_dt = dt.datetime(int(dis[0]), int(dis[1]), int(dis[2]))
     except:
-        print('Wrong Start Date')
+        logger.error('Wrong Start Date: %s', date_ini)
         df = pd.DataFrame()
         if (raw):
             return df, df
@@ -164,7 +230,7 @@ def get_datalogger(folder_path, location_id, date_ini, date_fin,raw=False):
     try:
         date_fin_dt = dt.datetime(int(dfs[0]), int(dfs[1]), int(dfs[2]))
     except:
-        print('Wrong End Date')
+        logger.error('Wrong End Date: %s', date_fin)
         df = pd.DataFrame()
         if (raw):
             return df, df
@@ -173,44 +239,41 @@ def get_datalogger(folder_path, location_id, date_ini, date_fin,raw=False):
     
     ##find files
     pattern = location_id + '_datalogger'+'*.xlsx'
-    find_files = []
-    for dirpath, dirs, files in os.walk(folder_path):
-        for filename in fnmatch.filter(files, pattern):
-            find_files.append(os.path.join(dirpath, filename))
+    if (raw):
+        find_files = chcatalog.search_files(folder_path, pattern)
+    else:
+        find_files = chcatalog.search_files(folder_path, pattern, date_ini_dt, date_fin_dt)
     
     ##copy enabled columns and set data types
     if len(find_files) == 0:
-        print('No records found.')
+        logger.warning('No records found for %s.', location_id)
+        df = pd.DataFrame()
         if (raw):
             return df, df
         else:
             return df
     else:
-        df_raw = pd.DataFrame()
-        list_df = []
-        for i in range(len(find_files)):
-            file_path = find_files[i]
-            df_proc = pd.read_excel(file_path,engine='openpyxl',index_col=False)
-            df_proc.columns = df_proc.loc[2].values
-            df_proc = df_proc.drop(labels=range(0,3), axis=0)
-            df_proc = df_proc.reset_index(drop=True)
-            df_raw = pd.concat([df_raw,df_proc])
-        df_raw = df_raw.reset_index(drop=True)
-    
-        datalogger_labels = chutils.get_datalogger_labels()
-        df_sel_cols = pd.DataFrame()
-    
-        raw_col_names = df_raw.columns
-    
-        for label in datalogger_labels:
-            if (label.enable and label.ori_name in raw_col_names):
-                df_sel_cols[label.new_name] = df_raw[label.ori_name].values
-                if (label.new_name != 'time'):
-                    df_sel_cols[label.new_name] = df_sel_cols[label.new_name].astype(label.new_dtype)
+        if (raw):
+            df_raw = pd.concat(_map_files(_read_datalogger_file,find_files,executor,max_workers,'process'))
+            df_raw = df_raw.reset_index(drop=True)
+            df_sel_cols = _select_datalogger_columns(df_raw)
+        else:
+            schema_key = chcache.schema_hash(chutils.get_datalogger_labels())
+            reader = functools.partial(chcache.read_cached,reader=_load_datalogger_file,schema_key=schema_key,cache_dir=cache_dir)
+            df_sel_cols = pd.concat(_map_files(reader,find_files,executor,max_workers,'process'))
+            df_sel_cols = df_sel_cols.reset_index(drop=True)
                    
          #select data according to date                
-        df_sel_cols = df_sel_cols.sort_values(by='date')
+        df_sel_cols = df_sel_cols.sort_values(['date','time'])
         df_sel_cols = df_sel_cols.reset_index(drop=True)
+
+        if df_sel_cols.empty:
+            logger.warning('No records found for %s.', location_id)
+            df = pd.DataFrame()
+            if (raw):
+                return df, df_raw
+            else:
+                return df
     
         di = df_sel_cols['date'][0]
         df_date_ini = dt.datetime(di.year, di.month, di.day)
@@ -219,40 +282,50 @@ def get_datalogger(folder_path, location_id, date_ini, date_fin,raw=False):
         df_date_fin = dt.datetime(df.year, df.month, df.day)
         
         if (df_date_ini <= date_ini_dt):
-            print('There are records SINCE the requested date.')
+            logger.info('There are records SINCE the requested date.')
         else:
             date_ini_dt = di
-            print('There are not records SINCE the requested date.')
-            print('There are only records SINCE : ' + date_ini_dt.strftime("%Y-%m-%d"))
+            logger.warning('There are not records SINCE the requested date. There are only records SINCE : %s',
+                           date_ini_dt.strftime("%Y-%m-%d"))
         
         if (df_date_fin >= date_fin_dt):
-            print('There are records UP TO the requested date.')
+            logger.info('There are records UP TO the requested date.')
         else:
             date_fin_dt = df_date_fin
-            print('There are not records UP TO the requested date.')
-            print('There are only records UP TO : '+ date_fin_dt.strftime("%Y-%m-%d"))
+            logger.warning('There are not records UP TO the requested date. There are only records UP TO : %s',
+                           date_fin_dt.strftime("%Y-%m-%d"))
         
         df_sel = df_sel_cols.loc[(df_sel_cols['date'] >= date_ini_dt) & (df_sel_cols['date'] <= date_fin_dt)]
         df_sel = df_sel.reset_index(drop=True)
 
         ##basic quality test
-        qdata.evaluate_nulls(df_sel)
-        qdata.evaluate_duplicates(df_sel)
+        if (qc):
+            df_sel.attrs['qc'] = qdata.evaluate(df_sel)
         
         if (raw):
             return df_sel, df_raw
         else:
             return df_sel
                
-def get_wstation(folder_path, location_id, date_ini, date_fin, raw=False):
+@chprof.profiled()
+def get_wstation(folder_path, location_id, date_ini, date_fin, raw=False, utc_offset=-3, cache_dir=None, executor=None, max_workers=None, qc=True):
     """Function to obtain climatic variables from the wheater station files.
     
     Args:
-        folder_path (str): path to the folder containing the weather station files.
+        folder_path (str or DataCatalog): path to the folder (or catalog of the folder) containing the weather station files.
         location_id (str): location identifier.
         date_ini (str): start date in YYYY-MM-DD format.
         date_fin (str): end date in YYYY-MM-DD format.
         raw (boolean): flag that indicates if you want to obtain the raw data.
+        utc_offset (int, float or str): offset of the local time from UTC in hours (e.g. -3) or a
+            timezone name (e.g. 'America/Sao_Paulo') used to convert the 'Hora (UTC)' column to local time.
+        cache_dir (str): path to the folder of the ingest cache (see chorus_cache). If None, the CHORUS_CACHE_DIR
+            environment variable is used, and if it is not set the files are always parsed.
+        executor (str or Executor): 'thread' or 'process' to read the files in a pool of threads or processes,
+            or a concurrent.futures Executor. If None, a process pool is used when max_workers > 1.
+        max_workers (int): maximum number of workers of the pool. If None or 1 (and executor is None), the files are read serially.
+        qc (boolean): flag that indicates if the basic quality tests (nulls and duplicates) are run. Their results are
+            stored in df_sel.attrs['qc'] (see chorus_qc_data.evaluate). Set it to False to skip them or to run them later.
 
     Returns:
        df_new (pandas DataFrame): DataFrame that contains the climatic variables of the weather station on the requested dates.
@@ -265,120 +338,41 @@ def get_wstation(folder_path, location_id, date_ini, date_fin, raw=False):
     try:
         date_ini_dt = dt.datetime(int(dis[0]), int(dis[1]), int(dis[2]))
     except:
-        print('Wrong Start Date')
+        logger.error('Wrong Start Date: %s', date_ini)
         df = pd.DataFrame()
         if (raw):
-            return df_sel, df_raw
+            return df, df
         else:
-            return df_sel
+            return df
     
     try:
         date_fin_dt = dt.datetime(int(dfs[0]), int(dfs[1]), int(dfs[2]))
     except:
-        print('Wrong End Date')
+        logger.error('Wrong End Date: %s', date_fin)
         df = pd.DataFrame()
         if (raw):
-            return df_sel, df_raw
+            return df, df
         else:
-            return df_sel
+            return df
     
     #search files
     pattern = location_id + '_wstation'+'*.xlsx'
-    find_files = []
-    for dirpath, dirs, files in os.walk(folder_path):
-        for filename in fnmatch.filter(files, pattern):
-            find_files.append(os.path.join(dirpath, filename))
+    if (raw):
+        find_files = chcatalog.search_files(folder_path, pattern)
+    else:
+        find_files = chcatalog.search_files(folder_path, pattern, date_ini_dt, date_fin_dt)
     
     if len(find_files) == 0:
-        print('No records found.')
+        logger.warning('No records found for %s.', location_id)
     else:
-        df_raw = pd.DataFrame()
-    
-        #copy enabled columns and set data types
-        wstation_labels = chutils.get_wstation_labels()
-        
-        for i in range(len(find_files)):
-            file_path = find_files[i]
-            df = pd.read_excel(file_path,engine='openpyxl',index_col=False)
-    
-            proc_col_names = df.columns
-    
-            if ('invertir' in proc_col_names):
-    
-                arr_np64 = []
-                for label in wstation_labels:
-                    if (label.enable and label.ori_name in proc_col_names):
-                        if (label.new_name == 'date'):
-                            col = label.ori_name
-                            #print(col)
-                            for i in range(len(df[col])):
-                                #print(i)
-                                if (df.invertir[i]==1):
-                                    date_real = dt.datetime(df[col][i].year, df[col][i].day, df[col][i].month,df[col][i].hour,df[col][i].minute,df[col][i].second)
-                                else:
-                                    date_real = pd.to_datetime(df[col][i])
-                                    
-                                arr_np64.append(np.datetime64(date_real))
-        
-                            df[col] = arr_np64
-                        else:
-                            df[label.ori_name] = df[label.ori_name].values
-                df = df.drop(['invertir'],axis=1)
-    
-            df_raw = pd.concat([df_raw,df])
-    
-        #copy enabled columns and set data types
-        wstation_labels = chutils.get_wstation_labels()
-        df_sel_cols = pd.DataFrame()
-    
-        raw_col_names = df_raw.columns
-    
-        for label in wstation_labels:
-            if (label.enable and label.ori_name in raw_col_names):
-                df_sel_cols[label.new_name] = df_raw[label.ori_name].values
-                if (label.new_name != 'time'):
-                        df_sel_cols[label.new_name] = df_sel_cols[label.new_name].replace('--',np.nan)
-                        df_sel_cols[label.new_name] = df_sel_cols[label.new_name].astype(label.new_dtype)
-    
-        sel_col_names = list(df_sel_cols.columns)
-    
-        if ('time' in sel_col_names):
-            #Preproccessing: converting UTC Hour to Local Hour                    
-            df_tot = df_sel_cols.copy()
-            dif_utc_hour = -3 
-            date_ini = df_tot['date'].dt.date.values[0]
-            time = []
-            corr = [21,22,23]
-            for i in range(len(df_tot)):
-                aux = int((df_tot['time'].iloc[i]/100)+dif_utc_hour)
-                if (aux < 0):
-                    d = date_ini - dt.timedelta(days=1)
-                    aux = corr[aux]
-                aux = dt.time(aux)
-                time.append(aux)
-            
-            dif_utc_hour = -3
-            delta = abs(dif_utc_hour)
-            date = []
-            date_ini = df_tot['date'].dt.date.values[0]
-            for i in range(delta):
-                aux = int((df_tot['time'].iloc[i]/100)+dif_utc_hour)
-                if (aux < 0):
-                    d = date_ini - dt.timedelta(days=1)
-                else:
-                    d = date_ini
-                date.append(d)
-                
-            for i in range(len(df_tot)-delta):
-                d = df_tot['date'].dt.date.values[i]
-                date.append(d)
-            
-            df_tot['date'] = date
-            df_tot['date'] = pd.to_datetime(df_tot['date'])
-            df_tot['time'] = time
+        if (raw):
+            df_raw = pd.concat(_map_files(_read_wstation_file,find_files,executor,max_workers,'process'))
+            df_tot = _select_wstation_columns(df_raw,utc_offset)
         else:
-            df_sel_cols.insert(1,'time',df_sel_cols['date'].dt.time)
-            df_tot = df_sel_cols.copy()
+            schema_key = chcache.schema_hash(chutils.get_wstation_labels(),utc_offset)
+            loader = functools.partial(_load_wstation_file,utc_offset=utc_offset)
+            reader = functools.partial(chcache.read_cached,reader=loader,schema_key=schema_key,cache_dir=cache_dir)
+            df_tot = pd.concat(_map_files(reader,find_files,executor,max_workers,'process'))
     
         df_tot = df_tot.reset_index(drop=True)
     
@@ -387,6 +381,14 @@ def get_wstation(folder_path, location_id, date_ini, date_fin, raw=False):
         df_sel_cols = df_tot.copy()
         df_sel_cols = df_sel_cols.sort_values(by='date')
         df_sel_cols = df_sel_cols.reset_index(drop=True)
+
+        if df_sel_cols.empty:
+            logger.warning('No records found for %s.', location_id)
+            df = pd.DataFrame()
+            if (raw):
+                return df, df_raw
+            else:
+                return df
             
         di = df_sel_cols['date'][0]
         df_date_ini = dt.datetime(di.year, di.month, di.day)
@@ -395,18 +397,18 @@ def get_wstation(folder_path, location_id, date_ini, date_fin, raw=False):
         df_date_fin = dt.datetime(df.year, df.month, df.day)
             
         if (df_date_ini <= date_ini_dt):
-            print('There are records SINCE the requested date.')
+            logger.info('There are records SINCE the requested date.')
         else:
             date_ini_dt = di
-            print('There are not records SINCE the requested date.')
-            print('There are only records SINCE : ' + date_ini_dt.strftime("%Y-%m-%d"))
+            logger.warning('There are not records SINCE the requested date. There are only records SINCE : %s',
+                           date_ini_dt.strftime("%Y-%m-%d"))
         
         if (df_date_fin >= date_fin_dt):
-            print('There are records UP TO the requested date.')
+            logger.info('There are records UP TO the requested date.')
         else:
             date_fin_dt = df_date_fin
-            print('There are not records UP TO the requested date.')
-            print('There are only records UP TO : '+ date_fin_dt.strftime("%Y-%m-%d"))
+            logger.warning('There are not records UP TO the requested date. There are only records UP TO : %s',
+                           date_fin_dt.strftime("%Y-%m-%d"))
         
         df_sel = df_sel_cols.loc[(df_sel_cols['date'] >= date_ini_dt) & (df_sel_cols['date'] <= date_fin_dt)]
         df_sel = df_sel.reset_index(drop=True)
@@ -415,53 +417,342 @@ def get_wstation(folder_path, location_id, date_ini, date_fin, raw=False):
         df_sel = df_sel.reset_index(drop=True)
     
         ##basic quality test
-        qdata.evaluate_nulls(df_sel)
-        qdata.evaluate_duplicates(df_sel)
+        if (qc):
+            df_sel.attrs['qc'] = qdata.evaluate(df_sel)
 
         if (raw):
             return df_sel, df_raw
         else:
             return df_sel
 
-def get_metadata(folder_path, file_name, location_id):
+def _map_files(func, find_files, executor=None, max_workers=None, default='thread'):
+    """Function to apply a function to every file, serially or in a pool of threads or processes.
+    
+    The results are returned in the same order as the files, whatever the order in which the workers finish.
+    
+    Args:
+        func (function): function that receives the path to a file. It must be picklable to be used in a process pool.
+        find_files (list): list of paths of the files.
+        executor (str or Executor): 'thread', 'process' or a concurrent.futures Executor. The workers of a 'process'
+            pool use the labels of this process (see chutils.process_pool); use chutils.process_pool to create an
+            Executor with the same labels.
+        max_workers (int): maximum number of workers of the pool.
+        default (str): kind of pool used when executor is None and max_workers > 1.
+        
+    Returns:
+        results (list): list with the result of func for each file.
+    """
+    
+    chprof.count_files(len(find_files))
+    if (executor is None and (max_workers is None or max_workers <= 1)) or len(find_files) <= 1:
+        return [func(file_path) for file_path in find_files]
+    
+    if executor is None:
+        executor = default
+    
+    if isinstance(executor,str):
+        if executor == 'thread':
+            pool = cf.ThreadPoolExecutor(max_workers=max_workers)
+        elif executor == 'process':
+            pool = chutils.process_pool(max_workers=max_workers)
+        else:
+            raise ValueError("executor must be 'thread', 'process' or a concurrent.futures Executor")
+        with pool:
+            return list(pool.map(func,find_files))
+    
+    return list(executor.map(func,find_files))
+
+def _read_inference_file(file_path, date_ini, date_fin, raw=False, margin=dt.timedelta(days=1), discover=False):
+    """Function to read only the enabled columns and the row groups on the requested dates of an inference file.
+
+    The footer of the file is read once: the statistics of its row groups are used to skip the row groups that can not
+    contain records on the requested dates, and its schema and key-value metadata to find the species columns (see
+    _file_species).
+    
+    Args:
+        file_path (str): path to the Parquet file.
+        date_ini (datetime): start date of the requested data.
+        date_fin (datetime): end date of the requested data.
+        raw (boolean): flag that indicates if the whole file must be read.
+        margin (timedelta): margin added to the requested dates.
+        discover (boolean): flag that indicates if the floating point columns without a label are species.
+        
+    Returns:
+        df (pandas DataFrame): DataFrame with the enabled columns of the file (or all the columns if raw). None if no
+            row group of the file can contain records on the requested dates.
+        file_col_names (list): names of the columns of the file.
+        species (list): names of the species columns of the file.
+    """
+    
+    pf = pq.ParquetFile(file_path)
+    file_col_names = pf.schema_arrow.names
+    if (raw):
+        df = pf.read(use_pandas_metadata=True).to_pandas()
+        return df, list(df.columns), _file_species(pf,discover)
+    
+    lim_inf = pd.Timestamp(date_ini - margin)
+    lim_sup = pd.Timestamp(date_fin + margin)
+    row_groups = _row_groups_on_dates(pf.metadata,lim_inf,lim_sup)
+    if len(row_groups) == 0:
+        return None, file_col_names, []
+    
+    species = _file_species(pf,discover)
+    schema = chutils.get_schema('inference')
+    
+    #the time column is obtained from the date, so it does not need to be read
+    columns = [c for c in schema.columns if (c in file_col_names and c not in species and schema.rename[c] != 'time')]
+    columns = columns + species
+    table = pf.read_row_groups(row_groups,columns=columns,use_pandas_metadata=True)
+    try:
+        dates = table.column('date')
+        table = table.filter(pc.and_(pc.greater_equal(dates,pa.scalar(lim_inf,dates.type)),
+                                     pc.less_equal(dates,pa.scalar(lim_sup,dates.type))))
+    except (KeyError,TypeError,ValueError,pa.ArrowNotImplementedError):
+        pass
+    
+    return table.to_pandas(), file_col_names, species
+
+def _file_species(pf, discover=False):
+    """Function to obtain the species columns of an inference file from its footer.
+
+    The species listed in the key-value metadata of the file (a JSON list under SPECIES_METADATA_KEY, e.g. written by
+    the model) are species even if they have no label; the other columns are classified by their labels (see
+    chutils.species_columns).
+
+    Args:
+        pf (ParquetFile): inference file.
+        discover (boolean): flag that indicates if the floating point columns without a label are species.
+
+    Returns:
+        species (list): names of the species columns of the file.
+    """
+
+    arrow_schema = pf.schema_arrow
+    declared = None
+    metadata = arrow_schema.metadata or {}
+    if SPECIES_METADATA_KEY in metadata:
+        try:
+            declared = [str(c) for c in json.loads(metadata[SPECIES_METADATA_KEY])]
+        except (ValueError,TypeError):
+            logger.warning('Wrong list of species in the Parquet metadata: %r', metadata[SPECIES_METADATA_KEY][:100])
+
+    return chutils.species_columns(arrow_schema.names,[pa.types.is_floating(f.type) for f in arrow_schema],discover,
+                                   declared)
+
+def _row_groups_on_dates(metadata, lim_inf, lim_sup):
+    """Function to find, using only the statistics of the row groups, the row groups of a Parquet file that can contain
+    records between two dates.
+    
+    Args:
+        metadata (FileMetaData): metadata of the Parquet file.
+        lim_inf (Timestamp): first date.
+        lim_sup (Timestamp): last date.
+        
+    Returns:
+        row_groups (list): indices of the row groups. All of them if the file has no date column or no statistics.
+    """
+    
+    row_groups = list(range(metadata.num_row_groups))
+    try:
+        idx = metadata.schema.names.index('date')
+    except ValueError:
+        return row_groups
+    
+    selected = []
+    for i in row_groups:
+        stats = metadata.row_group(i).column(idx).statistics
+        if (stats is None or not stats.has_min_max):
+            return row_groups
+        try:
+            if (pd.Timestamp(stats.min) <= lim_sup and pd.Timestamp(stats.max) >= lim_inf):
+                selected.append(i)
+        except (TypeError,ValueError):
+            return row_groups
+    
+    return selected
+
+def _swap_day_month(dates, mask):
+    """Function to swap the day and the month of the selected dates (dates read with the wrong format).
+    
+    Args:
+        dates (pandas Series): Series of dates.
+        mask (pandas Series): boolean Series that indicates the dates that must be swapped.
+        
+    Returns:
+        dates (pandas Series): Series of datetime64[ns] with the corrected dates.
+    """
+    
+    dates = pd.to_datetime(dates)
+    mask = mask.fillna(False).astype(bool).values
+    if mask.any():
+        sel = dates[mask]
+        swapped = pd.to_datetime(pd.DataFrame({'year':sel.dt.year,'month':sel.dt.day,'day':sel.dt.month,
+                                               'hour':sel.dt.hour,'minute':sel.dt.minute,'second':sel.dt.second}))
+        dates = dates.copy()
+        dates[mask] = swapped.values
+    
+    return dates
+
+def _utc_to_local(dates, hours_utc, utc_offset):
+    """Function to convert dates and hours in UTC to local time.
+    
+    Args:
+        dates (pandas Series): Series of dates (datetime64) in UTC.
+        hours_utc (pandas Series): Series of hours in UTC in HHMM format (e.g. 0, 100, 2300).
+        utc_offset (int, float or str): offset of the local time from UTC in hours or a timezone name.
+        
+    Returns:
+        local_time (pandas Series): Series of datetime64[ns] with the local date and time of every row.
+    """
+    
+    hhmm = pd.to_numeric(hours_utc,errors='coerce')
+    utc_time = (pd.to_datetime(dates).dt.normalize()
+                + pd.to_timedelta(hhmm//100,unit='h')
+                + pd.to_timedelta(hhmm%100,unit='m'))
+    
+    if isinstance(utc_offset,str):
+        local_time = utc_time.dt.tz_localize('UTC').dt.tz_convert(utc_offset).dt.tz_localize(None)
+    else:
+        local_time = utc_time + pd.to_timedelta(utc_offset,unit='h')
+    
+    return local_time
+
+@chprof.profiled()
+def get_metadata(folder_path, file_name, location_id=None, cache_dir=None):
     """Function to obtain basic metadata of the location from a metadata file.
     
     Args:
-        folder_path (str): path to the folder containing the metadata file.
+        folder_path (str or DataCatalog): path to the folder (or catalog of the folder) containing the metadata file.
         file_name (str): name of the metadata file.
+        location_id (str): location identifier. If None, the metadata of all the locations is returned.
+        cache_dir (str): path to the folder of the ingest cache (see chorus_cache). If None, the CHORUS_CACHE_DIR
+            environment variable is used, and if it is not set the file is always parsed.
         
     Returns:
        df_sel (pandas DataFrame): DataFrame that contains the metadata information.
     """
     
-    find_files = []
-    for dirpath, dirs, files in os.walk(folder_path):
-        for filename in fnmatch.filter(files, file_name):
-            find_files.append(os.path.join(dirpath, filename))
+    find_files = chcatalog.search_files(folder_path, file_name)
 
     if len(find_files) == 0:
-        print('No file found.')
+        logger.warning('No file found: %s', file_name)
         df_sel = pd.DataFrame()
     else:
 
+        schema_key = chcache.schema_hash(chutils.get_locations_labels())
         df = []
         for i in range(len(find_files)):
             file_path = find_files[i]
-            df.append(pd.read_excel(file_path,engine='openpyxl',index_col=False))
+            df.append(chcache.read_cached(file_path,_load_metadata_file,schema_key,cache_dir))
+        chprof.count_files(len(find_files))
 
-        df_raw = pd.DataFrame()
-        for i in range(len(df)):
-            df_proc = df[i].copy()
-            df_raw = pd.concat([df_raw,df_proc])
+        df_sel_cols = pd.concat(df)
 
-        locations_labels = chutils.get_locations_labels()
-        df_sel_cols = pd.DataFrame()
+        if location_id is None:
+            df_sel = df_sel_cols
+        else:
+            df_sel = df_sel_cols.loc[df_sel_cols['location_ID']==location_id]
+        df_sel = df_sel.reset_index(drop=True)
+    
+    return df_sel
 
-        for label in locations_labels:
-            if label.enable:
-                df_sel_cols[label.new_name] = df_proc[label.ori_name].values
+def _read_datalogger_file(file_path):
+    """Function to read a datalogger file, using the third row as header.
+    """
+    
+    df_proc = pd.read_excel(file_path,engine='openpyxl',index_col=False)
+    df_proc.columns = df_proc.loc[2].values
+    df_proc = df_proc.drop(labels=range(0,3), axis=0)
+    df_proc = df_proc.reset_index(drop=True)
+    
+    return df_proc
 
-        df_sel = df_sel_cols.loc[df_sel_cols['location_ID']==location_id]
-        df_sel = df_sel.reset_index(drop=True)
+def _select_datalogger_columns(df_raw):
+    """Function to copy the enabled columns of the datalogger data and set their data types.
+    """
     
-    return df_sel
\ No newline at end of file
+    return _select_columns(df_raw,chutils.get_schema('datalogger'))
+
+def _select_columns(df_raw, schema, raw_col_names=None, nulls=None):
+    """Function to copy the enabled columns of a source that are in the raw data, in the order of the labels, with a
+    single rename and a single conversion of the data types (the time columns are kept as they are).
+
+    Args:
+        df_raw (pandas DataFrame): raw data.
+        schema (LabelSchema): label schema of the source (see chutils.get_schema).
+        raw_col_names (list): names of the raw columns. If None, the columns of df_raw. The enabled columns that are in
+            raw_col_names but not in df_raw (e.g. the time of the inferences) are created empty.
+        nulls (list): values replaced with NaN before converting the data types (e.g. '--').
+
+    Returns:
+        df_sel_cols (pandas DataFrame): DataFrame with the enabled columns and their new names.
+    """
+
+    if raw_col_names is None:
+        raw_col_names = df_raw.columns
+    columns = [c for c in schema.columns if c in raw_col_names]
+    df_sel_cols = df_raw.reindex(columns=columns).rename(columns=schema.rename).reset_index(drop=True)
+
+    dtypes = {c: schema.dtypes[c] for c in df_sel_cols.columns if c in schema.dtypes}
+    if nulls is not None:
+        df_sel_cols[list(dtypes)] = df_sel_cols[list(dtypes)].replace(nulls,np.nan)
+
+    return df_sel_cols.astype(dtypes)
+
+def _load_datalogger_file(file_path):
+    return _select_datalogger_columns(_read_datalogger_file(file_path))
+
+def _read_wstation_file(file_path):
+    """Function to read a weather station file, fixing the dates with the day and the month swapped.
+    """
+    
+    schema = chutils.get_schema('wstation')
+    df = pd.read_excel(file_path,engine='openpyxl',index_col=False)
+
+    proc_col_names = df.columns
+
+    if ('invertir' in proc_col_names):
+        for ori_name in schema.columns:
+            if (ori_name in proc_col_names and schema.rename[ori_name] == 'date'):
+                df[ori_name] = _swap_day_month(df[ori_name],df['invertir']==1)
+        df = df.drop(['invertir'],axis=1)
+    
+    return df
+
+def _select_wstation_columns(df_raw, utc_offset):
+    """Function to copy the enabled columns of the weather station data, set their data types and convert the UTC hour to local time.
+    """
+    
+    df_sel_cols = _select_columns(df_raw,chutils.get_schema('wstation'),nulls=['--'])
+
+    sel_col_names = list(df_sel_cols.columns)
+
+    if ('time' in sel_col_names):
+        #Preproccessing: converting UTC Hour to Local Hour                    
+        df_tot = df_sel_cols.copy()
+        local_time = _utc_to_local(df_tot['date'],df_tot['time'],utc_offset)
+        df_tot['date'] = local_time.dt.normalize()
+        df_tot['time'] = local_time.dt.time
+    else:
+        df_sel_cols.insert(1,'time',df_sel_cols['date'].dt.time)
+        df_tot = df_sel_cols.copy()
+    
+    return df_tot
+
+def _load_wstation_file(file_path, utc_offset):
+    return _select_wstation_columns(_read_wstation_file(file_path),utc_offset)
+
+def _read_metadata_file(file_path):
+    return pd.read_excel(file_path,engine='openpyxl',index_col=False)
+
+def _select_locations_columns(df_raw):
+    """Function to copy the enabled columns of the locations metadata.
+    """
+    
+    schema = chutils.get_schema('locations')
+    df_sel_cols = df_raw[schema.columns].rename(columns=schema.rename)
+    
+    return df_sel_cols.reset_index(drop=True)
+
+def _load_metadata_file(file_path):
+    return _select_locations_columns(_read_metadata_file(file_path))
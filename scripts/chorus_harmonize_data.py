@@ -1,152 +1,196 @@
 #!/usr/bin/env python3
 
 """This script contains functions to harmonize the data from inferences and climate variables using the temporal variable with a resolution of 15 minutes.
+
+The harmonized DataFrames have a single 'time' column (datetime64[ns]) with the slots of the grid. The 'date' and 'hour'
+columns of the EBV-ready datasets are created only when they are exported (see add_date_hour). The values are stored in
+a single float32 block (HARMONIZED_DTYPE), the precision of the NetCDF EBV cube and of the Zarr store.
 """
 import numpy as np
 import pandas as pd
-import datetime as dt
+import logging
 import chorus_utils as chutils
-import chorus_qc_data as qdata
+import chorus_profiling as chprof
+
+logger = logging.getLogger(__name__)
+
+#data type of the values of the harmonized DataFrames (columns with a float label), so that the writers of the NetCDF
+#EBV cube and of the Zarr store (float32 variables) use them without converting them
+HARMONIZED_DTYPE = np.float32
+
+#sources of each combined climatic variable, in order of priority. A source with several columns is their mean,
+#available only when all of them are available.
+CLIMVAR_PRIORITY = {
+    'T(C)': [('T(C)_DL',), ('T_max(C)_WS','T_min(C)_WS'), ('T_max(C)_WS',), ('T_min(C)_WS',)],
+    'RH(%)': [('RH(%)_DL',), ('RH(%)_WS',), ('RH_max(%)_WS','RH_min(%)_WS')],
+    'DP(C)': [('DP(C)_DL',), ('DP(C)_WS',), ('DP_max(C)_WS','DP_min(C)_WS')],
+    'Rainfall(mm)': [('Rainfall(mm)_WS',)],
+}
 
-def harmonize_inference(df_inf,time_list_np64,date_list,hour_list):
+@chprof.profiled()
+def harmonize_inference(df_inf,t_grid,T_sample=15):
     
-    time_cols = ['time','date','hour']
-    eva_cols = df_inf.columns[4:].values.tolist()
-    column_names = time_cols + eva_cols
-    df_inf_h = pd.DataFrame(columns = column_names,)
+    #the species are carried by name, so that any model (and any number of species) can be harmonized
+    eva_cols = _species(df_inf)
     
-    df_inf_h['time'] = time_list_np64
-    df_inf_h['date'] = date_list
-    df_inf_h['hour'] = hour_list
-    df_aux = df_inf.groupby("date")[eva_cols].max()
-    for i in range(len(df_inf_h)):
-        values = df_aux[df_aux.index.values == df_inf_h.time.values[i]]
-        if len(values) != 0:
-            df_inf_h.iloc[i,3:] = values.values[0]
+    #floor every record to the start of its sample period (anchored at the first slot of the grid),
+    #take the maximum per period and align the result with the grid in a single pass
+    values = None
+    if len(t_grid) != 0:
+        t_ini = np.datetime64(t_grid[0],'ns')
+        period = np.timedelta64(T_sample,'m').astype('timedelta64[ns]')
+        dates = df_inf['date'].values.astype('datetime64[ns]')
+        buckets = t_ini + ((dates - t_ini) // period) * period
+        values = df_inf[eva_cols].groupby(buckets).max().reindex(t_grid).values
     
-    labels = chutils.get_inference_labels()
-    for label in labels:
-        if (label.new_name in column_names):
-            if (label.new_name != 'date' and label.new_name != 'time'):
-                df_inf_h[label.new_name] = df_inf_h[label.new_name].astype(label.new_dtype)
+    #the frame is built once: on the reindexed values, or as a NaN block if the grid is empty
+    df_inf_h = _harmonized_frame(t_grid,eva_cols,chutils.get_schema('inference'),values)
     
-    print("Harmonized Inference Data")
+    df_inf_h.attrs['species'] = eva_cols
+    logger.info("Harmonized Inference Data")
     
     #qdata.evaluate_nulls(df_inf_h)
     #qdata.evaluate_duplicates(df_inf_h)
     
     return df_inf_h
 
-def interpolation(X,Y,value):
-    # calculate the mean of X and Y using the numpy's built-in method mean()
-    mean_x = np.mean(X)
-    mean_y = np.mean(Y)
-    # total number of input values
-    m = len(X)
-    # using the formula to calculate m and b
-    numer = 0
-    denom = 0
-    for i in range(m):
-      numer += (X[i] - mean_x) * (Y[i] - mean_y)
-      denom += (X[i] - mean_x) ** 2
-    m = numer / denom
-    b = mean_y - (m * mean_x)
+def _species(df_inf):
+    """Function to obtain the species columns of inference data: the ones stored in df_inf.attrs['species'] by
+    get_inference or, if there are none, the ones of the labels (see chutils.species_columns).
+    """
+
+    if 'species' in df_inf.attrs:
+        return [c for c in df_inf.attrs['species'] if c in df_inf.columns]
+    is_float = [pd.api.types.is_float_dtype(t) for t in df_inf.dtypes]
+
+    return chutils.species_columns(list(df_inf.columns),is_float)
+
+def _datetime_key(df):
+    """Function to combine the date and time columns of a DataFrame into a single datetime64[ns] array.
     
-    pred = b + m * value
+    Args:
+        df (pandas DataFrame): DataFrame with a 'date' column (datetime64) and a 'time' column (datetime.time objects
+            or strings in HH:MM[:SS] format).
+        
+    Returns:
+        key (numpy array): array of datetime64[ns] with the date and the time of each record.
+    """
     
-    return round(pred,1)
-
-def median(Y):
-    return np.median(Y)
+    dates = pd.to_datetime(df['date']).dt.normalize().values
+    text = df['time'].astype(str)
+    text = text.where(text.str.count(':') != 1, text + ':00')
+    offset = pd.to_timedelta(text,errors='coerce').values
+    
+    return dates + offset
 
-def harmonize_datalogger(df,time_list_np64,date_list,hour_list,T_sample):
+def windowed_regression(t_obs,values,t_grid,T_sample):
+    """Function to estimate the value of several variables on a time grid by a linear regression over the observations
+    that fall within +/- T_sample minutes of each slot (and on the same day).
     
-    time_cols = ['time','date','hour']
+    Args:
+        t_obs (numpy array): sorted datetime64[ns] array with the time of the observations.
+        values (numpy array): 2D array (observations x variables) with the observed values.
+        t_grid (numpy array): datetime64[ns] array with the time of the slots.
+        T_sample (int): half width of the regression window in minutes.
+        
+    Returns:
+        pred (numpy array): 2D array (slots x variables) with the estimated values rounded to one decimal.
+    """
+    
+    t_obs = np.asarray(t_obs,dtype='datetime64[ns]')
+    t_grid = np.asarray(t_grid,dtype='datetime64[ns]')
+    values = np.asarray(values,dtype=float)
+    pred = np.full((len(t_grid),values.shape[1]),np.nan)
+    if (len(t_obs) == 0 or len(t_grid) == 0):
+        return pred
+    
+    #window limits of each slot, clipped to the day of the slot
+    th = np.timedelta64(T_sample,'m')
+    day_ini = t_grid.astype('datetime64[D]').astype('datetime64[ns]')
+    day_fin = day_ini + np.timedelta64(1,'D') - np.timedelta64(1,'ns')
+    lo = np.searchsorted(t_obs,np.maximum(t_grid-th,day_ini),side='left')
+    hi = np.searchsorted(t_obs,np.minimum(t_grid+th,day_fin),side='right')
+    n = hi - lo
+    
+    #gather the observations of every window into a (slots x window) matrix
+    width = n.max()
+    if (width < 2):
+        return pred
+    pos = lo[:,None] + np.arange(width)[None,:]
+    mask = pos < hi[:,None]
+    pos = np.where(mask,pos,0)
+    
+    #x in minutes relative to the slot, so that the prediction is the intercept of the fitted line
+    x = (t_obs[pos] - t_grid[:,None]).astype('timedelta64[s]').astype(float)/60
+    x = np.where(mask,x,0)
+    nw = np.maximum(n,1)
+    mean_x = x.sum(axis=1)/nw
+    dx = np.where(mask,x-mean_x[:,None],0)
+    denom = (dx**2).sum(axis=1)
+    
+    y = np.where(mask[:,:,None],values[pos],0)
+    mean_y = y.sum(axis=1)/nw[:,None]
+    numer = (dx[:,:,None]*(y-mean_y[:,None,:])*mask[:,:,None]).sum(axis=1)
+    
+    with np.errstate(divide='ignore',invalid='ignore'):
+        m = numer/denom[:,None]
+        b = mean_y - m*mean_x[:,None]
+    fitted = (n >= 2) & (denom > 0)
+    pred[fitted] = np.round(b[fitted],1)
+    
+    return pred
+
+@chprof.profiled()
+def harmonize_datalogger(df,t_grid,T_sample):
     
     climatic_cols = list(df.columns[2:])
-    column_names = time_cols + climatic_cols
-    df_h = pd.DataFrame(columns = column_names)
-    
-    df_h['time'] = time_list_np64
-    df_h['date'] = date_list
-    df_h['hour'] = hour_list
-    
-    lim_inf = 0
-    
-    for i in range (len(time_list_np64)):
-    
-        idx = []
-        th = T_sample
-        df_aux = df[df['date'] == np.datetime64(date_list[i])]
-        if (df_aux.shape[0] != 0):
-            df_aux = df_aux.sort_values(by='time')
-            df_aux = df_aux.reset_index(drop=True)
-            t1 = hour_list[i]
-            for k in range (lim_inf,df_aux.shape[0]):
-                t2 = df_aux.time[k]
-                datetime1 = dt.datetime.combine(date_list[i], t1)
-                datetime2 = dt.datetime.combine(date_list[i], t2)
-                d = datetime2 - datetime1
-                d_min = d.total_seconds()/60
-                if (abs(d_min)<=th):
-                        idx.append(k)
-                if d_min > th:
-                    break
-    
-            if (len(idx) != 0):
-                xs = []
-                ys = []
-                for j in range(3,len(column_names)):
-                    for k in idx:
-                        xs.append(df_aux.iloc[k]['time'].hour*60+df_aux.iloc[k]['time'].minute)
-                        ys.append(df_aux.iloc[k][j-1])
-                    x_interp = hour_list[i].hour*60+hour_list[i].minute
-                    y_interp = interpolation(xs, ys, x_interp)
-                    df_h.iloc[i,j] = y_interp
+    
+    #sort the readings once and fit every slot and every variable at the same time
+    t_obs = _datetime_key(df)
+    valid = ~np.isnat(t_obs)
+    order = np.argsort(t_obs[valid],kind='stable')
+    t_obs = t_obs[valid][order]
+    values = df[climatic_cols].to_numpy(dtype=float)[valid][order]
+    
+    df_h = _harmonized_frame(t_grid,climatic_cols,chutils.get_schema('datalogger'),
+                             windowed_regression(t_obs,values,t_grid,T_sample))
             
-    print("\nHarmonized Climatic Variables from Datalogger\n")
+    logger.info("Harmonized Climatic Variables from Datalogger")
     #qdata.evaluate_nulls(df_h)
     #qdata.evaluate_duplicates(df_h)
         
     return df_h
 
-def harmonize_wstation(df,time_list_np64,date_list,hour_list,T_sample):
+@chprof.profiled()
+def harmonize_wstation(df,t_grid,T_sample,exact=True):
             
-    time_cols = ['time','date','hour']
-
     climatic_cols = list(df.columns[2:])
-    column_names = time_cols + climatic_cols
-    df_h = pd.DataFrame(columns = column_names)
-    
-    df_h['time'] = time_list_np64
-    df_h['date'] = date_list
-    df_h['hour'] = hour_list
-
-    type_df = str(type(df.date.values[0]))
-
-    if type_df != "<class 'numpy.datetime64'>":
-        for i in range (len(time_list_np64)):
-            df_aux = df[df['date'] == np.datetime64(date_list[i])]
-            df_aux = df_aux.sort_values(by='time')
-            df_aux = df_aux.reset_index(drop=True)
-            df_sel = df_aux[df_aux['time']==hour_list[i]]
-            if (df_sel.shape[0] != 0):
-                for j in range (3,df_sel.shape[1]):
-                        df_h.at[i,column_names[j]] = df_sel.iloc[0,j-1]
+
+    #join the readings with the grid on a combined date and time key: an exact match by default,
+    #or the nearest reading within T_sample minutes of the slot
+    df_ws = df[climatic_cols].copy()
+    df_ws['time'] = _datetime_key(df)
+    df_ws = df_ws.dropna(subset=['time'])
+    df_ws = df_ws.sort_values(by='time',kind='stable')
+    df_ws = df_ws.drop_duplicates(subset='time',keep='first')
+    
+    if (exact):
+        tolerance = pd.Timedelta(0)
     else:
-        for i in range (len(time_list_np64)):
-            df_sel = df[df['date'] == time_list_np64[i]]
-            if (df_sel.shape[0] != 0):
-                for j in range (3,df_sel.shape[1]+1):
-                    df_h.at[i,column_names[j]] = df_sel.iloc[0,j-1]
+        tolerance = pd.Timedelta(minutes=T_sample)
+    
+    df_grid = pd.DataFrame({'time':np.asarray(t_grid,dtype='datetime64[ns]')})
+    df_join = pd.merge_asof(df_grid,df_ws,on='time',direction='nearest',tolerance=tolerance)
+    df_h = _harmonized_frame(t_grid,climatic_cols,chutils.get_schema('wstation'),df_join[climatic_cols].values)
                 
-    print("Harmonized Climatic Variables from Weather Station")
+    logger.info("Harmonized Climatic Variables from Weather Station")
     #qdata.evaluate_nulls(df_h)
     #qdata.evaluate_duplicates(df_h)
     
     return df_h
 
-def harmonize3(df_inf,df_dlog,df_wst,T_sample = 15):
+@chprof.profiled()
+def harmonize3(df_inf,df_dlog,df_wst,T_sample = 15,ws_exact = True):
     """
     Function to harmonize information from inferences, dataloggers and weather stations.
     
@@ -154,6 +198,9 @@ def harmonize3(df_inf,df_dlog,df_wst,T_sample = 15):
         df_inf (pandas DataFrame): DataFrame that contains the information of the inferences.
         df_dlog (pandas DataFrame): DataFrame that contains the information of the climatic variables of the dataloggers.
         df_wst (pandas DataFrame): DataFrame that contains the information of the climatic variables of the weather stations.
+        T_sample (int): sample period of the harmonized data in minutes.
+        ws_exact (boolean): flag that indicates if the weather station readings must match the slots exactly (True)
+            or if the nearest reading within T_sample minutes is used (False).
         
     Returns:
        df_inf_h (pandas DataFrame): DataFrame that contains the harmonized information of the inferences.
@@ -163,21 +210,15 @@ def harmonize3(df_inf,df_dlog,df_wst,T_sample = 15):
     
     dini = df_inf.date[0]
     dfin = df_inf.date[len(df_inf)-1]
-    freq = str(T_sample)+"min"
-    time_list_ts = pd.date_range(dini, dfin, freq=freq)
-    time_list_np64 = np.array(time_list_ts,dtype=np.dtype('datetime64[ns]'))
-    date_list = []
-    hour_list = []
-    for ts in time_list_ts:
-        date_list.append(ts.date())
-        hour_list.append(ts.time())
-
-    df_inf_h = harmonize_inference(df_inf,time_list_np64,date_list,hour_list)
-    df_dlog_h = harmonize_datalogger(df_dlog,time_list_np64,date_list,hour_list,T_sample)
-    df_wst_h = harmonize_wstation(df_wst,time_list_np64,date_list,hour_list,T_sample)
+    t_grid = time_grid(dini,dfin,T_sample)
+
+    df_inf_h = harmonize_inference(df_inf,t_grid,T_sample)
+    df_dlog_h = harmonize_datalogger(df_dlog,t_grid,T_sample)
+    df_wst_h = harmonize_wstation(df_wst,t_grid,T_sample,ws_exact)
 
     return df_inf_h,df_dlog_h,df_wst_h
 
+@chprof.profiled()
 def harmonize2(df_inf,df_dlog,T_sample = 15):
     """
     Function to harmonize information from inferences, dataloggers and weather stations.
@@ -195,45 +236,257 @@ def harmonize2(df_inf,df_dlog,T_sample = 15):
     
     dini = df_inf.date[0]
     dfin = df_inf.date[len(df_inf)-1]
-    freq = str(T_sample)+"min"
-    time_list_ts = pd.date_range(dini, dfin, freq=freq)
-    time_list_np64 = np.array(time_list_ts,dtype=np.dtype('datetime64[ns]'))
-    date_list = []
-    hour_list = []
-    for ts in time_list_ts:
-        date_list.append(ts.date())
-        hour_list.append(ts.time())
-
-    df_inf_h = harmonize_inference(df_inf,time_list_np64,date_list,hour_list)
-    df_dlog_h = harmonize_datalogger(df_dlog,time_list_np64,date_list,hour_list,T_sample)
+    t_grid = time_grid(dini,dfin,T_sample)
+
+    df_inf_h = harmonize_inference(df_inf,t_grid,T_sample)
+    df_dlog_h = harmonize_datalogger(df_dlog,t_grid,T_sample)
     
     return df_inf_h,df_dlog_h
 
-def combine_climvar(df_dlog, df_wst):
-    
-    time_cols = ['time','date','hour']
-    climatic_cols = ['T(C)','RH(%)','DP(C)','Rainfall(mm)']
-    column_names = time_cols + climatic_cols
-    df_climvar = pd.DataFrame(columns = column_names)
-    
-    df_climvar.time = df_dlog.time
-    df_climvar.date = df_dlog.date
-    df_climvar.hour = df_dlog.hour
-    
-    for i in range(df_climvar.shape[0]):
-        #temperature
-        if (np.isnan(df_dlog['T(C)_DL'][i])!=1):
-            df_climvar.at[i,'T(C)'] = df_dlog.loc[i,'T(C)_DL']
-        elif (np.isnan(df_wst['T_max(C)_WS'][i])!=1 and np.isnan(df_wst['T_min(C)_WS'][i])!=1):
-            temp = (df_wst['T_max(C)_WS'][i]+df_wst['T_min(C)_WS'][i])/2
-            df_climvar.at[i,'T(C)'] = temp
-        elif (np.isnan(df_wst['T_max(C)_WS'][i])!=1):
-            df_climvar.at[i,'T(C)'] = df_dlog.loc[i,'T_max(C)_WS']
-        elif (np.isnan(df_wst['T_max(C)_WS'][i])!=1):
-            df_climvar.at[i,'T(C)'] = df_dlog.loc[i,'T_max(C)_WS']
-    
-    df_climvar['RH(%)'] = df_dlog['RH(%)_DL']
-    df_climvar['DP(C)'] = df_dlog['DP(C)_DL']
-    df_climvar['Rainfall(mm)'] = df_wst['Rainfall(mm)_WS']
-
-    return df_climvar
\ No newline at end of file
+def time_windows(t_ini, t_fin, window='MS', T_sample=15):
+    """Function to split the slots of a time grid into consecutive windows (e.g. calendar months).
+
+    Args:
+        t_ini (str or datetime): first slot of the grid.
+        t_fin (str or datetime): end of the grid (the last slot is the last one not after t_fin).
+        window (str): pandas frequency of the start of the windows (e.g. 'MS' for months, '7D' for weeks).
+        T_sample (int): sample period of the grid in minutes.
+
+    Returns:
+        windows (list): list of tuples (first slot, last slot) of each window, as pandas Timestamps.
+    """
+
+    t_ini = pd.Timestamp(t_ini)
+    t_fin = pd.Timestamp(t_fin)
+    period = pd.Timedelta(minutes=T_sample)
+    if (t_fin < t_ini):
+        return []
+
+    #every window starts at the first slot of the grid on or after the start of its period
+    starts = [t_ini]
+    for b in pd.date_range(t_ini.normalize(),t_fin,freq=window):
+        start = t_ini - ((t_ini - b) // period) * period
+        if (start > starts[-1] and start <= t_fin):
+            starts.append(start)
+    t_last = t_ini + ((t_fin - t_ini) // period) * period
+    ends = [s - period for s in starts[1:]] + [t_last]
+
+    return list(zip(starts,ends))
+
+@chprof.profiled()
+def harmonize_window(df_inf, df_dlog, df_wst, t_ini, t_fin, T_sample=15, ws_exact=True):
+    """Function to harmonize the data of a window of the time grid (see time_windows).
+
+    Only the records that can contribute to the slots of the window are used: the inferences of each slot and the
+    datalogger and weather station readings within T_sample minutes of the first and last slots, so that the
+    regression window of the datalogger is complete at the edges of the window. The concatenation of the windows of
+    a grid is the same as the harmonization of the whole grid.
+
+    Args:
+        df_inf (pandas DataFrame): DataFrame that contains the information of the inferences.
+        df_dlog (pandas DataFrame): DataFrame that contains the information of the climatic variables of the dataloggers.
+        df_wst (pandas DataFrame): DataFrame that contains the information of the climatic variables of the weather
+            stations. If None, only the climatic variables of the datalogger are combined.
+        t_ini (str or datetime): first slot of the window.
+        t_fin (str or datetime): last slot of the window.
+        T_sample (int): sample period of the harmonized data in minutes.
+        ws_exact (boolean): flag that indicates if the weather station readings must match the slots exactly.
+
+    Returns:
+       df_inf_h (pandas DataFrame): DataFrame that contains the harmonized information of the inferences.
+       df_climvar (pandas DataFrame): DataFrame that contains the combined climatic variables (see combine_climvar).
+    """
+
+    t_grid = time_grid(t_ini,t_fin,T_sample)
+    t_ini = np.datetime64(pd.Timestamp(t_ini),'ns')
+    t_fin = np.datetime64(pd.Timestamp(t_fin),'ns')
+    margin = np.timedelta64(T_sample,'m')
+
+    t_inf = df_inf['date'].to_numpy(dtype='datetime64[ns]')
+    df_inf = df_inf[(t_inf >= t_ini) & (t_inf < t_fin + margin)]
+    df_dlog = _window_readings(df_dlog,chutils.get_schema('datalogger'),t_ini - margin,t_fin + margin)
+    df_dlog_h = harmonize_datalogger(df_dlog,t_grid,T_sample)
+    df_inf_h = harmonize_inference(df_inf,t_grid,T_sample)
+    if df_wst is None:
+        return df_inf_h, combine_climvar(df_dlog_h)
+
+    df_wst = _window_readings(df_wst,chutils.get_schema('wstation'),t_ini - margin,t_fin + margin)
+    df_wst_h = harmonize_wstation(df_wst,t_grid,T_sample,ws_exact)
+
+    return df_inf_h, combine_climvar(df_dlog_h,df_wst_h)
+
+def harmonize_stream(df_inf, df_dlog, df_wst=None, T_sample=15, window='MS', ws_exact=True):
+    """Generator to harmonize the data window by window (see harmonize_window), so that only the harmonized data of
+    one window is in memory at a time. The grid is the same as in harmonize3 and harmonize2.
+
+    Args:
+        df_inf (pandas DataFrame): DataFrame that contains the information of the inferences.
+        df_dlog (pandas DataFrame): DataFrame that contains the information of the climatic variables of the dataloggers.
+        df_wst (pandas DataFrame): DataFrame that contains the information of the climatic variables of the weather
+            stations. If None, only the climatic variables of the datalogger are combined.
+        T_sample (int): sample period of the harmonized data in minutes.
+        window (str): pandas frequency of the start of the windows (e.g. 'MS' for months).
+        ws_exact (boolean): flag that indicates if the weather station readings must match the slots exactly.
+
+    Yields:
+       df_inf_h (pandas DataFrame), df_climvar (pandas DataFrame): harmonized data of each window.
+    """
+
+    if df_inf.shape[0] == 0:
+        return
+    for t_ini, t_fin in time_windows(df_inf.date.iloc[0],df_inf.date.iloc[-1],window,T_sample):
+        yield harmonize_window(df_inf,df_dlog,df_wst,t_ini,t_fin,T_sample,ws_exact)
+
+def time_grid(t_ini, t_fin, T_sample=15):
+    """Function to create the slots of the time grid from t_ini to t_fin.
+
+    Args:
+        t_ini (str or datetime): first slot of the grid.
+        t_fin (str or datetime): end of the grid (the last slot is the last one not after t_fin).
+        T_sample (int): sample period of the grid in minutes.
+
+    Returns:
+        t_grid (numpy array): datetime64[ns] array with the slots.
+    """
+
+    t_ini = np.datetime64(pd.Timestamp(t_ini),'ns')
+    t_fin = np.datetime64(pd.Timestamp(t_fin),'ns')
+    period = np.timedelta64(T_sample,'m').astype('timedelta64[ns]')
+    if (t_fin < t_ini):
+        return np.array([],dtype='datetime64[ns]')
+
+    return t_ini + np.arange((t_fin - t_ini) // period + 1) * period
+
+def day_number(t):
+    """Function to obtain the number of the day (days since 1970-01-01) of each slot of a datetime64 array.
+    """
+
+    return np.asarray(t,dtype='datetime64[ns]').astype('datetime64[D]').astype(np.int32)
+
+def minute_of_day(t):
+    """Function to obtain the minute of the day (0 to 1439) of each slot of a datetime64 array.
+    """
+
+    t = np.asarray(t,dtype='datetime64[ns]')
+
+    return ((t - t.astype('datetime64[D]')) // np.timedelta64(1,'m')).astype(np.int16)
+
+def add_date_hour(df):
+    """Function to add the 'date' and 'hour' columns of the EBV-ready datasets after the 'time' column of a
+    harmonized DataFrame, as datetime.date and datetime.time objects. It is meant to be used only when exporting.
+
+    Args:
+        df (pandas DataFrame): harmonized DataFrame with a 'time' column (datetime64[ns]).
+
+    Returns:
+        df_out (pandas DataFrame): copy of the DataFrame with the 'date' and 'hour' columns.
+    """
+
+    t = pd.DatetimeIndex(df['time'])
+    df_out = df.drop(columns=[c for c in ('date','hour') if c in df.columns])
+    pos = list(df_out.columns).index('time')
+    df_out.insert(pos+1,'date',t.date)
+    df_out.insert(pos+2,'hour',t.time)
+
+    return df_out
+
+def _harmonized_frame(t_grid, columns, schema=None, values=None):
+    """Function to create a harmonized DataFrame with the 'time' column and a single contiguous block with the values of
+    the columns (NaN if values is None). The block is HARMONIZED_DTYPE for the columns with a float label and for the
+    columns without a label or with a non numeric one; a column with an int or float64 label makes it float64. Values
+    with that dtype are used without copying them.
+    """
+
+    dtypes = [np.dtype(HARMONIZED_DTYPE)]
+    label_dtypes = {} if schema is None else schema.dtypes
+    for col in columns:
+        dtype = label_dtypes.get(col,float)
+        dtypes.append(np.dtype(dtype) if dtype in (int,np.float32,np.float64) else np.dtype(HARMONIZED_DTYPE))
+    dtype = np.result_type(*dtypes)
+
+    if values is None:
+        values = np.full((len(t_grid),len(columns)),np.nan,dtype=dtype)
+    else:
+        values = np.asarray(values,dtype=dtype)
+    df_h = pd.DataFrame(values,columns=columns,copy=False)
+    df_h.insert(0,'time',np.asarray(t_grid,dtype='datetime64[ns]'))
+
+    return df_h
+
+def _window_readings(df, schema, t_ini, t_fin):
+    """Function to select the readings of a datalogger or weather station between t_ini and t_fin. A DataFrame
+    without columns (no readings found) is replaced with an empty DataFrame with the enabled columns of the schema.
+    """
+
+    if df is None or df.shape[1] == 0:
+        columns = [l.new_name for l in schema.enabled]
+        return pd.DataFrame({c: pd.Series(dtype='datetime64[ns]' if c == 'date' else object if c == 'time' else float)
+                             for c in columns})
+
+    t_obs = _datetime_key(df)
+
+    return df[(t_obs >= t_ini) & (t_obs <= t_fin)]
+
+@chprof.profiled()
+def combine_climvar(df_dlog, df_wst=None, priority=None, provenance=False):
+    """Function to combine the harmonized climatic variables of the datalogger and the weather station.
+
+    Each variable takes, slot by slot, the value of the first available source of its priority list (e.g. the
+    temperature of the datalogger, then the mean of the maximum and minimum temperatures of the weather station,
+    then the maximum, then the minimum). Sources whose columns are not in the DataFrames are ignored.
+
+    Args:
+        df_dlog (pandas DataFrame): DataFrame that contains the harmonized information of the datalogger.
+        df_wst (pandas DataFrame): DataFrame that contains the harmonized information of the weather station,
+            on the same slots as df_dlog. If None, only the datalogger is used.
+        priority (dict): sources of each variable in order of priority (see CLIMVAR_PRIORITY). If None,
+            CLIMVAR_PRIORITY is used.
+        provenance (boolean): flag that indicates if a column with the source of each value is added for each
+            variable (e.g. 'T(C)_source'), with the position of the source in the priority list, or -1 if there is no value.
+
+    Returns:
+       df_climvar (pandas DataFrame): DataFrame that contains the combined climatic variables.
+    """
+
+    if priority is None:
+        priority = CLIMVAR_PRIORITY
+
+    frames = [df_dlog] if df_wst is None else [df_dlog,df_wst]
+    if (df_wst is not None and df_wst.shape[0] != df_dlog.shape[0]):
+        raise ValueError('df_dlog and df_wst must be harmonized on the same slots')
+
+    variables = list(priority)
+    block = np.full((df_dlog.shape[0],len(variables)),np.nan,dtype=HARMONIZED_DTYPE)
+    sources_block = np.full(block.shape,-1,dtype=np.int8)
+
+    for i, var in enumerate(variables):
+        values = block[:,i]
+        source = sources_block[:,i]
+        for k, columns in enumerate(priority[var]):
+            src_values = _source_values(frames,columns)
+            if src_values is None:
+                continue
+            fill = np.isnan(values) & ~np.isnan(src_values)
+            values[fill] = src_values[fill]
+            source[fill] = k
+
+    df_climvar = _harmonized_frame(df_dlog['time'].values,variables,None,block)
+    if (provenance):
+        for i, var in enumerate(variables):
+            df_climvar[var+'_source'] = sources_block[:,i]
+
+    return df_climvar
+
+def _source_values(frames, columns):
+    """Function to obtain the values of a source: the mean of its columns (NaN where any of them is NaN),
+    or None if any of the columns is not in the DataFrames.
+    """
+
+    arrays = []
+    for col in columns:
+        frame = next((f for f in frames if col in f.columns),None)
+        if frame is None:
+            return None
+        arrays.append(frame[col].to_numpy(dtype=float))
+
+    return sum(arrays)/len(arrays)
@@ -0,0 +1,592 @@
+#!/usr/bin/env python3
+
+"""This script contains functions to run the whole workflow (get data -> harmonize -> create the EBV-ready dataset) for:
+- A single location.
+- A batch of locations listed in the locations metadata file, processed in parallel.
+- The incremental update of the NetCDF EBV cube of a location with the new data.
+- The processing of a location window by window (e.g. one month at a time), so that the memory is bounded by the size
+  of a window instead of the length of the deployment.
+
+The EBV-ready datasets are written in the Apache Parquet format or as NetCDF EBV cubes (see chorus_data_cube), one per
+location, or, for a batch, into a single multi-site NetCDF EBV cube ('cube' format) or Zarr store ('zarr' format, see
+chorus_zarr).
+The batch writes one EBV-ready dataset per location and a run summary (run_summary.json) in the output folder.
+Locations that were already processed successfully are skipped when the batch is run again (resume).
+"""
+import os
+import sys
+import json
+import time
+import logging
+import datetime as dt
+import traceback
+import concurrent.futures as cf
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import chorus_utils as chutils
+import chorus_get_data as gdata
+import chorus_harmonize_data as hdata
+import chorus_ebv_ready_dataset as chebv
+import chorus_data_cube as chcube
+import chorus_zarr as chzarr
+import chorus_catalog as chcatalog
+import chorus_profiling as chprof
+
+SUMMARY_FILE = 'run_summary.json'
+OUTPUT_FORMATS = {'parquet':'.gzip','netcdf':'.nc','cube':'.nc','zarr':'.zarr'}
+
+logger = logging.getLogger(__name__)
+
+def ebv_rd_file_name(location_id, date_ini, date_fin, output_format='parquet'):
+    """Function to obtain the name of the EBV-ready dataset of a location.
+
+    Args:
+        location_id (str): location identifier.
+        date_ini (str): start date in YYYY-MM-DD format.
+        date_fin (str): end date in YYYY-MM-DD format.
+        output_format (str): 'parquet', 'netcdf' or 'zarr'.
+
+    Returns:
+        file_name (str): name of the file (e.g. INCT17_ebvready_20190913_20210424.gzip).
+    """
+
+    return '{}_ebvready_{}_{}{}'.format(location_id,date_ini.replace('-',''),date_fin.replace('-',''),
+                                        OUTPUT_FORMATS[output_format])
+
+def ebv_cube_file_name(date_ini, date_fin, output_format='cube'):
+    """Function to obtain the name of the multi-site EBV cube of a batch (e.g. ebvcube_20190913_20210424.nc), or of
+    its Zarr store if output_format is 'zarr' (e.g. ebvcube_20190913_20210424.zarr).
+    """
+
+    return 'ebvcube_{}_{}{}'.format(date_ini.replace('-',''),date_fin.replace('-',''),OUTPUT_FORMATS[output_format])
+
+def run_location(folder_path, location_id, date_ini, date_fin, out_path, ebv_rd_metadata=None, wstation=True,
+                 T_sample=15, utc_offset=-3, cache_dir=None, max_workers=None, qc=False, output_format='parquet', df_meta=None,
+                 store_path=None, window=None):
+    """Function to get, harmonize and export the data of one location.
+
+    Args:
+        folder_path (str or DataCatalog): path to the folder (or catalog of the folder) containing the files.
+        location_id (str): location identifier.
+        date_ini (str): start date in YYYY-MM-DD format.
+        date_fin (str): end date in YYYY-MM-DD format.
+        out_path (str): path to the folder where the EBV-ready dataset is saved.
+        ebv_rd_metadata (str): name of the CSV file with the species selected for the EBV-ready dataset.
+            If None, all the species are included.
+        wstation (boolean): flag that indicates if the location has a weather station.
+        T_sample (int): sample period of the harmonized data in minutes.
+        utc_offset (int, float or str): offset of the local time of the weather station from UTC (see get_wstation).
+        cache_dir (str): path to the folder of the ingest cache.
+        max_workers (int): maximum number of workers used to read the files of the location.
+        qc (boolean): flag that indicates if the basic quality tests (nulls and duplicates) of the loaded data are run.
+        output_format (str): format of the EBV-ready dataset, 'parquet', 'netcdf' or 'zarr'. With 'cube', nothing is
+            written and the harmonized data of the selected species is returned in summary['data'] to be written to the
+            multi-site EBV cube by run_batch.
+        df_meta (pandas DataFrame): metadata of the location (see get_metadata), used for the coordinates of the
+            NetCDF EBV cube or of the Zarr store.
+        store_path (str): path to the Zarr store where the location is written (e.g. the store of a batch). If None,
+            a Zarr store of the location is created in out_path.
+        window (str): pandas frequency of the windows (e.g. 'MS' for months) in which the data is read, harmonized and
+            written (see stream_location). If None, the whole period is processed at once. Not available for the 'cube'
+            format.
+
+    Returns:
+        summary (dict): summary of the run with the location, status, output file, number of rows, elapsed time
+            and wall time of each stage. If qc is True, it also contains the results of the quality tests of each source.
+            If the instrumentation is enabled (see chorus_profiling), it also contains the
+            measurements of the instrumented calls of the location.
+    """
+
+    t_ini = time.perf_counter()
+    n_records = len(chprof.records())
+    stages = {}
+    summary = {'location_id':location_id,'status':'ok','output':None,'rows':0,'error':None,'stages':stages}
+
+    try:
+        if window is not None:
+            if (output_format == 'cube'):
+                raise ValueError("window is not available for the 'cube' format")
+            df_inf_h = None
+            windows = stream_location(folder_path,location_id,date_ini,date_fin,window,wstation,T_sample,utc_offset,
+                                      cache_dir,max_workers,stages)
+            ebv_path = store_path or os.path.join(out_path,ebv_rd_file_name(location_id,date_ini,date_fin,output_format))
+            output, rows = _export_stream(windows,output_format,folder_path,ebv_path,ebv_rd_metadata,location_id,
+                                          df_meta,date_ini,date_fin,T_sample,stages,summary)
+            if output is None:
+                summary['status'] = 'failed'
+                summary['error'] = 'EBV-ready dataset metadata file not found'
+            elif (rows == 0):
+                summary['status'] = 'no_data'
+            else:
+                summary['output'] = output
+                summary['rows'] = rows
+        else:
+            df_inf_h, df_climvar = _harmonize_location(folder_path,location_id,date_ini,date_fin,stages,summary,wstation,
+                                                       T_sample,utc_offset,cache_dir,max_workers,qc)
+        if df_inf_h is not None:
+            ebv_rd_name = ebv_rd_file_name(location_id,date_ini,date_fin,output_format)
+            if (output_format == 'cube'):
+                species = chebv.select_species(df_inf_h,folder_path,ebv_rd_metadata,location_id)
+                if species is None:
+                    output = None
+                else:
+                    summary['data'] = (df_inf_h[['time']+species],df_climvar)
+                    output = ''
+            elif (output_format == 'zarr'):
+                output = _timed(stages,'export',_export_zarr,df_inf_h,df_climvar,folder_path,
+                                store_path or os.path.join(out_path,ebv_rd_name),ebv_rd_metadata,location_id,
+                                df_meta,date_ini,date_fin,T_sample,summary)
+            elif (output_format == 'netcdf'):
+                output = _timed(stages,'export',_export_netcdf,df_inf_h,df_climvar,folder_path,
+                                os.path.join(out_path,ebv_rd_name),ebv_rd_metadata,location_id,df_meta,T_sample)
+            else:
+                output = _timed(stages,'export',chebv.ebv_rd_create,df_inf_h,df_climvar,folder_path,ebv_rd_name,
+                                ebv_rd_metadata,location_id,out_path)
+            if output is None:
+                summary['status'] = 'failed'
+                summary['error'] = 'EBV-ready dataset metadata file not found'
+            else:
+                summary['output'] = output
+                summary['rows'] = int(df_inf_h.shape[0])
+    except Exception as e:
+        summary['status'] = 'failed'
+        summary['error'] = ''.join(traceback.format_exception_only(type(e),e)).strip()
+
+    summary['elapsed_s'] = round(time.perf_counter()-t_ini,3)
+    if chprof.is_enabled():
+        summary['profile'] = chprof.records(n_records)
+
+    return summary
+
+def stream_location(folder_path, location_id, date_ini, date_fin, window='MS', wstation=True, T_sample=15, utc_offset=-3,
+                    cache_dir=None, max_workers=None, stages=None):
+    """Generator to get and harmonize the data of a location window by window (e.g. one month at a time).
+
+    Only the files and the records of the days of a window are read, so that the memory is bounded by the size of a
+    window (keep cache_dir set, so that the Excel files that span several windows are parsed only once). The grid is
+    the same as in harmonize3 and harmonize2: it starts at the first inference and ends at the last one. The quality
+    tests are not run.
+
+    Args:
+        folder_path (str or DataCatalog): path to the folder (or catalog of the folder) containing the files.
+        location_id (str): location identifier.
+        date_ini (str): start date in YYYY-MM-DD format.
+        date_fin (str): end date in YYYY-MM-DD format.
+        window (str): pandas frequency of the start of the windows (e.g. 'MS' for months, '7D' for weeks).
+        wstation (boolean): flag that indicates if the location has a weather station.
+        T_sample (int): sample period of the harmonized data in minutes.
+        utc_offset (int, float or str): offset of the local time of the weather station from UTC (see get_wstation).
+        cache_dir (str): path to the folder of the ingest cache.
+        max_workers (int): maximum number of workers used to read the files of the location.
+        stages (dict): dictionary where the wall time of each stage, summed over the windows, is stored.
+
+    Yields:
+        df_inf_h (pandas DataFrame), df_climvar (pandas DataFrame): harmonized inferences and combined climatic
+            variables of each window (the harmonized datalogger data if wstation is False).
+    """
+
+    if stages is None:
+        stages = {}
+    period = pd.Timedelta(minutes=T_sample)
+    t_next = None
+    t_last = None
+    df_inf_empty = None
+    pending = []
+
+    days = hdata.time_windows(date_ini,date_fin,window,24*60)
+    for k, (d_ini, d_fin) in enumerate(days):
+        day_end = d_fin + pd.Timedelta(days=1)
+        #the inferences are selected by date and time, so the end of a window is the start of the next one
+        inf_fin = date_fin if k == len(days)-1 else day_end.strftime('%Y-%m-%d')
+        df_inf = _timed(stages,'get_inference',gdata.get_inference,folder_path,location_id,d_ini.strftime('%Y-%m-%d'),
+                        inf_fin,max_workers=max_workers,qc=False)
+        if (df_inf.shape[0] != 0):
+            df_inf = df_inf[df_inf['date'] < day_end].reset_index(drop=True)
+        if (df_inf.shape[0] != 0):
+            df_inf_empty = df_inf.iloc[0:0]
+            if t_next is None:
+                t_next = df_inf['date'].iloc[0]
+        elif t_next is None:
+            continue
+        else:
+            df_inf = df_inf_empty
+
+        t_fin = t_next + ((day_end - pd.Timedelta(1,'ns') - t_next) // period) * period
+        if (t_fin < t_next):
+            continue
+        df_dlog = _timed(stages,'get_datalogger',gdata.get_datalogger,folder_path,location_id,d_ini.strftime('%Y-%m-%d'),
+                         d_fin.strftime('%Y-%m-%d'),cache_dir=cache_dir,max_workers=max_workers,qc=False)
+        df_wst = None
+        if (wstation):
+            df_wst = _timed(stages,'get_wstation',gdata.get_wstation,folder_path,location_id,d_ini.strftime('%Y-%m-%d'),
+                            d_fin.strftime('%Y-%m-%d'),utc_offset=utc_offset,cache_dir=cache_dir,max_workers=max_workers,
+                            qc=False)
+            if df_wst is None:
+                df_wst = pd.DataFrame()
+        result = _timed(stages,'harmonize',hdata.harmonize_window,df_inf,df_dlog,df_wst,t_next,t_fin,T_sample)
+        t_next = t_fin + period
+
+        #the windows after the last inference are not part of the grid, so they are held until more inferences are found
+        if (df_inf.shape[0] != 0):
+            t_last = df_inf['date'].iloc[-1]
+            for previous in pending:
+                yield previous
+            pending = []
+        pending.append(result)
+
+    if (t_last is not None):
+        df_inf_h, df_climvar = pending[0]
+        keep = (df_inf_h['time'] <= t_last).to_numpy()
+        yield df_inf_h[keep], df_climvar[keep]
+
+def update_location(folder_path, location_id, date_fin, ebv_path, date_ini=None, ebv_rd_metadata=None, wstation=True,
+                    T_sample=15, utc_offset=-3, cache_dir=None, max_workers=None, qc=False, df_meta=None):
+    """Function to update the NetCDF EBV cube of a location with the data after its last slot.
+
+    Only the days from the last slot of the cube to date_fin are read and harmonized (the day of the last slot is read
+    again so that its slots are harmonized with the same data as in a full run), and only the slots after the last slot
+    are appended. If the cube does not exist, it is created with the data from date_ini to date_fin.
+
+    Args:
+        folder_path (str or DataCatalog): path to the folder (or catalog of the folder) containing the files.
+        location_id (str): location identifier.
+        date_fin (str): end date in YYYY-MM-DD format.
+        ebv_path (str): path to the NetCDF EBV cube.
+        date_ini (str): start date in YYYY-MM-DD format, used only if the cube does not exist.
+        ebv_rd_metadata (str): name of the CSV file with the species selected for the EBV-ready dataset, used only
+            if the cube does not exist.
+        wstation (boolean): flag that indicates if the location has a weather station.
+        T_sample (int): sample period of the harmonized data in minutes, used only if the cube does not exist.
+        utc_offset (int, float or str): offset of the local time of the weather station from UTC (see get_wstation).
+        cache_dir (str): path to the folder of the ingest cache.
+        max_workers (int): maximum number of workers used to read the files of the location.
+        qc (boolean): flag that indicates if the basic quality tests (nulls and duplicates) of the loaded data are run.
+        df_meta (pandas DataFrame): metadata of the location, used only if the cube does not exist.
+
+    Returns:
+        summary (dict): summary of the run (see run_location). The status is 'up_to_date' if no slot was appended,
+            and rows is the number of appended slots.
+    """
+
+    t_ini = time.perf_counter()
+    n_records = len(chprof.records())
+    stages = {}
+    summary = {'location_id':location_id,'status':'ok','output':None,'rows':0,'error':None,'stages':stages}
+
+    try:
+        t_last = chcube.last_time(ebv_path)
+        if t_last is not None:
+            T_sample = chcube.sample_period(ebv_path)
+            date_ini = str(t_last.astype('datetime64[D]'))
+        elif date_ini is None:
+            raise ValueError('date_ini is required to create the EBV cube ' + ebv_path)
+
+        if date_ini > date_fin:
+            summary['status'] = 'up_to_date'
+        else:
+            df_inf_h, df_climvar = _harmonize_location(folder_path,location_id,date_ini,date_fin,stages,summary,wstation,
+                                                       T_sample,utc_offset,cache_dir,max_workers,qc)
+            if (df_inf_h is not None and t_last is None):
+                output = _timed(stages,'export',_export_netcdf,df_inf_h,df_climvar,folder_path,ebv_path,
+                                ebv_rd_metadata,location_id,df_meta,T_sample)
+                if output is None:
+                    summary['status'] = 'failed'
+                    summary['error'] = 'EBV-ready dataset metadata file not found'
+                else:
+                    summary['output'] = output
+                    summary['rows'] = int(df_inf_h.shape[0])
+            elif df_inf_h is not None:
+                n_new = _timed(stages,'append',chcube.append_ebv,ebv_path,df_inf_h,df_climvar)
+                summary['output'] = ebv_path
+                summary['rows'] = n_new
+                if n_new == 0:
+                    summary['status'] = 'up_to_date'
+            elif t_last is not None:
+                summary['status'] = 'up_to_date'
+    except Exception as e:
+        summary['status'] = 'failed'
+        summary['error'] = ''.join(traceback.format_exception_only(type(e),e)).strip()
+
+    summary['elapsed_s'] = round(time.perf_counter()-t_ini,3)
+    if chprof.is_enabled():
+        summary['profile'] = chprof.records(n_records)
+
+    return summary
+
+def run_batch(folder_path, locations_metadata_file, date_ini, date_fin, out_path, locations=None, ebv_rd_metadata=None,
+              T_sample=15, utc_offset=-3, cache_dir=None, max_workers=None, resume=True, index_file=None, qc=False,
+              output_format='parquet', window=None):
+    """Function to run the workflow for several locations in parallel (one process per location).
+
+    The folder is scanned once (DataCatalog) and the locations metadata is read once; both are shared with the workers.
+    The memory of a worker is bounded by the data of one location. Each worker returns a small summary, except with the
+    'cube' format: a NetCDF file can not be written by several processes at once, so the worker also returns the
+    harmonized data of the selected species of its location (summary['data']), which this process writes to the cube
+    and drops as soon as the worker finishes. The memory of this process is then bounded by the data of the locations
+    that finish at the same time.
+
+    Args:
+        folder_path (str or DataCatalog): path to the folder (or catalog of the folder) containing the files.
+        locations_metadata_file (str): name of the file that contains the metadata of the locations.
+        date_ini (str): start date in YYYY-MM-DD format.
+        date_fin (str): end date in YYYY-MM-DD format.
+        out_path (str): path to the folder where the EBV-ready datasets and the run summary are saved.
+        locations (list): location identifiers to process. If None, all the locations of the metadata file.
+        ebv_rd_metadata (str): name of the CSV file with the species selected for the EBV-ready datasets.
+        T_sample (int): sample period of the harmonized data in minutes.
+        utc_offset (int, float or str): offset of the local time of the weather stations from UTC.
+        cache_dir (str): path to the folder of the ingest cache.
+        max_workers (int): maximum number of locations processed at the same time. If None or 1, serially.
+        resume (boolean): flag that indicates if the locations processed successfully in a previous run are skipped.
+        index_file (str): path to the JSON index of the DataCatalog.
+        qc (boolean): flag that indicates if the basic quality tests of the loaded data are run.
+        output_format (str): format of the EBV-ready datasets, 'parquet' or 'netcdf' (one file per location), 'cube'
+            (one multi-site EBV cube with all the locations of the metadata file, written by this process as the
+            workers finish) or 'zarr' (one Zarr store with all the locations of the metadata file, where each
+            worker writes its own location).
+        window (str): pandas frequency of the windows in which each location is processed (see stream_location).
+            If None, the whole period of a location is processed at once.
+
+    Returns:
+        summary (dict): run summary, with one entry per location.
+    """
+
+    os.makedirs(out_path,exist_ok=True)
+
+    if isinstance(folder_path,chcatalog.DataCatalog):
+        catalog = folder_path
+    else:
+        catalog = chcatalog.DataCatalog(folder_path,index_file=index_file)
+
+    df_meta = gdata.get_metadata(catalog,locations_metadata_file,cache_dir=cache_dir)
+    if df_meta.shape[0] == 0:
+        raise FileNotFoundError('Locations metadata file not found: ' + locations_metadata_file)
+
+    cube_path = None
+    store_path = None
+    if (output_format in ('cube','zarr')):
+        #the species axis is the union of the species of the inference files of all the sites (read from the footers of
+        #the files), so that the outputs of different model versions can be written to the same cube
+        species = gdata.get_inference_species(catalog,list(df_meta['location_ID'])) or None
+    if (output_format == 'cube'):
+        cube_path = os.path.join(out_path,ebv_cube_file_name(date_ini,date_fin))
+        if (not resume or not os.path.exists(cube_path)):
+            chcube.create_site_cube(cube_path,df_meta,date_ini,date_fin,species=species,T_sample=T_sample)
+    elif (output_format == 'zarr'):
+        store_path = os.path.join(out_path,ebv_cube_file_name(date_ini,date_fin,output_format))
+        if (not resume or not os.path.exists(store_path)):
+            chzarr.create_store(store_path,df_meta,date_ini,date_fin,species=species,T_sample=T_sample)
+
+    if locations is not None:
+        df_meta = df_meta[df_meta['location_ID'].isin(locations)]
+
+    summary_path = os.path.join(out_path,SUMMARY_FILE)
+    summary = load_summary(summary_path) if resume else {}
+    if (summary.get('date_ini') != date_ini or summary.get('date_fin') != date_fin):
+        summary = {}
+    summary.update({'date_ini':date_ini,'date_fin':date_fin,'started':dt.datetime.now().isoformat(timespec='seconds')})
+    results = summary.setdefault('locations',{})
+
+    tasks = []
+    for idx, row in df_meta.iterrows():
+        location_id = row['location_ID']
+        previous = results.get(location_id)
+        if (resume and previous is not None and previous.get('status') == 'ok'
+                and previous.get('output') and os.path.exists(previous['output'])):
+            logger.info('Skipping %s (already processed)', location_id)
+            continue
+        kwargs = dict(folder_path=catalog,location_id=location_id,date_ini=date_ini,date_fin=date_fin,
+                      out_path=out_path,ebv_rd_metadata=ebv_rd_metadata,wstation=bool(row['WStation']),
+                      T_sample=T_sample,utc_offset=utc_offset,cache_dir=cache_dir,qc=qc,
+                      output_format=output_format,df_meta=df_meta.loc[[idx]],store_path=store_path,window=window)
+        tasks.append(kwargs)
+
+    if (max_workers is None or max_workers <= 1 or len(tasks) <= 1):
+        for kwargs in tasks:
+            result = _store_result(run_location(**kwargs),cube_path)
+            results[result['location_id']] = result
+            save_summary(summary_path,summary)
+    else:
+        pool_kwargs = {'max_workers':max_workers}
+        if sys.version_info >= (3,11):
+            #a fresh process per location returns its memory to the system
+            pool_kwargs['max_tasks_per_child'] = 1
+        with chutils.process_pool(**pool_kwargs) as pool:
+            futures = {pool.submit(run_location,**kwargs): kwargs['location_id'] for kwargs in tasks}
+            for future in cf.as_completed(futures):
+                try:
+                    result = _store_result(future.result(),cube_path)
+                except Exception as e:
+                    result = {'location_id':futures[future],'status':'failed','output':None,'rows':0,
+                              'error':''.join(traceback.format_exception_only(type(e),e)).strip()}
+                results[result['location_id']] = result
+                save_summary(summary_path,summary)
+
+    summary['finished'] = dt.datetime.now().isoformat(timespec='seconds')
+    save_summary(summary_path,summary)
+
+    return summary
+
+def _store_result(result, cube_path):
+    """Function to write the harmonized data returned by a worker to the multi-site EBV cube.
+    """
+
+    data = result.pop('data',None)
+    if (data is None or cube_path is None):
+        return result
+
+    try:
+        result['rows'], result['dropped_slots'] = _timed(result.setdefault('stages',{}),'export',chcube.write_site,
+                                                         cube_path,result['location_id'],*data)
+        result['output'] = cube_path
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = ''.join(traceback.format_exception_only(type(e),e)).strip()
+
+    return result
+
+def _harmonize_location(folder_path, location_id, date_ini, date_fin, stages, summary, wstation, T_sample, utc_offset,
+                        cache_dir, max_workers, qc):
+    """Function to get and harmonize the data of a location, storing the wall time of each stage in stages.
+
+    Returns the harmonized inferences and climatic variables, or (None, None) if there is no data (the status of the
+    summary is set to 'no_data').
+    """
+
+    df_inf = _timed(stages,'get_inference',gdata.get_inference,folder_path,location_id,date_ini,date_fin,
+                    max_workers=max_workers,qc=qc)
+    df_dlog = _timed(stages,'get_datalogger',gdata.get_datalogger,folder_path,location_id,date_ini,date_fin,
+                     cache_dir=cache_dir,max_workers=max_workers,qc=qc)
+    df_wst = None
+    if (wstation):
+        df_wst = _timed(stages,'get_wstation',gdata.get_wstation,folder_path,location_id,date_ini,date_fin,
+                        utc_offset=utc_offset,cache_dir=cache_dir,max_workers=max_workers,qc=qc)
+    if (qc):
+        summary['qc'] = {name: df.attrs.get('qc') for name, df in
+                         [('inference',df_inf),('datalogger',df_dlog),('wstation',df_wst)] if df is not None}
+
+    if (df_inf is None or df_inf.shape[0] == 0 or df_dlog is None or df_dlog.shape[0] == 0):
+        summary['status'] = 'no_data'
+        return None, None
+
+    if (df_wst is not None and df_wst.shape[0] != 0):
+        df_inf_h,df_dlog_h,df_wst_h = _timed(stages,'harmonize',hdata.harmonize3,df_inf,df_dlog,df_wst,T_sample)
+        df_climvar = _timed(stages,'combine_climvar',hdata.combine_climvar,df_dlog_h,df_wst_h)
+    else:
+        df_inf_h,df_dlog_h = _timed(stages,'harmonize',hdata.harmonize2,df_inf,df_dlog,T_sample)
+        df_climvar = _timed(stages,'combine_climvar',hdata.combine_climvar,df_dlog_h)
+
+    return df_inf_h, df_climvar
+
+def _export_netcdf(df_inf_h, df_climvar, folder_path, ebv_path, ebv_rd_metadata, location_id, df_meta, T_sample):
+    """Function to write the selected species and the climatic variables of a location to a NetCDF EBV cube.
+    """
+
+    species = chebv.select_species(df_inf_h,folder_path,ebv_rd_metadata,location_id)
+    if species is None:
+        return None
+
+    return chcube.build_ebv(ebv_path,None,df_inf_h[['time']+species],df_climvar,df_meta,T_sample)
+
+def _export_zarr(df_inf_h, df_climvar, folder_path, store_path, ebv_rd_metadata, location_id, df_meta, date_ini, date_fin,
+                 T_sample, summary):
+    """Function to write the selected species and the climatic variables of a location to its region of a Zarr store.
+
+    If the store does not exist, a store with only this location is created. The number of slots off the time grid
+    of the store is saved in summary['dropped_slots'].
+    """
+
+    species = chebv.select_species(df_inf_h,folder_path,ebv_rd_metadata,location_id)
+    if species is None:
+        return None
+    if not os.path.exists(store_path):
+        chzarr.create_store(store_path,_store_metadata(df_meta,location_id),date_ini,date_fin,species=species,
+                            T_sample=T_sample)
+    n_slots, summary['dropped_slots'] = chzarr.write_site(store_path,location_id,df_inf_h[['time']+species],df_climvar)
+
+    return store_path
+
+def _export_stream(windows, output_format, folder_path, ebv_path, ebv_rd_metadata, location_id, df_meta, date_ini,
+                   date_fin, T_sample, stages, summary):
+    """Function to write the harmonized data of a location window by window: Parquet row groups, slots appended to a
+    NetCDF EBV cube or regions of a Zarr store. The number of slots off the time grid of a Zarr store is saved in
+    summary['dropped_slots'].
+
+    Returns the path to the EBV-ready dataset (None if the species metadata file was not found) and the number of rows.
+    """
+
+    species = None
+    writer = None
+    rows = 0
+    try:
+        for df_inf_h, df_climvar in windows:
+            t_ini = time.perf_counter()
+            if species is None:
+                species = chebv.select_species(df_inf_h,folder_path,ebv_rd_metadata,location_id)
+                if species is None:
+                    return None, 0
+            if (output_format == 'zarr'):
+                if (rows == 0 and not os.path.exists(ebv_path)):
+                    chzarr.create_store(ebv_path,_store_metadata(df_meta,location_id),date_ini,date_fin,
+                                        species=species,T_sample=T_sample)
+                n_slots, n_dropped = chzarr.write_site(ebv_path,location_id,df_inf_h[['time']+species],df_climvar)
+                summary['dropped_slots'] = summary.get('dropped_slots',0) + n_dropped
+            elif (output_format == 'netcdf'):
+                df_eva = df_inf_h[['time']+species]
+                if (rows == 0):
+                    chcube.build_ebv(ebv_path,None,df_eva,df_climvar,df_meta,T_sample)
+                else:
+                    chcube.append_ebv(ebv_path,df_eva,df_climvar)
+            else:
+                table = pa.Table.from_pandas(chebv.ebv_rd_frame(df_inf_h,df_climvar,species),preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(ebv_path,table.schema,compression='gzip')
+                writer.write_table(table)
+            rows += int(df_inf_h.shape[0])
+            _add_time(stages,'export',t_ini)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return ebv_path, rows
+
+def _store_metadata(df_meta, location_id):
+    """Function to obtain the metadata of the site of a new Zarr store.
+    """
+
+    if df_meta is None:
+        return pd.DataFrame({'location_ID':[location_id]})
+
+    return df_meta
+
+def _timed(stages, name, func, *args, **kwargs):
+    """Function to call func and add its wall time in seconds to stages[name].
+    """
+
+    t_ini = time.perf_counter()
+    result = func(*args,**kwargs)
+    _add_time(stages,name,t_ini)
+
+    return result
+
+def _add_time(stages, name, t_ini):
+    stages[name] = round(stages.get(name,0)+time.perf_counter()-t_ini,3)
+
+def load_summary(summary_path):
+    """Function to load the run summary of a previous batch (an empty summary if it does not exist).
+    """
+
+    if not os.path.exists(summary_path):
+        return {}
+    with open(summary_path) as f:
+        return json.load(f)
+
+def save_summary(summary_path, summary):
+    """Function to save the run summary of a batch.
+    """
+
+    tmp_path = summary_path + '.tmp'
+    with open(tmp_path,'w') as f:
+        json.dump(summary,f,indent=2)
+    os.replace(tmp_path,summary_path)
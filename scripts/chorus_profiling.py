@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+
+"""This script contains an instrumentation layer to measure the stages of the workflow, including:
+- Wall time and CPU time of each call.
+- Peak resident memory (RSS) during each call, sampled by a background thread, and how much the call raised it.
+- Number of rows received and returned, and number of files read or written.
+- Export of the measurements to a JSON or CSV report.
+
+The instrumentation is disabled by default. It is enabled without code changes by setting the CHORUS_PROFILE environment
+variable (e.g. CHORUS_PROFILE=1), or from code with enable(). If CHORUS_PROFILE_REPORT is set to a .json or .csv path,
+the report is written there when the process exits.
+"""
+import os
+import sys
+import csv
+import json
+import time
+import atexit
+import functools
+import threading
+import multiprocessing
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    _PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError,ValueError,OSError):
+    _PAGE_SIZE = 4096
+
+FIELDS = ['stage','depth','wall_s','cpu_s','peak_rss_mb','rss_growth_mb','process_peak_rss_mb','rows_in','rows_out',
+          'files','started']
+
+#interval between two samples of the resident memory during the instrumented calls
+SAMPLE_INTERVAL_S = 0.01
+
+_enabled = os.environ.get('CHORUS_PROFILE','').lower() not in ('','0','false','no','off')
+_records = []
+_lock = threading.Lock()
+_local = threading.local()
+_active = []
+_sampler = None
+
+def enable():
+    """Function to enable the instrumentation.
+    """
+
+    global _enabled
+    _enabled = True
+
+def disable():
+    """Function to disable the instrumentation.
+    """
+
+    global _enabled
+    _enabled = False
+
+def is_enabled():
+    return _enabled
+
+def reset():
+    """Function to remove all the measurements.
+    """
+
+    with _lock:
+        del _records[:]
+
+def records(start=0):
+    """Function to obtain the measurements.
+
+    Args:
+        start (int): index of the first measurement (e.g. the number of measurements before a run).
+
+    Returns:
+        records (list): list of dictionaries, one per instrumented call, in order of completion.
+    """
+
+    with _lock:
+        return [dict(r) for r in _records[start:]]
+
+def profiled(stage=None):
+    """Decorator to measure each call of a function when the instrumentation is enabled.
+
+    Args:
+        stage (str): name of the stage in the report. If None, the name of the function is used.
+    """
+
+    def decorator(func):
+        name = stage or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args,**kwargs)
+
+            stack = _stack()
+            record = {'stage':name,'depth':len(stack),'files':0,'rows_out':0,
+                      'rows_in':sum(_count_rows(a) for a in list(args)+list(kwargs.values())),
+                      'started':time.strftime('%Y-%m-%dT%H:%M:%S')}
+            rss_ini = rss_mb()
+            peak = {'rss':rss_ini}
+            _start_sampling(peak)
+            cpu_ini = time.process_time()
+            t_ini = time.perf_counter()
+            stack.append(record)
+            try:
+                result = func(*args,**kwargs)
+            finally:
+                stack.pop()
+                record['wall_s'] = round(time.perf_counter()-t_ini,6)
+                record['cpu_s'] = round(time.process_time()-cpu_ini,6)
+                _stop_sampling(peak)
+                record['peak_rss_mb'] = _round(peak['rss']) if peak['rss'] is not None else None
+                record['rss_growth_mb'] = _round(peak['rss']-rss_ini) if rss_ini is not None else None
+                record['process_peak_rss_mb'] = peak_rss_mb()
+                with _lock:
+                    _records.append(record)
+            record['rows_out'] = _count_rows(result)
+            return result
+
+        return wrapper
+
+    return decorator
+
+def count_files(n=1):
+    """Function to add n files to the number of files touched by the instrumented calls in progress.
+    """
+
+    if not _enabled:
+        return
+    for record in _stack():
+        record['files'] += n
+
+def rss_mb():
+    """Function to obtain the current resident memory of the process in MB (None if it can not be measured: it needs
+    /proc, as on Linux, or psutil).
+    """
+
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1])*_PAGE_SIZE/1024**2
+    except (OSError,ValueError,IndexError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss/1024**2
+
+def peak_rss_mb():
+    """Function to obtain the peak resident memory of the process since it started in MB (None if it can not be
+    measured). It is the process_peak_rss_mb of the measurements: unlike their peak_rss_mb, it does not go down after
+    a call that used more memory.
+    """
+
+    if resource is not None:
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        #ru_maxrss is in bytes on macOS and in kilobytes on Linux
+        return _round(maxrss/1024**2 if sys.platform == 'darwin' else maxrss/1024)
+    try:
+        import psutil
+    except ImportError:
+        return None
+    info = psutil.Process().memory_info()
+    return _round(getattr(info,'peak_wset',info.rss)/1024**2)
+
+def report(path=None, recs=None):
+    """Function to obtain the report of the measurements and to save it as JSON or CSV.
+
+    Args:
+        path (str): path to the report. The format is selected by the extension (.json or .csv). If None, it is not saved.
+        recs (list): measurements to report. If None, all the measurements of the process.
+
+    Returns:
+        df_report (pandas DataFrame): DataFrame with one row per instrumented call.
+    """
+
+    if recs is None:
+        recs = records()
+    columns = list(FIELDS)
+    for r in recs:
+        columns = columns + [k for k in r if k not in columns]
+    df_report = pd.DataFrame(recs,columns=columns)
+
+    if path is not None:
+        if path.lower().endswith('.csv'):
+            with open(path,'w',newline='') as f:
+                writer = csv.DictWriter(f,fieldnames=columns)
+                writer.writeheader()
+                writer.writerows(recs)
+        else:
+            with open(path,'w') as f:
+                json.dump({'records':recs},f,indent=2)
+
+    return df_report
+
+def _start_sampling(peak):
+    """Function to add the peak of a call in progress to the ones updated by the sampling thread, starting the thread
+    if it is not running.
+    """
+
+    global _sampler
+    if peak['rss'] is None:
+        return
+    with _lock:
+        _active.append(peak)
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample,name='chorus-profiling-rss',daemon=True)
+            _sampler.start()
+
+def _stop_sampling(peak):
+    """Function to take the last sample of a call and to remove its peak from the ones updated by the sampling thread.
+    """
+
+    if peak['rss'] is None:
+        return
+    rss = rss_mb()
+    with _lock:
+        if rss is not None:
+            peak['rss'] = max(peak['rss'],rss)
+        _active.remove(peak)
+
+def _sample():
+    """Function run by the sampling thread: it samples the resident memory until no call is in progress.
+    """
+
+    global _sampler
+    while True:
+        time.sleep(SAMPLE_INTERVAL_S)
+        rss = rss_mb()
+        with _lock:
+            if len(_active) == 0:
+                _sampler = None
+                return
+            for peak in _active:
+                if rss is not None:
+                    peak['rss'] = max(peak['rss'],rss)
+
+def _after_fork():
+    #the sampling thread is not copied to a forked process
+    global _sampler
+    _sampler = None
+    del _active[:]
+
+def _stack():
+    if not hasattr(_local,'stack'):
+        _local.stack = []
+    return _local.stack
+
+def _count_rows(obj):
+    if isinstance(obj,(pd.DataFrame,pd.Series)):
+        return int(obj.shape[0])
+    if isinstance(obj,(tuple,list)):
+        return sum(_count_rows(o) for o in obj if isinstance(o,(pd.DataFrame,pd.Series)))
+    return 0
+
+def _round(x):
+    return round(x,1)
+
+def _write_report_at_exit():
+    path = os.environ.get('CHORUS_PROFILE_REPORT')
+    #the workers of a process pool return their measurements to the parent process instead
+    if multiprocessing.parent_process() is not None:
+        return
+    if (_enabled and path and len(_records) != 0):
+        report(path)
+
+atexit.register(_write_report_at_exit)
+if hasattr(os,'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
@@ -6,19 +6,72 @@
 - Detection of outliers.
 """
 
+import logging
 import numpy as np
 import pandas as pd
 
+logger = logging.getLogger(__name__)
+
 def evaluate_nulls(df):
-    print('\nNumber of Nulls in the dataframe:')
+    """Function to count the null values of each column.
+
+    Args:
+        df (pandas DataFrame): DataFrame to evaluate.
+
+    Returns:
+        df_nulls (pandas DataFrame): DataFrame with the number and the percentage of nulls of each column.
+    """
+
     nan = df.isna().sum()
-    for i in range(nan.shape[0]):
-        print('Column: {} - Nulls: {} - Percentage: {:.2f}%'.format(df.columns[i],nan[i],100*(nan[i]/df.shape[0])))
+    n_rows = df.shape[0]
+    percentage = 100*nan/n_rows if n_rows != 0 else nan*0.0
+    df_nulls = pd.DataFrame({'column':nan.index,'nulls':nan.values,'percentage':percentage.values})
+
+    if logger.isEnabledFor(logging.DEBUG):
+        for row in df_nulls.itertuples():
+            logger.debug('Column: %s - Nulls: %d - Percentage: %.2f%%', row.column, row.nulls, row.percentage)
+
+    return df_nulls
     
 def evaluate_duplicates(df):
-    duplicates = df.duplicated()
-    n_duplicates = duplicates.sum()
-    print('\nNumber of Duplicates in the dataframe: {} - Percentage: {:.2f}%'.format(n_duplicates,100*(n_duplicates/df.shape[0])))
+    """Function to count the duplicated rows.
+
+    Args:
+        df (pandas DataFrame): DataFrame to evaluate.
+
+    Returns:
+        duplicates (dict): number ('duplicates') and percentage ('percentage') of duplicated rows.
+    """
+
+    n_duplicates = int(df.duplicated().sum())
+    percentage = 100*(n_duplicates/df.shape[0]) if df.shape[0] != 0 else 0.0
+    logger.debug('Number of Duplicates in the dataframe: %d - Percentage: %.2f%%', n_duplicates, percentage)
+
+    return {'duplicates':n_duplicates,'percentage':percentage}
+
+def evaluate(df):
+    """Function to run the basic quality tests (nulls and duplicates).
+
+    Args:
+        df (pandas DataFrame): DataFrame to evaluate.
+
+    Returns:
+        qc (dict): number of rows ('rows'), nulls of each column ('nulls', {column: number}) and duplicated rows
+            ('duplicates' and 'duplicates_percentage').
+    """
+
+    df_nulls = evaluate_nulls(df)
+    duplicates = evaluate_duplicates(df)
+    qc = {'rows':int(df.shape[0]),
+          'nulls':{str(c): int(n) for c, n in zip(df_nulls['column'],df_nulls['nulls'])},
+          'duplicates':duplicates['duplicates'],
+          'duplicates_percentage':round(duplicates['percentage'],2)}
+
+    n_nulls = sum(qc['nulls'].values())
+    if (n_nulls != 0 or qc['duplicates'] != 0):
+        logger.info('Quality test: %d rows, %d nulls, %d duplicated rows', qc['rows'], n_nulls, qc['duplicates'])
+
+    return qc
     
 def find_outliers(arr):
     # 1st quartil
@@ -1,17 +1,255 @@
 #!/usr/bin/env python3
 
-from collections import namedtuple
+"""This script contains the labels of the columns of each source of data (inferences, dataloggers, weather stations and
+locations metadata): the original name of the column, its new name, its data type and if it is used.
+
+The labels are kept in a registry that is built once and indexed by original and new name (see get_schema). The default
+labels can be replaced by the labels of a JSON or YAML file (see load_labels), e.g. to add the species of a new model
+without editing the code. If the CHORUS_LABELS_FILE environment variable is set, its file is loaded when the registry
+is built. The process pools of the workflow are created with process_pool, so that their workers use the labels of
+the registry of the process that creates them.
+"""
+import os
+import json
+import logging
 import datetime as dt
+import concurrent.futures as cf
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+Label = namedtuple('Label',['ori_name','new_name','new_dtype','enable'])
+
+SOURCES = ['inference','datalogger','wstation','locations']
+
+#names of the data types in the labels files
+DTYPES = {'float':float,'int':int,'str':str,'bool':bool,'time':dt.time,'datetime64[ns]':'datetime64[ns]'}
+
+_schemas = {}
+
+class LabelSchema:
+    """Labels of a source of data, indexed by original and new name, with the lists and maps used by the loaders.
+
+    Attributes:
+        labels (tuple): all the labels, in order.
+        by_ori_name (dict): label of each original name.
+        by_new_name (dict): label of each new name.
+        enabled (tuple): enabled labels, in order.
+        columns (list): original names of the enabled columns.
+        rename (dict): new name of each enabled original name.
+        dtypes (dict): data type of each enabled new name, except the time columns (datetime.time), which are converted
+            by the loaders.
+    """
+
+    def __init__(self, labels):
+        self.labels = tuple(Label(*label) for label in labels)
+        self.by_ori_name = {label.ori_name: label for label in self.labels}
+        self.by_new_name = {label.new_name: label for label in self.labels}
+        self.enabled = tuple(label for label in self.labels if label.enable)
+        self.columns = [label.ori_name for label in self.enabled]
+        self.rename = {label.ori_name: label.new_name for label in self.enabled}
+        self.dtypes = {label.new_name: label.new_dtype for label in self.enabled if label.new_dtype is not dt.time}
+
+def get_schema(source):
+    """Function to obtain the label schema of a source of data.
+
+    Args:
+        source (str): 'inference', 'datalogger', 'wstation' or 'locations'.
+
+    Returns:
+        schema (LabelSchema): label schema of the source.
+    """
+
+    if len(_schemas) == 0:
+        reset_labels()
+
+    return _schemas[source]
 
 def get_inference_labels():
-    
-    Label = namedtuple( 'Label' , [
-    'ori_name',
-    'new_name',
-    'new_dtype',
-    'enable',
-    ])
-    
+    """Function to obtain the labels of the columns of the inference files.
+    """
+
+    return get_schema('inference').labels
+
+def get_datalogger_labels():
+    """Function to obtain the labels of the columns of the datalogger files.
+    """
+
+    return get_schema('datalogger').labels
+
+def get_wstation_labels():
+    """Function to obtain the labels of the columns of the weather station files.
+    """
+
+    return get_schema('wstation').labels
+
+def get_locations_labels():
+    """Function to obtain the labels of the columns of the locations metadata file.
+    """
+
+    return get_schema('locations').labels
+
+def species_columns(names, is_float, discover=False, declared=None):
+    """Function to select the species columns among the columns of inference data, by name.
+
+    A column is a species if it has an enabled label with the float data type (by original or new name), or if it has
+    no label and it is declared as a species by the file (e.g. the species of a new model listed in the metadata of the
+    file). The floating point columns without a label that are not declared are only species if discover is True; a
+    warning is logged for them either way, since their data type is the only hint that they are species.
+
+    Args:
+        names (list): names of the columns.
+        is_float (list): flags that indicate if the values of each column are floating point numbers.
+        discover (boolean): flag that indicates if the floating point columns without a label that are not declared
+            are species.
+        declared (list): names of the species declared by the file. If None, only the labels are used.
+
+    Returns:
+        species (list): names of the species columns, in the order of names.
+    """
+
+    schema = get_schema('inference')
+    declared = set(declared or [])
+    species = []
+    unknown = []
+    for name, flt in zip(names,is_float):
+        label = schema.by_ori_name.get(name,schema.by_new_name.get(name))
+        if label is not None:
+            if (label.enable and label.new_dtype is float):
+                species.append(name)
+        elif name in declared:
+            species.append(name)
+        elif (flt):
+            unknown.append(name)
+            if (discover):
+                species.append(name)
+
+    if len(unknown) != 0:
+        logger.warning('Floating point columns without a label %s: %s', 'read as species' if discover else
+                       'ignored (add them to the labels or pass discover=True to read them as species)',
+                       ', '.join(unknown))
+
+    return species
+
+def reset_labels():
+    """Function to build the registry with the default labels and, if the CHORUS_LABELS_FILE environment variable is set,
+    the labels of its file.
+    """
+
+    _schemas.clear()
+    _schemas['inference'] = LabelSchema(_default_inference_labels())
+    _schemas['datalogger'] = LabelSchema(_default_datalogger_labels())
+    _schemas['wstation'] = LabelSchema(_default_wstation_labels())
+    _schemas['locations'] = LabelSchema(_default_locations_labels())
+
+    path = os.environ.get('CHORUS_LABELS_FILE')
+    if path:
+        load_labels(path)
+
+def load_labels(path):
+    """Function to replace the labels of one or more sources with the labels of a JSON or YAML file.
+
+    The file maps each source to its list of labels, each one as [ori_name, new_name, new_dtype, enable] or as a
+    dictionary with those keys, where new_dtype is one of the names of DTYPES, e.g.:
+
+        {"inference": [["date", "date", "datetime64[ns]", true], ["SPHSUR", "SPHSUR", "float", true], ...]}
+
+    The sources that are not in the file keep their labels.
+
+    Args:
+        path (str): path to the .json, .yaml or .yml file.
+
+    Returns:
+        sources (list): sources whose labels were replaced.
+    """
+
+    with open(path) as f:
+        if path.lower().endswith(('.yaml','.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError('PyYAML is required to read the labels file ' + path)
+            content = yaml.safe_load(f)
+        else:
+            content = json.load(f)
+
+    if len(_schemas) == 0:
+        reset_labels()
+
+    schemas = {}
+    for source, labels in content.items():
+        if source not in SOURCES:
+            raise ValueError('Unknown source in the labels file: ' + str(source))
+        schemas[source] = LabelSchema([_parse_label(label) for label in labels])
+    _schemas.update(schemas)
+
+    return list(schemas)
+
+def save_labels(path, sources=None):
+    """Function to save the labels of the registry to a JSON file, e.g. to start a labels file from the default labels.
+
+    Args:
+        path (str): path to the JSON file.
+        sources (list): sources to save. If None, all of them.
+    """
+
+    names = {v: k for k, v in DTYPES.items()}
+    content = {}
+    for source in (sources or SOURCES):
+        content[source] = [[l.ori_name,l.new_name,names[l.new_dtype],l.enable] for l in get_schema(source).labels]
+
+    with open(path,'w') as f:
+        json.dump(content,f,indent=1,ensure_ascii=False)
+
+def labels_state():
+    """Function to obtain the labels of the registry, to rebuild it in another process (see set_labels_state).
+
+    Returns:
+        state (dict): labels of each source.
+    """
+
+    return {source: get_schema(source).labels for source in SOURCES}
+
+def set_labels_state(state):
+    """Function to replace the registry with the labels obtained by labels_state.
+
+    Args:
+        state (dict): labels of each source.
+    """
+
+    _schemas.clear()
+    for source, labels in state.items():
+        _schemas[source] = LabelSchema(labels)
+
+def process_pool(max_workers=None, **kwargs):
+    """Function to create a process pool whose workers use the labels of the registry of this process.
+
+    A worker started with the spawn method (the default on Windows and macOS, and when max_tasks_per_child is set)
+    imports the modules again, so it would build the registry with the default labels and the CHORUS_LABELS_FILE
+    file, not with the labels loaded with load_labels. The registry is passed to every worker by the initializer of
+    the pool instead.
+
+    Args:
+        max_workers (int): maximum number of workers of the pool.
+        **kwargs: other arguments of concurrent.futures.ProcessPoolExecutor (e.g. max_tasks_per_child).
+
+    Returns:
+        pool (ProcessPoolExecutor): process pool.
+    """
+
+    return cf.ProcessPoolExecutor(max_workers=max_workers,initializer=set_labels_state,initargs=(labels_state(),),
+                                  **kwargs)
+
+def _parse_label(label):
+    if isinstance(label,dict):
+        label = [label['ori_name'],label['new_name'],label['new_dtype'],label.get('enable',True)]
+    ori_name, new_name, new_dtype, enable = label
+    if new_dtype not in DTYPES:
+        raise ValueError('Unknown data type in the labels file: ' + str(new_dtype))
+
+    return Label(ori_name,new_name,DTYPES[new_dtype],bool(enable))
+
+def _default_inference_labels():
     labels = [
         #   name new_name new_dtype enable
         Label('date','date','datetime64[ns]', True),
@@ -76,15 +314,7 @@ def get_inference_labels():
     
     return labels
 
-def get_datalogger_labels():
-    
-    Label = namedtuple( 'Label' , [
-    'ori_name',
-    'new_name',
-    'new_dtype',
-    'enable',
-    ])
-    
+def _default_datalogger_labels():
     labels = [
         #   name new_name new_dtype enable
         Label('SN','SN',int, False),
@@ -97,15 +327,7 @@ def get_datalogger_labels():
     
     return labels
 
-def get_wstation_labels():
-    
-    Label = namedtuple( 'Label' , [
-    'ori_name',
-    'new_name',
-    'new_dtype',
-    'enable',
-    ])
-
+def _default_wstation_labels():
     labels = [
         #   name new_name new_dtype enable
         Label('Date','date','datetime64[ns]', True),
@@ -131,15 +353,7 @@ def get_wstation_labels():
 
     return labels
 
-def get_locations_labels():
-    
-    Label = namedtuple( 'Label' , [
-    'ori_name',
-    'new_name',
-    'new_dtype',
-    'enable',
-    ])
-
+def _default_locations_labels():
     labels = [
         #   name new_name new_dtype enable
         Label('location_ID','location_ID',str, True),
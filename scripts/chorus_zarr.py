@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+
+"""This module contains functions for writing and reading EBV-ready datasets as Zarr stores, as an alternative to the
+NetCDF EBV cube (see chorus_data_cube).
+
+The store has the same layout as the multi-site EBV cube, eva(site, time, species) and e.g. temp(site, time), but every
+site is stored in its own chunks (1 site x 30 days x all the species), so that:
+- The sites can be written at the same time by different processes, each one into its own region.
+- A slice of sites, dates and species reads and decompresses only the chunks that contain it.
+
+The metadata is consolidated when the store is created, so that opening the store reads a single metadata file.
+xarray, zarr and dask are required.
+"""
+import numpy as np
+import pandas as pd
+import chorus_utils as chutils
+import chorus_data_cube as chcube
+import chorus_profiling as chprof
+
+try:
+    import xarray as xr
+    import dask.array as da
+except ImportError:
+    xr = None
+    da = None
+
+def create_store(store_path, df_meta, date_ini, date_fin, species=None, T_sample=15, chunk_days=chcube.CHUNK_DAYS):
+    """Function to create an empty Zarr store for the EBV-ready dataset of several sites.
+
+    Only the metadata and the coordinates are written; the chunks of the data are written by write_site.
+
+    Args:
+        store_path (str): path to the Zarr store (e.g. ebvcube_20200101_20201231.zarr).
+        df_meta (pandas DataFrame): DataFrame that contains the metadata of the locations (see get_metadata), one row per site.
+        date_ini (str): start date in YYYY-MM-DD format.
+        date_fin (str): end date in YYYY-MM-DD format (the last slot is the last slot of this day).
+        species (list): species codes. If None, the enabled species of the inference labels.
+        T_sample (int): sample period of the harmonized data in minutes.
+        chunk_days (int): number of days of each chunk.
+
+    Returns:
+        store_path (str): path to the Zarr store.
+    """
+
+    _check_dependencies()
+    if species is None:
+        species = chcube.default_species()
+
+    t_grid = np.arange(np.datetime64(date_ini,'m'),np.datetime64(date_fin,'D')+np.timedelta64(1,'D'),
+                       np.timedelta64(T_sample,'m')).astype('datetime64[ns]')
+    n_sites = df_meta.shape[0]
+    chunk_time = min(max(1,int(chunk_days*24*60/T_sample)),t_grid.shape[0])
+
+    coords = {'site':np.array([str(l) for l in df_meta['location_ID']],dtype=object),
+              'time':t_grid,
+              'species':np.array(species,dtype=object)}
+    for label in chutils.get_locations_labels():
+        if (label.enable and label.new_name in df_meta.columns and label.new_dtype is float):
+            coords[label.new_name.lower()] = ('site',df_meta[label.new_name].to_numpy(dtype=float))
+
+    data_vars = {'eva':(('site','time','species'),
+                        da.full((n_sites,t_grid.shape[0],len(species)),np.nan,dtype=np.float32,
+                                chunks=(1,chunk_time,len(species))),
+                        {'long_name':'estimated vocal activity'})}
+    encoding = {'time':{'units':chcube.TIME_UNITS,'calendar':'standard','dtype':'int32'},
+                'eva':{'chunks':(1,chunk_time,len(species))}}
+    for name, units, standard_name in dict.fromkeys(chcube.CLIMVAR_NC.values()):
+        data_vars[name] = (('site','time'),
+                           da.full((n_sites,t_grid.shape[0]),np.nan,dtype=np.float32,chunks=(1,chunk_time)),
+                           {'units':units,'standard_name':standard_name})
+        encoding[name] = {'chunks':(1,chunk_time)}
+
+    ds = xr.Dataset(data_vars,coords=coords)
+    ds.attrs = {'Conventions':'CF-1.8','featureType':'timeSeries',
+                'title':'EBV-ready dataset of the vocal activity of anuran amphibians',
+                'sample_period_minutes':T_sample}
+    ds['time'].attrs = {'standard_name':'time','comment':'local time of the location'}
+
+    ds.to_zarr(store_path,mode='w',compute=False,encoding=encoding,consolidated=True)
+
+    return store_path
+
+@chprof.profiled()
+def write_site(store_path, location_id, df_inf_h, df_dlog_h):
+    """Function to write the harmonized data of a site to its region of a Zarr store.
+
+    Different sites can be written at the same time by different processes, since they do not share chunks.
+    The slots outside the time axis of the store, and the species and climatic variables that are not in the store,
+    are ignored. The slots inside the time axis that are not on its grid are counted and a warning is logged (see
+    chorus_data_cube.grid_positions).
+
+    Args:
+        store_path (str): path to the Zarr store.
+        location_id (str): location identifier.
+        df_inf_h (pandas DataFrame): DataFrame that contains the harmonized inferences of the site.
+        df_dlog_h (pandas DataFrame): DataFrame that contains the harmonized (or combined) climatic variables of the site,
+            on the same slots as df_inf_h.
+
+    Returns:
+        n_slots (int): number of slots written.
+        n_dropped (int): number of slots inside the time axis of the store that were not written because they are not
+            on its grid.
+    """
+
+    _check_dependencies()
+    if df_dlog_h.shape[0] != df_inf_h.shape[0]:
+        raise ValueError('df_inf_h and df_dlog_h must be harmonized on the same slots')
+
+    ds = open_store(store_path)
+    site_ids = [str(s) for s in ds['site'].values]
+    if location_id not in site_ids:
+        raise ValueError('Location not in the Zarr store: ' + location_id)
+    site = site_ids.index(location_id)
+
+    T_sample = int(ds.attrs['sample_period_minutes'])
+    t_store = ds['time'].values
+    offset = (df_inf_h['time'].to_numpy(dtype='datetime64[ns]') - t_store[0]) // np.timedelta64(1,'m')
+    pos, keep, n_dropped = chcube.grid_positions(offset,T_sample,t_store.shape[0],location_id)
+    if not keep.any():
+        return 0, n_dropped
+    i0 = int(pos.min())
+    i1 = int(pos.max()) + 1
+
+    species = [str(s) for s in ds['species'].values]
+    cols = [c for c in species if c in df_inf_h.columns]
+    eva = np.full((1,i1-i0,len(species)),np.nan,dtype=np.float32)
+    eva[0][np.ix_(pos-i0,[species.index(c) for c in cols])] = df_inf_h.loc[keep,cols].to_numpy(dtype=np.float32)
+    data_vars = {'eva':(('site','time','species'),eva)}
+
+    for col in df_dlog_h.columns:
+        name = chcube.CLIMVAR_NC.get(col,(None,))[0]
+        if name is None or name not in ds.data_vars:
+            continue
+        values = np.full((1,i1-i0),np.nan,dtype=np.float32)
+        values[0,pos-i0] = df_dlog_h.loc[keep,col].to_numpy(dtype=np.float32)
+        data_vars[name] = (('site','time'),values)
+
+    xr.Dataset(data_vars).to_zarr(store_path,region={'site':slice(site,site+1),'time':slice(i0,i1)})
+    chprof.count_files()
+
+    return int(keep.sum()), n_dropped
+
+def open_store(store_path):
+    """Function to open a Zarr store through its consolidated metadata. The data is read lazily.
+
+    Args:
+        store_path (str): path to the Zarr store.
+
+    Returns:
+        ds (xarray Dataset): Dataset that contains the EBV-ready dataset.
+    """
+
+    _check_dependencies()
+
+    return xr.open_zarr(store_path,consolidated=True)
+
+def read_slice(store_path, locations=None, species=None, date_ini=None, date_fin=None):
+    """Function to read a slice of a Zarr store; only the chunks that contain the slice are read.
+
+    Args:
+        store_path (str): path to the Zarr store.
+        locations (list): location identifiers. If None, all the sites.
+        species (list): species codes. If None, all the species.
+        date_ini (str): start date in YYYY-MM-DD format. If None, from the first slot.
+        date_fin (str): end date in YYYY-MM-DD format (included). If None, up to the last slot.
+
+    Returns:
+        ds (xarray Dataset): Dataset that contains the slice, loaded in memory.
+    """
+
+    ds = open_store(store_path)
+    if locations is not None:
+        ds = ds.sel(site=list(locations))
+    if species is not None:
+        ds = ds.sel(species=list(species))
+    if (date_ini is not None or date_fin is not None):
+        t_fin = None
+        if date_fin is not None:
+            t_fin = pd.Timestamp(date_fin) + pd.Timedelta(days=1) - pd.Timedelta(nanoseconds=1)
+        ds = ds.sel(time=slice(date_ini,t_fin))
+
+    return ds.load()
+
+def _check_dependencies():
+    if xr is None:
+        raise ImportError('xarray, zarr and dask are required to use Zarr stores')
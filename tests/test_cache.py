@@ -0,0 +1,78 @@
+"""Tests of the invalidation and the eviction of the on-disk cache of chorus_cache."""
+import os
+import time
+import pandas as pd
+import chorus_utils as chutils
+import chorus_cache as chcache
+
+def write_source(path, value):
+    pd.DataFrame({'a':[value]}).to_csv(path,index=False)
+
+def cached_files(cache_dir):
+    return sorted(f for f in os.listdir(cache_dir) if f.endswith(chcache.CACHE_EXT))
+
+class CountingReader:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, file_path):
+        self.calls += 1
+        return pd.read_csv(file_path)
+
+def test_schema_hash_normalizes_numbers():
+    labels = chutils.get_wstation_labels()
+
+    assert chcache.schema_hash(labels,-3) == chcache.schema_hash(labels,-3.0)
+    assert chcache.schema_hash(labels,-3) != chcache.schema_hash(labels,-2)
+
+def test_schemas_kept_and_stale_versions_invalidated(tmp_path):
+    source = str(tmp_path / 'source.csv')
+    cache_dir = str(tmp_path / 'cache')
+    write_source(source,1)
+    reader = CountingReader()
+    key_a = chcache.schema_hash(chutils.get_wstation_labels(),-3)
+    key_b = chcache.schema_hash(chutils.get_wstation_labels(),-2)
+
+    #two schemas of the same file are cached side by side and each one is read once
+    for key in [key_a,key_b,key_a,key_b]:
+        assert chcache.read_cached(source,reader,key,cache_dir)['a'][0] == 1
+    assert reader.calls == 2
+    assert len(cached_files(cache_dir)) == 2
+
+    #a new version of the source file replaces the files of every schema of the old one
+    write_source(source,2)
+    os.utime(source,ns=(time.time_ns(),time.time_ns() + 10**9))
+    assert chcache.read_cached(source,reader,key_a,cache_dir)['a'][0] == 2
+    assert reader.calls == 3
+    assert cached_files(cache_dir) == [chcache.cache_file_name(source,key_a)]
+
+def test_invalidate_only_the_requested_source(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    sources = [str(tmp_path / 'one.csv'),str(tmp_path / 'two.csv')]
+    for i, source in enumerate(sources):
+        write_source(source,i)
+        chcache.read_cached(source,CountingReader(),'schema',cache_dir)
+
+    path_key = chcache.cache_file_name(sources[0],'schema').split('_')[0]
+    chcache.invalidate(cache_dir,path_key)
+    assert cached_files(cache_dir) == [chcache.cache_file_name(sources[1],'schema')]
+
+    chcache.invalidate(cache_dir)
+    assert cached_files(cache_dir) == []
+
+def test_evict_least_recently_used(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    sources = [str(tmp_path / '{}.csv'.format(i)) for i in range(3)]
+    for i, source in enumerate(sources):
+        write_source(source,i)
+        chcache.read_cached(source,CountingReader(),'schema',cache_dir)
+    names = [chcache.cache_file_name(source,'schema') for source in sources]
+    for i, name in enumerate(names):
+        os.utime(os.path.join(cache_dir,name),(1000+i,1000+i))
+    #reading the oldest file makes it the most recently used one
+    chcache.read_cached(sources[0],CountingReader(),'schema',cache_dir)
+    size = os.path.getsize(os.path.join(cache_dir,names[0]))
+
+    chcache.evict(cache_dir,max_bytes=2*size)
+
+    assert cached_files(cache_dir) == sorted([names[0],names[2]])
@@ -0,0 +1,110 @@
+"""Tests of the scan, the persisted index and the queries of chorus_catalog."""
+import os
+import datetime as dt
+import chorus_catalog as chcatalog
+
+FILES = [
+    'INCT0_inference_20200101_20200131.parquet',
+    'INCT0_datalogger_20191220_20200429.xlsx',
+    'b/INCT9_inference_20200201.parquet',
+    'b/INCT9_wstation.csv',
+    'b/c/notes.txt',
+    'a/INCT4_inference_20200301_20200331.parquet',
+]
+
+def make_tree(root, files=FILES):
+    for name in files:
+        path = os.path.join(root,name)
+        os.makedirs(os.path.dirname(path),exist_ok=True)
+        open(path,'w').close()
+
+def touch_dir(path):
+    #advance the modification time so that the test does not depend on the resolution of the file system
+    mtime = os.stat(path).st_mtime_ns + 10**9
+    os.utime(path,ns=(mtime,mtime))
+
+def walk_names(root):
+    names = []
+    for dirpath, dirs, files in os.walk(root):
+        dirs.sort()
+        names += sorted(files)
+    return names
+
+class CountingScandir:
+    def __init__(self, monkeypatch):
+        self.paths = []
+        self.scandir = os.scandir
+        monkeypatch.setattr(os,'scandir',self)
+
+    def __call__(self, path):
+        self.paths.append(os.path.relpath(path))
+        return self.scandir(path)
+
+def test_scan_classifies_files(tmp_path):
+    make_tree(str(tmp_path))
+    catalog = chcatalog.DataCatalog(str(tmp_path))
+
+    assert [entry.name for entry in catalog.entries] == walk_names(str(tmp_path))
+    assert catalog.locations() == ['INCT0','INCT4','INCT9']
+    assert catalog.locations('inference') == ['INCT0','INCT4','INCT9']
+    assert [entry.name for entry in catalog.select('INCT9')] == ['INCT9_inference_20200201.parquet','INCT9_wstation.csv']
+
+    entry = catalog.select('INCT0','datalogger')[0]
+    assert (entry.date_ini, entry.date_fin) == (dt.datetime(2019,12,20), dt.datetime(2020,4,29))
+    entry = catalog.select('INCT9','inference')[0]
+    assert entry.date_ini == entry.date_fin == dt.datetime(2020,2,1)
+    entry = chcatalog.parse_file_name('notes.txt')
+    assert (entry.location_id, entry.source, entry.date_ini) == (None, None, None)
+
+def test_match_and_search_files(tmp_path):
+    make_tree(str(tmp_path))
+    catalog = chcatalog.DataCatalog(str(tmp_path))
+
+    assert catalog.match('INCT9_*') == [str(tmp_path / 'b' / 'INCT9_inference_20200201.parquet'),
+                                        str(tmp_path / 'b' / 'INCT9_wstation.csv')]
+    assert sorted(catalog.match('*_inference*.parquet')) == \
+        sorted(chcatalog.search_files(str(tmp_path),'*_inference*.parquet'))
+
+    #the files whose dates can not overlap the requested period are skipped, the ones without dates are kept
+    found = chcatalog.search_files(catalog,'INCT*',dt.datetime(2020,2,15),dt.datetime(2020,2,20))
+    assert [os.path.basename(p) for p in found] == ['INCT0_datalogger_20191220_20200429.xlsx','INCT9_wstation.csv']
+    found = chcatalog.search_files(catalog,'INCT0_inference*',dt.datetime(2020,2,1),dt.datetime(2020,2,5))
+    assert len(found) == 1
+
+def test_index_rescans_only_modified_folders(tmp_path, monkeypatch):
+    root = str(tmp_path / 'data')
+    index_file = str(tmp_path / 'index.json')
+    make_tree(root)
+    chcatalog.DataCatalog(root,index_file=index_file)
+
+    #unchanged tree: the index is used and no folder is listed
+    counter = CountingScandir(monkeypatch)
+    catalog = chcatalog.DataCatalog(root,index_file=index_file)
+    assert counter.paths == []
+    assert [entry.name for entry in catalog.entries] == walk_names(root)
+
+    #a new file and a new subfolder: only the modified folders are listed
+    make_tree(root,['b/INCT9_inference_20200301.parquet','b/d/INCT7_wstation.csv'])
+    touch_dir(os.path.join(root,'b'))
+    counter.paths = []
+    catalog = chcatalog.DataCatalog(root,index_file=index_file)
+    assert sorted(counter.paths) == sorted(os.path.relpath(os.path.join(root,d)) for d in ['b','b/d'])
+    assert [entry.name for entry in catalog.entries] == walk_names(root)
+
+    #a removed file, and the updated index is saved
+    os.remove(os.path.join(root,'a','INCT4_inference_20200301_20200331.parquet'))
+    touch_dir(os.path.join(root,'a'))
+    chcatalog.DataCatalog(root,index_file=index_file)
+    counter.paths = []
+    catalog = chcatalog.DataCatalog(root,index_file=index_file)
+    assert counter.paths == []
+    assert catalog.locations() == ['INCT0','INCT7','INCT9']
+
+def test_index_of_another_folder_is_rescanned(tmp_path):
+    index_file = str(tmp_path / 'index.json')
+    make_tree(str(tmp_path / 'one'),FILES[:2])
+    make_tree(str(tmp_path / 'two'),FILES[2:4])
+    chcatalog.DataCatalog(str(tmp_path / 'one'),index_file=index_file)
+
+    catalog = chcatalog.DataCatalog(str(tmp_path / 'two'),index_file=index_file)
+    assert catalog.locations() == ['INCT9']
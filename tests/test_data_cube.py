@@ -0,0 +1,39 @@
+"""Tests of the multi-site EBV cube of chorus_data_cube."""
+import numpy as np
+import pandas as pd
+import netCDF4 as nc
+import chorus_data_cube as chcube
+
+SPECIES = ['BOABIS','SCIPER','DENMIN']
+
+def make_site(start, periods, seed, T_sample=15):
+    rng = np.random.default_rng(seed)
+    time = pd.date_range(start,periods=periods,freq='{}min'.format(T_sample))
+    df_inf_h = pd.DataFrame(rng.random((periods,len(SPECIES))),columns=SPECIES)
+    df_inf_h.insert(0,'time',time)
+    df_climvar = pd.DataFrame({'T(C)':rng.normal(20,3,periods),'RH(%)':rng.uniform(40,90,periods)})
+    return df_inf_h, df_climvar
+
+def test_write_site_counts_slots_off_the_grid(tmp_path, caplog):
+    cube_path = str(tmp_path / 'cube.nc')
+    df_meta = pd.DataFrame({'location_ID':['INCT0','INCT9']})
+    chcube.create_site_cube(cube_path,df_meta,'2020-01-01','2020-01-01',species=SPECIES)
+
+    #slots on the grid of the cube, the last two are after the end of the cube and are ignored
+    df_inf_h, df_climvar = make_site('2020-01-01 23:00',6,0)
+    assert chcube.write_site(cube_path,'INCT0',df_inf_h,df_climvar) == (4,0)
+    assert caplog.records == []
+
+    #slots of a grid anchored at 00:07 are inside the time axis but not on its grid
+    df_inf_h9, df_climvar9 = make_site('2020-01-01 00:07',8,1)
+    assert chcube.write_site(cube_path,'INCT9',df_inf_h9,df_climvar9) == (0,8)
+    assert 'INCT9' in caplog.text
+
+    with nc.Dataset(cube_path) as ds:
+        eva = ds['eva'][:].filled(np.nan)
+        temp = ds['temp'][:].filled(np.nan)
+        assert eva.shape == (2,96,3)
+        np.testing.assert_allclose(eva[0,92:],df_inf_h[SPECIES].to_numpy()[:4],rtol=1e-6)
+        np.testing.assert_allclose(temp[0,92:],df_climvar['T(C)'].to_numpy()[:4],rtol=1e-6)
+        assert np.isnan(eva[0,:92]).all()
+        assert np.isnan(eva[1]).all()
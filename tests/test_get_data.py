@@ -0,0 +1,67 @@
+"""Tests of the species discovery and the row group pruning of the inference files of chorus_get_data."""
+import json
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import chorus_get_data as gdata
+
+def write_inference(path, dates, declared=None, seed=0):
+    rng = np.random.default_rng(seed)
+    n = len(dates)
+    df = pd.DataFrame({'date':pd.to_datetime(dates),'sample_rate':48000.0,'min':0,'max':60})
+    for species in ['BOABIS','SCIPER','NEWSP','OTHERSP']:
+        df[species] = rng.random(n)
+    table = pa.Table.from_pandas(df,preserve_index=False)
+    if declared is not None:
+        table = table.replace_schema_metadata({**table.schema.metadata,gdata.SPECIES_METADATA_KEY:json.dumps(declared)})
+    pq.write_table(table,path,row_group_size=max(1,n//2))
+    return df
+
+class CountingParquetFile(pq.ParquetFile):
+    paths = []
+
+    def __init__(self, source, *args, **kwargs):
+        CountingParquetFile.paths.append(source)
+        super().__init__(source,*args,**kwargs)
+
+def test_species_from_labels_metadata_and_discovery(tmp_path, caplog):
+    dates = pd.date_range('2020-01-01',periods=8,freq='15min')
+    write_inference(str(tmp_path / 'INCT0_inference_20200101.gzip'),dates,declared=['NEWSP'])
+    write_inference(str(tmp_path / 'INCT9_inference_20200101.gzip'),dates)
+
+    #labels and the species declared in the metadata of the file; the unknown float columns are only logged
+    df = gdata.get_inference(str(tmp_path),'INCT0','2020-01-01','2020-01-01',qc=False)
+    assert df.attrs['species'] == ['BOABIS','SCIPER','NEWSP']
+    assert 'OTHERSP' not in df.columns and 'sample_rate' not in df.columns
+    assert 'OTHERSP' in caplog.text
+
+    df = gdata.get_inference(str(tmp_path),'INCT9','2020-01-01','2020-01-01',qc=False)
+    assert df.attrs['species'] == ['BOABIS','SCIPER']
+
+    #discovery reads every float column without a label as a species
+    df = gdata.get_inference(str(tmp_path),'INCT9','2020-01-01','2020-01-01',qc=False,discover=True)
+    assert df.attrs['species'] == ['BOABIS','SCIPER','NEWSP','OTHERSP']
+
+    assert gdata.get_inference_species(str(tmp_path)) == ['BOABIS','SCIPER','NEWSP']
+    assert gdata.get_inference_species(str(tmp_path),['INCT9']) == ['BOABIS','SCIPER']
+
+def test_footer_read_once_and_row_groups_pruned(tmp_path, monkeypatch):
+    df1 = write_inference(str(tmp_path / 'INCT0_inference_a.gzip'),pd.date_range('2020-01-01',periods=8,freq='6H'))
+    write_inference(str(tmp_path / 'INCT0_inference_b.gzip'),pd.date_range('2020-03-01',periods=8,freq='6H'))
+    #each file is opened once, and its footer is used for the pruning, the species and the read
+    monkeypatch.setattr(pq,'ParquetFile',CountingParquetFile)
+    monkeypatch.setattr(CountingParquetFile,'paths',[])
+    monkeypatch.setattr(pq,'read_schema',None)
+    monkeypatch.setattr(pd,'read_parquet',None)
+
+    #the file of March is skipped from the statistics of its row groups
+    df = gdata.get_inference(str(tmp_path),'INCT0','2020-01-03','2020-01-03',qc=False)
+    assert sorted(CountingParquetFile.paths) == sorted(str(tmp_path / n) for n in ['INCT0_inference_a.gzip',
+                                                                                   'INCT0_inference_b.gzip'])
+    assert df.shape[0] == 0
+
+    df = gdata.get_inference(str(tmp_path),'INCT0','2020-01-01','2020-01-02',qc=False)
+    expected = df1[df1['date'] <= '2020-01-02'].reset_index(drop=True)
+    pd.testing.assert_frame_equal(df[['date','BOABIS']],expected[['date','BOABIS']])
+    assert len(CountingParquetFile.paths) == 4
@@ -0,0 +1,259 @@
+"""Regression tests of the vectorized harmonizers against the per-slot loops they replaced."""
+import datetime as dt
+import numpy as np
+import pandas as pd
+import chorus_utils as chutils
+import chorus_harmonize_data as hdata
+
+T_SAMPLE = 15
+SPECIES = ['BOABIS','SCIPER','DENMIN']
+
+def loop_harmonize_inference(df_inf, t_grid):
+    """Per-slot loop of the original harmonize_inference (without the date and hour columns, which are no longer
+    part of the harmonized DataFrames): the maximum of the records whose date is exactly the slot.
+    """
+
+    eva_cols = df_inf.columns[4:].values.tolist()
+    df_inf_h = pd.DataFrame(columns=['time'] + eva_cols)
+    df_inf_h['time'] = t_grid
+    df_aux = df_inf.groupby('date')[eva_cols].max()
+    for i in range(len(df_inf_h)):
+        values = df_aux[df_aux.index.values == df_inf_h.time.values[i]]
+        if len(values) != 0:
+            df_inf_h.iloc[i,1:] = values.values[0]
+
+    for label in chutils.get_inference_labels():
+        if (label.new_name in eva_cols):
+            df_inf_h[label.new_name] = df_inf_h[label.new_name].astype(label.new_dtype)
+
+    return df_inf_h
+
+def make_inference(dates, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.to_datetime(pd.Series(dates))
+    df_inf = pd.DataFrame({'date':dates,'time':dates.dt.time,'min':0,'max':60})
+    for species in SPECIES:
+        df_inf[species] = np.round(rng.random(len(dates)),3)
+
+    return df_inf
+
+def test_slot_records_match_loop():
+    #two records per slot (e.g. two audio segments), a gap of one day and a slot with a single record
+    slots = pd.date_range('2020-01-01 00:00','2020-01-04 23:45',freq='15min')
+    slots = slots[(slots < '2020-01-02') | (slots >= '2020-01-03')]
+    df_inf = make_inference(list(slots) + list(slots[:-1]))
+    t_grid = hdata.time_grid(slots[0],slots[-1],T_SAMPLE)
+
+    expected = loop_harmonize_inference(df_inf,t_grid).astype({c: hdata.HARMONIZED_DTYPE for c in SPECIES})
+    result = hdata.harmonize_inference(df_inf,t_grid,T_SAMPLE)
+
+    pd.testing.assert_frame_equal(result,expected)
+    assert result[SPECIES].isna().all(axis=1).sum() == 96
+
+def test_records_within_period_match_loop_on_floored_dates():
+    #the loop only took the records whose date is exactly a slot; the vectorized engine assigns every record to the
+    #slot of its sample period, which is what the loop gives once the dates are floored to the period
+    slots = pd.date_range('2020-01-01 00:00','2020-01-02 23:45',freq='15min')
+    offsets = pd.to_timedelta(np.tile([0,1,7,14],len(slots)//4),unit='m')
+    df_inf = make_inference(list(slots + offsets) + list(slots + pd.Timedelta(minutes=3)))
+    t_grid = hdata.time_grid(slots[0],slots[-1],T_SAMPLE)
+
+    df_floored = df_inf.copy()
+    df_floored['date'] = df_floored['date'].dt.floor('%dmin' % T_SAMPLE)
+    expected = loop_harmonize_inference(df_floored,t_grid).astype({c: hdata.HARMONIZED_DTYPE for c in SPECIES})
+    result = hdata.harmonize_inference(df_inf,t_grid,T_SAMPLE)
+
+    pd.testing.assert_frame_equal(result,expected)
+    assert not result[SPECIES].isna().any().any()
+
+def test_empty_grid():
+    df_inf = make_inference([dt.datetime(2020,1,1)])
+    result = hdata.harmonize_inference(df_inf,hdata.time_grid('2020-01-02','2020-01-01',T_SAMPLE),T_SAMPLE)
+
+    assert list(result.columns) == ['time'] + SPECIES
+    assert result.shape[0] == 0
+
+def loop_harmonize_datalogger(df, t_grid, T_sample):
+    """Per-slot loop of the original harmonize_datalogger (with the xs/ys lists reset for each column): a linear
+    regression on the minute of the day of the readings of the same day within T_sample minutes of each slot.
+    """
+
+    climatic_cols = list(df.columns[2:])
+    result = np.full((len(t_grid),len(climatic_cols)),np.nan)
+    for i, slot in enumerate(pd.DatetimeIndex(t_grid)):
+        df_aux = df[df['date'] == slot.normalize()].sort_values(by='time').reset_index(drop=True)
+        idx = []
+        for k in range(df_aux.shape[0]):
+            t2 = df_aux.time[k]
+            d_min = (dt.datetime.combine(slot.date(),t2) - slot.to_pydatetime()).total_seconds()/60
+            if (abs(d_min) <= T_sample):
+                idx.append(k)
+            if d_min > T_sample:
+                break
+        if len(idx) == 0:
+            continue
+        for j, col in enumerate(climatic_cols):
+            xs = [df_aux.time[k].hour*60+df_aux.time[k].minute for k in idx]
+            ys = [df_aux[col][k] for k in idx]
+            with np.errstate(divide='ignore',invalid='ignore'):
+                mean_x = np.mean(xs)
+                mean_y = np.mean(ys)
+                numer = sum((x-mean_x)*(y-mean_y) for x, y in zip(xs,ys))
+                denom = sum((x-mean_x)**2 for x in xs)
+                m = np.float64(numer)/np.float64(denom)
+                result[i,j] = round(mean_y - m*mean_x + m*(slot.hour*60+slot.minute),1)
+
+    return result
+
+def make_datalogger(times, seed=0):
+    rng = np.random.default_rng(seed)
+    times = pd.to_datetime(pd.Series(times))
+    df = pd.DataFrame({'date':times.dt.normalize(),'time':times.dt.time})
+    df['T(C)_DL'] = 20 + 5*rng.random(len(times))
+    df['RH(%)_DL'] = 60 + 30*rng.random(len(times))
+    df['DP(C)_DL'] = np.nan
+
+    return df
+
+def test_datalogger_matches_loop():
+    #readings every 10 minutes with a gap, a slot whose window holds a single reading, and windows cut at midnight
+    times = list(pd.date_range('2020-01-01 22:00','2020-01-02 02:00',freq='10min'))
+    times = [t for t in times if not pd.Timestamp('2020-01-02 00:45') <= t <= pd.Timestamp('2020-01-02 01:25')]
+    times = times + [pd.Timestamp('2020-01-02 03:07')]
+    df_dlog = make_datalogger(times)
+    t_grid = hdata.time_grid('2020-01-01 21:30','2020-01-02 03:30',T_SAMPLE)
+
+    expected = loop_harmonize_datalogger(df_dlog,t_grid,T_SAMPLE)
+    result = hdata.harmonize_datalogger(df_dlog,t_grid,T_SAMPLE)
+
+    np.testing.assert_allclose(result[list(df_dlog.columns[2:])].values,expected,atol=1e-9,equal_nan=True)
+    assert result['DP(C)_DL'].isna().all()
+    assert result['T(C)_DL'].notna().sum() > 0
+    #the 03:00 slot only sees the 03:07 reading: a line can not be fitted
+    assert np.isnan(result.loc[result['time'] == pd.Timestamp('2020-01-02 03:00'),'T(C)_DL']).all()
+
+def test_regression_window_clipped_to_day():
+    #the readings of the previous evening do not reach the slot at midnight
+    t_obs = pd.to_datetime(['2020-01-01 23:50','2020-01-01 23:55','2020-01-02 00:05','2020-01-02 00:10']).values
+    values = np.array([[1.0],[2.0],[10.0],[12.0]])
+    t_grid = pd.to_datetime(['2020-01-01 23:45','2020-01-02 00:00']).values
+
+    pred = hdata.windowed_regression(t_obs,values,t_grid,T_SAMPLE)
+
+    assert pred[0,0] == 0.0
+    assert pred[1,0] == 8.0
+
+def loop_harmonize_wstation(df, t_grid, T_sample=None):
+    """Per-slot loop of the original harmonize_wstation (the branch that matches the date and the time): the first
+    reading at the time of each slot. With T_sample, the nearest reading within T_sample minutes instead, the
+    earlier one on a tie.
+    """
+
+    climatic_cols = list(df.columns[2:])
+    stamps = pd.to_datetime(df['date'].dt.strftime('%Y-%m-%d ') + df['time'].astype(str))
+    result = np.full((len(t_grid),len(climatic_cols)),np.nan)
+    for i, slot in enumerate(pd.DatetimeIndex(t_grid)):
+        if T_sample is None:
+            df_sel = df[stamps == slot]
+        else:
+            d = (stamps - slot).abs()
+            d = d[d <= pd.Timedelta(minutes=T_sample)]
+            if d.shape[0] == 0:
+                continue
+            #the first reading at the smallest distance, in time order
+            candidates = stamps[d.index][d == d.min()]
+            df_sel = df.loc[[candidates.sort_values(kind='stable').index[0]]]
+        if (df_sel.shape[0] != 0):
+            result[i] = df_sel.iloc[0][climatic_cols].to_numpy(dtype=float)
+
+    return result
+
+def make_wstation(times, seed=0):
+    rng = np.random.default_rng(seed)
+    times = pd.to_datetime(pd.Series(times))
+    df = pd.DataFrame({'date':times.dt.normalize(),'time':times.dt.time})
+    df['T_max(C)_WS'] = np.round(20 + 5*rng.random(len(times)),1)
+    df['RH(%)_WS'] = np.round(60 + 30*rng.random(len(times)),1)
+
+    return df
+
+def test_wstation_matches_loop():
+    #hourly readings with a gap, a duplicated reading, readings off the slots and two readings at the same distance
+    #of a slot (01:52 and 02:08 around 02:00)
+    times = ['2020-01-01 00:00','2020-01-01 01:00','2020-01-01 01:00','2020-01-01 01:52','2020-01-01 02:08',
+             '2020-01-01 03:04','2020-01-01 06:00','2020-01-01 06:29']
+    df_wst = make_wstation(times)
+    t_grid = hdata.time_grid('2020-01-01 00:00','2020-01-01 07:00',T_SAMPLE)
+    climatic_cols = list(df_wst.columns[2:])
+
+    exact = hdata.harmonize_wstation(df_wst,t_grid,T_SAMPLE,exact=True)
+    np.testing.assert_array_equal(exact[climatic_cols].values,
+                                  loop_harmonize_wstation(df_wst,t_grid).astype(hdata.HARMONIZED_DTYPE))
+    assert exact['T_max(C)_WS'].notna().sum() == 3
+
+    nearest = hdata.harmonize_wstation(df_wst,t_grid,T_SAMPLE,exact=False)
+    np.testing.assert_array_equal(nearest[climatic_cols].values,
+                                  loop_harmonize_wstation(df_wst,t_grid,T_SAMPLE).astype(hdata.HARMONIZED_DTYPE))
+    slot = nearest['time'] == pd.Timestamp('2020-01-01 02:00')
+    assert nearest.loc[slot,'T_max(C)_WS'].iloc[0] == hdata.HARMONIZED_DTYPE(df_wst['T_max(C)_WS'][3])
+    #the slots from 03:30 to 05:30 are farther than T_sample from any reading
+    assert nearest.loc[(nearest['time'] >= '2020-01-01 03:30') & (nearest['time'] < '2020-01-01 05:45')].iloc[:,1:].isna().all().all()
+
+def test_combine_climvar_priority_and_provenance():
+    t_grid = hdata.time_grid('2020-01-01 00:00','2020-01-01 00:45',T_SAMPLE)
+    nan = np.nan
+    df_dlog_h = pd.DataFrame({'time':t_grid,'T(C)_DL':[20.0,nan,nan,nan],'RH(%)_DL':[70.0,71.0,nan,nan],
+                              'DP(C)_DL':[nan,nan,nan,nan]})
+    df_wst_h = pd.DataFrame({'time':t_grid,'T_max(C)_WS':[30.0,24.0,26.0,nan],'T_min(C)_WS':[10.0,20.0,nan,nan],
+                             'RH(%)_WS':[50.0,50.0,50.0,nan],'DP(C)_WS':[5.0,nan,6.0,nan],
+                             'Rainfall(mm)_WS':[0.0,1.0,nan,2.0]})
+
+    df_climvar = hdata.combine_climvar(df_dlog_h,df_wst_h,provenance=True)
+
+    #the datalogger wins where it has a value, the weather station fills its gaps in order of priority:
+    #the mean of the maximum and the minimum temperatures, then the maximum alone
+    np.testing.assert_array_equal(df_climvar['T(C)'].values,[20.0,22.0,26.0,nan])
+    np.testing.assert_array_equal(df_climvar['T(C)_source'].values,[0,1,2,-1])
+    np.testing.assert_array_equal(df_climvar['RH(%)'].values,[70.0,71.0,50.0,nan])
+    np.testing.assert_array_equal(df_climvar['RH(%)_source'].values,[0,0,1,-1])
+    np.testing.assert_array_equal(df_climvar['DP(C)'].values,[5.0,nan,6.0,nan])
+    np.testing.assert_array_equal(df_climvar['DP(C)_source'].values,[1,-1,1,-1])
+    np.testing.assert_array_equal(df_climvar['Rainfall(mm)_source'].values,[0,0,-1,0])
+    assert list(df_climvar.columns) == (['time'] + list(hdata.CLIMVAR_PRIORITY)
+                                        + [v+'_source' for v in hdata.CLIMVAR_PRIORITY])
+
+def test_combine_climvar_without_wstation():
+    t_grid = hdata.time_grid('2020-01-01 00:00','2020-01-01 00:15',T_SAMPLE)
+    df_dlog_h = pd.DataFrame({'time':t_grid,'T(C)_DL':[20.0,21.0],'RH(%)_DL':[70.0,np.nan],'DP(C)_DL':[5.0,6.0]})
+
+    df_climvar = hdata.combine_climvar(df_dlog_h)
+
+    assert list(df_climvar.columns) == ['time'] + list(hdata.CLIMVAR_PRIORITY)
+    np.testing.assert_array_equal(df_climvar['RH(%)'].values,[70.0,np.nan])
+    assert df_climvar['Rainfall(mm)'].isna().all()
+
+def test_windowed_output_matches_whole_period():
+    #a grid anchored at 00:07 split every 12 hours: the first slot of each window (12:07, 00:07) has a regression
+    #window that reaches the readings of the previous window
+    slots = pd.date_range('2020-01-01 00:07','2020-01-03 17:52',freq='15min')
+    df_inf = make_inference(list(slots) + list(slots[::3] + pd.Timedelta(minutes=4)))
+    df_inf = df_inf.sort_values('date',kind='stable').reset_index(drop=True)
+    df_dlog = make_datalogger(pd.date_range('2020-01-01 00:00','2020-01-03 23:55',freq='5min'))
+    df_dlog['DP(C)_DL'] = df_dlog['T(C)_DL'] - 10
+    df_wst = make_wstation(pd.date_range('2020-01-01 00:22','2020-01-03 23:22',freq='60min'))
+
+    windows = hdata.time_windows(slots[0],slots[-1],'12H',T_SAMPLE)
+    assert windows[1][0] == pd.Timestamp('2020-01-01 12:07')
+    assert all(w[0] - v[1] == pd.Timedelta(minutes=T_SAMPLE) for v, w in zip(windows,windows[1:]))
+
+    df_inf_h, df_dlog_h, df_wst_h = hdata.harmonize3(df_inf,df_dlog,df_wst,T_SAMPLE,ws_exact=True)
+    parts = list(hdata.harmonize_stream(df_inf,df_dlog,df_wst,T_SAMPLE,'12H'))
+    assert len(parts) == len(windows)
+    pd.testing.assert_frame_equal(pd.concat([p[0] for p in parts],ignore_index=True),df_inf_h)
+    pd.testing.assert_frame_equal(pd.concat([p[1] for p in parts],ignore_index=True),
+                                  hdata.combine_climvar(df_dlog_h,df_wst_h))
+    assert df_dlog_h['T(C)_DL'].notna().all()
+
+    df_inf_h, df_dlog_h = hdata.harmonize2(df_inf,df_dlog,T_SAMPLE)
+    parts = list(hdata.harmonize_stream(df_inf,df_dlog,None,T_SAMPLE,'7H'))
+    pd.testing.assert_frame_equal(pd.concat([p[1] for p in parts],ignore_index=True),hdata.combine_climvar(df_dlog_h))
@@ -0,0 +1,31 @@
+"""Tests of the label registry of chorus_utils."""
+import json
+import multiprocessing
+import chorus_utils as chutils
+
+def test_loaded_labels_reach_spawned_workers(tmp_path):
+    labels_file = str(tmp_path / 'labels.json')
+    chutils.reset_labels()
+    chutils.save_labels(labels_file,['inference'])
+    with open(labels_file) as f:
+        content = json.load(f)
+    for label in content['inference']:
+        if label[0] == 'BOABIS':
+            label[1] = 'BOABIS_v2'
+    with open(labels_file,'w') as f:
+        json.dump(content,f)
+
+    try:
+        chutils.load_labels(labels_file)
+        labels = chutils.get_inference_labels()
+        assert chutils.get_schema('inference').rename['BOABIS'] == 'BOABIS_v2'
+
+        #a spawned worker imports chorus_utils again: it has the loaded labels only through the initializer of the pool
+        context = multiprocessing.get_context('spawn')
+        with chutils.process_pool(max_workers=1,mp_context=context) as pool:
+            assert pool.submit(chutils.get_inference_labels).result() == labels
+            assert pool.submit(chutils.get_wstation_labels).result() == chutils.get_wstation_labels()
+    finally:
+        chutils.reset_labels()
+
+    assert chutils.get_schema('inference').rename['BOABIS'] == 'BOABIS'
@@ -0,0 +1,31 @@
+"""Tests of the instrumentation of chorus_profiling."""
+import time
+import numpy as np
+import chorus_profiling as chprof
+
+@chprof.profiled('allocate')
+def allocate(mb):
+    values = np.ones(mb*1024**2//8)
+    time.sleep(0.05)
+    return float(values.sum())
+
+def test_peak_rss_is_measured_per_call():
+    if chprof.rss_mb() is None:
+        return
+    enabled = chprof.is_enabled()
+    chprof.enable()
+    try:
+        n_records = len(chprof.records())
+        allocate(256)
+        allocate(64)
+        big, small = chprof.records(n_records)
+    finally:
+        if not enabled:
+            chprof.disable()
+
+    #the smaller call after a bigger one still reports its own growth, unlike the peak of the process
+    assert big['rss_growth_mb'] >= 200
+    assert 40 <= small['rss_growth_mb'] < big['rss_growth_mb']
+    assert small['peak_rss_mb'] < big['peak_rss_mb']
+    #ru_maxrss and the sampled RSS are read from different counters, which can differ by a few pages
+    assert small['process_peak_rss_mb'] >= big['peak_rss_mb'] - 1
@@ -0,0 +1,56 @@
+"""Tests of the Zarr store of chorus_zarr."""
+import numpy as np
+import pandas as pd
+import chorus_zarr as chzarr
+
+SPECIES = ['BOABIS','SCIPER','DENMIN']
+
+def make_site(start, periods, seed, T_sample=15):
+    rng = np.random.default_rng(seed)
+    time = pd.date_range(start,periods=periods,freq='{}min'.format(T_sample))
+    df_inf_h = pd.DataFrame(rng.random((periods,len(SPECIES))),columns=SPECIES)
+    df_inf_h.insert(0,'time',time)
+    df_climvar = pd.DataFrame({'T(C)':rng.normal(20,3,periods),'RH(%)':rng.uniform(40,90,periods)})
+    return df_inf_h, df_climvar
+
+def make_store(path, locations=('INCT0','INCT9')):
+    df_meta = pd.DataFrame({'location_ID':list(locations),'lat_DL':[4.1,4.9][:len(locations)],
+                            'lon_DL':[-74.1,-73.2][:len(locations)]})
+    return chzarr.create_store(path,df_meta,'2020-01-01','2020-01-02',species=SPECIES)
+
+def test_write_site_read_slice_round_trip(tmp_path):
+    store_path = make_store(str(tmp_path / 'store.zarr'))
+    df_inf_h, df_climvar = make_site('2020-01-01 22:00',24,0)
+    assert chzarr.write_site(store_path,'INCT9',df_inf_h,df_climvar) == (24,0)
+
+    ds = chzarr.read_slice(store_path,locations=['INCT9'],species=['SCIPER','BOABIS'],date_ini='2020-01-02',
+                           date_fin='2020-01-02')
+    assert list(ds['species'].values) == ['SCIPER','BOABIS']
+    assert ds['time'].values[0] == np.datetime64('2020-01-02T00:00')
+    assert ds['time'].shape[0] == 96
+    day = (df_inf_h['time'] >= '2020-01-02').to_numpy()
+    np.testing.assert_allclose(ds['eva'].values[0,:16],df_inf_h.loc[day,['SCIPER','BOABIS']].to_numpy(),rtol=1e-6)
+    np.testing.assert_allclose(ds['rh'].values[0,:16],df_climvar.loc[day,'RH(%)'].to_numpy(),rtol=1e-6)
+    assert np.isnan(ds['eva'].values[0,16:]).all()
+    assert np.isnan(ds['dp'].values).all()
+
+    #the other site is not touched
+    ds = chzarr.read_slice(store_path,locations=['INCT0'])
+    assert np.isnan(ds['eva'].values).all()
+
+def test_write_site_counts_slots_off_the_grid(tmp_path, caplog):
+    store_path = make_store(str(tmp_path / 'store.zarr'))
+
+    df_inf_h, df_climvar = make_site('2020-01-01 00:00',8,0)
+    assert chzarr.write_site(store_path,'INCT0',df_inf_h,df_climvar) == (8,0)
+    assert caplog.records == []
+
+    #slots of a grid anchored at 00:07 are inside the time axis but not on its grid
+    df_inf_h9, df_climvar9 = make_site('2020-01-01 00:07',8,1)
+    assert chzarr.write_site(store_path,'INCT9',df_inf_h9,df_climvar9) == (0,8)
+    assert 'INCT9' in caplog.text
+
+    ds = chzarr.read_slice(store_path,date_ini='2020-01-01',date_fin='2020-01-01')
+    np.testing.assert_allclose(ds['eva'].values[0,:8],df_inf_h[SPECIES].to_numpy(),rtol=1e-6)
+    np.testing.assert_allclose(ds['temp'].values[0,:8],df_climvar['T(C)'].to_numpy(),rtol=1e-6)
+    assert np.isnan(ds['eva'].values[1]).all()